@@ -10,7 +10,7 @@ $tempDir = "artifacts\api\temp"
 $zipFilePath = "artifacts\api\app.zip"
 
 # Construct the argument list
-$args = "$pythonAppPath $zipFilePath $tempDir --exclude_dirs venv --exclude_files .env *.md"
+$args = "$pythonAppPath $zipFilePath $tempDir --exclude_dirs venv benchmarks --exclude_files .env *.md"
 
 # Execute the Python script
 Start-Process "python" -ArgumentList "directory_zipper.py $args" -NoNewWindow -Wait
@@ -0,0 +1,328 @@
+# benchmarks/fakes.py
+
+"""
+In-process stand-ins for the Azure services the ingestion activities use.
+
+    - FakeBlobServiceClient: in-memory containers with ETags, conditional
+      writes and instant server-side copies
+    - FakeEmbeddings: deterministic embeddings with a per-request and
+      per-token latency, like an Azure OpenAI deployment
+    - FakeSearchClient / FakeSearchIndexClient: Azure AI Search document
+      and index operations with a per-request latency
+    - Async* facades over the same state for the async activities
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+from embedding_batcher import count_tokens
+
+_etags = itertools.count(1)
+
+
+class _Downloader:
+    def __init__(self, data: bytes, etag: str, chunk_size: int = 4 * 1024 * 1024):
+        self._data = data
+        self._chunk_size = chunk_size
+        self.properties = SimpleNamespace(etag=etag, size=len(data))
+
+    def readall(self) -> bytes:
+        return self._data
+
+    def readinto(self, stream) -> int:
+        stream.write(self._data)
+        return len(self._data)
+
+    def chunks(self):
+        for start in range(0, len(self._data), self._chunk_size):
+            yield self._data[start:start + self._chunk_size]
+
+
+class FakeBlobClient:
+    def __init__(self, service: "FakeBlobServiceClient", container: str, blob: str):
+        self._service = service
+        self.container_name = container
+        self.blob_name = blob
+        self.url = f"https://fake.blob/{container}/{blob}"
+
+    @property
+    def _key(self) -> Tuple[str, str]:
+        return self.container_name, self.blob_name
+
+    def _check(self, etag: Optional[str], match_condition):
+        current = self._service.blobs.get(self._key)
+        if match_condition == MatchConditions.IfNotModified and (current is None or current[1] != etag):
+            raise ResourceModifiedError("The condition specified using HTTP conditional header(s) is not met.")
+
+    def download_blob(self, etag: Optional[str] = None, match_condition=None, **kwargs) -> _Downloader:
+        if self._key not in self._service.blobs:
+            raise ResourceNotFoundError("The specified blob does not exist.")
+        self._check(etag, match_condition)
+        data, current = self._service.blobs[self._key]
+        return _Downloader(data, current)
+
+    def upload_blob(self, data: Union[bytes, str, Iterable], overwrite: bool = False,
+                    etag: Optional[str] = None, match_condition=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        elif not isinstance(data, (bytes, bytearray)):
+            data = b"".join(part.encode("utf-8") if isinstance(part, str) else part for part in data)
+        if not overwrite and self._key in self._service.blobs:
+            raise ResourceExistsError("The specified blob already exists.")
+        self._check(etag, match_condition)
+        self._service.write(self._key, bytes(data))
+
+    def get_blob_properties(self):
+        if self._key not in self._service.blobs:
+            raise ResourceNotFoundError("The specified blob does not exist.")
+        data, etag = self._service.blobs[self._key]
+        return SimpleNamespace(etag=etag, size=len(data), copy=SimpleNamespace(status="success", id="copy"))
+
+    def start_copy_from_url(self, source_url: str, source_etag: Optional[str] = None,
+                            source_match_condition=None, **kwargs):
+        container, blob = source_url.split("https://fake.blob/", 1)[1].split("/", 1)
+        source = FakeBlobClient(self._service, container, blob)
+        data = source.download_blob(etag=source_etag, match_condition=source_match_condition).readall()
+        self._service.write(self._key, data)
+
+    def abort_copy(self, copy_id: str):
+        pass
+
+    def delete_blob(self, etag: Optional[str] = None, match_condition=None, **kwargs):
+        if self._key not in self._service.blobs:
+            raise ResourceNotFoundError("The specified blob does not exist.")
+        self._check(etag, match_condition)
+        del self._service.blobs[self._key]
+
+
+class FakeContainerClient:
+    def __init__(self, service: "FakeBlobServiceClient", container: str):
+        self._service = service
+        self.container_name = container
+
+    def download_blob(self, blob: str, **kwargs):
+        return FakeBlobClient(self._service, self.container_name, blob).download_blob(**kwargs)
+
+    def upload_blob(self, name: str, data, overwrite: bool = False, **kwargs):
+        FakeBlobClient(self._service, self.container_name, name).upload_blob(data, overwrite=overwrite, **kwargs)
+
+    def delete_blob(self, blob: str, **kwargs):
+        FakeBlobClient(self._service, self.container_name, blob).delete_blob(**kwargs)
+
+    def list_blobs(self, name_starts_with: str = ""):
+        return [
+            SimpleNamespace(name=blob, etag=etag, size=len(data))
+            for (container, blob), (data, etag) in list(self._service.blobs.items())
+            if container == self.container_name and blob.startswith(name_starts_with)
+        ]
+
+
+class FakeBlobServiceClient:
+    """Blob storage in a dict; counts bytes written per container."""
+
+    def __init__(self):
+        self.blobs: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+        self.bytes_written: Dict[str, int] = {}
+
+    def write(self, key: Tuple[str, str], data: bytes):
+        self.blobs[key] = (data, f'"0x{next(_etags):X}"')
+        self.bytes_written[key[0]] = self.bytes_written.get(key[0], 0) + len(data)
+
+    def get_blob_client(self, container: str, blob: str) -> FakeBlobClient:
+        return FakeBlobClient(self, container, blob)
+
+    def get_container_client(self, container: str) -> FakeContainerClient:
+        return FakeContainerClient(self, container)
+
+
+class FakeEmbeddings:
+    """
+    Deterministic unit vectors (identical text -> identical vector). Each
+    embed_documents call sleeps `latency` plus `seconds_per_1k_tokens` per
+    thousand input tokens, so batching and concurrency show in the numbers.
+    """
+
+    def __init__(self, dimensions: int = 1536, latency: float = 0.05, seconds_per_1k_tokens: float = 0.01):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.requests = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(count_tokens(text) for text in texts)
+        time.sleep(self.latency + self.seconds_per_1k_tokens * tokens / 1000)
+        self.requests += 1
+        self.texts += len(texts)
+        return [self._vector(text) for text in texts]
+
+
+class FakeSearchClient:
+    """Keeps documents by key; every request sleeps `latency`."""
+
+    def __init__(self, latency: float = 0.05, key_field: str = "chunk_id"):
+        self.latency = latency
+        self.key_field = key_field
+        self.documents: Dict[str, dict] = {}
+        self.requests = 0
+        self.bytes_received = 0
+
+    def _request(self, documents: List[dict]):
+        time.sleep(self.latency)
+        self.requests += 1
+        self.bytes_received += len(json.dumps(documents))
+
+    def _result(self, key: str, succeeded: bool = True):
+        return SimpleNamespace(key=key, succeeded=succeeded, status_code=200 if succeeded else 404, error_message=None)
+
+    def upload_documents(self, documents: List[dict]):
+        self._request(documents)
+        for document in documents:
+            self.documents[document[self.key_field]] = dict(document)
+        return [self._result(d[self.key_field]) for d in documents]
+
+    def merge_documents(self, documents: List[dict]):
+        self._request(documents)
+        results = []
+        for document in documents:
+            key = document[self.key_field]
+            if key in self.documents:
+                self.documents[key].update(document)
+            results.append(self._result(key, key in self.documents))
+        return results
+
+    def delete_documents(self, documents: List[dict]):
+        self._request(documents)
+        return self._delete(documents)
+
+    def _delete(self, documents: List[dict]):
+        for document in documents:
+            self.documents.pop(document[self.key_field], None)
+        return [self._result(d[self.key_field]) for d in documents]
+
+    def search(self, search_text: str = "*", filter: Optional[str] = None, select=None, **kwargs):
+        time.sleep(self.latency)
+        self.requests += 1
+        documents = self.documents.values()
+        if filter and filter.startswith("title eq '"):
+            title = filter[len("title eq '"):-1].replace("''", "'")
+            documents = [d for d in documents if d.get("title") == title]
+        return [{k: d.get(k) for k in select} if select else dict(d) for d in documents]
+
+
+class FakeSearchIndexClient:
+    def __init__(self, *args, **kwargs):
+        self.indexes: Dict[str, object] = {}
+
+    def get_index(self, name: str):
+        if name not in self.indexes:
+            raise ResourceNotFoundError("Index not found")
+        return self.indexes[name]
+
+    def create_index(self, index):
+        self.indexes[index.name] = index
+        return index
+
+    def create_or_update_index(self, index):
+        return self.create_index(index)
+
+
+# Async facades over the same in-memory state, for the async activities
+
+
+class _AsyncDownloader:
+    def __init__(self, downloader: _Downloader):
+        self._downloader = downloader
+        self.properties = downloader.properties
+
+    async def readall(self) -> bytes:
+        return self._downloader.readall()
+
+    async def readinto(self, stream) -> int:
+        return self._downloader.readinto(stream)
+
+
+class _AsyncItems:
+    def __init__(self, items: List):
+        self._items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncFakeBlobClient:
+    def __init__(self, client: FakeBlobClient):
+        self._client = client
+        self.url = client.url
+
+    async def download_blob(self, **kwargs) -> _AsyncDownloader:
+        return _AsyncDownloader(self._client.download_blob(**kwargs))
+
+    async def upload_blob(self, data, **kwargs):
+        self._client.upload_blob(data, **kwargs)
+
+    async def get_blob_properties(self):
+        return self._client.get_blob_properties()
+
+    async def start_copy_from_url(self, source_url: str, **kwargs):
+        self._client.start_copy_from_url(source_url, **kwargs)
+
+    async def abort_copy(self, copy_id: str):
+        self._client.abort_copy(copy_id)
+
+    async def delete_blob(self, **kwargs):
+        self._client.delete_blob(**kwargs)
+
+
+class AsyncFakeContainerClient:
+    def __init__(self, client: FakeContainerClient):
+        self._client = client
+
+    def list_blobs(self, name_starts_with: str = "") -> _AsyncItems:
+        return _AsyncItems(self._client.list_blobs(name_starts_with=name_starts_with))
+
+    async def delete_blob(self, blob: str, **kwargs):
+        self._client.delete_blob(blob, **kwargs)
+
+
+class AsyncFakeBlobServiceClient:
+    def __init__(self, service: FakeBlobServiceClient):
+        self._service = service
+
+    def get_blob_client(self, container: str, blob: str) -> AsyncFakeBlobClient:
+        return AsyncFakeBlobClient(self._service.get_blob_client(container, blob))
+
+    def get_container_client(self, container: str) -> AsyncFakeContainerClient:
+        return AsyncFakeContainerClient(self._service.get_container_client(container))
+
+
+class AsyncFakeSearchClient:
+    """Shares documents with a FakeSearchClient; latency is awaited, not slept."""
+
+    def __init__(self, client: FakeSearchClient):
+        self._client = client
+
+    async def delete_documents(self, documents: List[dict]):
+        await asyncio.sleep(self._client.latency)
+        self._client.requests += 1
+        return self._client._delete(documents)
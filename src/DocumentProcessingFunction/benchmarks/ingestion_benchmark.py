@@ -0,0 +1,357 @@
+# benchmarks/ingestion_benchmark.py
+
+"""
+Ingestion throughput benchmark for the document processing activities.
+
+Runs the orchestration's activity sequence (get_pdf_info, chunk_pdf,
+merge_staged, deduplicate_chunks, plan_index_update, generate_embeddings,
+update_search_index, move_blob, delete_staged_blobs) in-process over the
+PDFs in data/ and over synthetic large PDFs, with fakes standing in for
+Blob Storage, Azure OpenAI and Azure AI Search (see benchmarks/fakes.py).
+
+Usage (from src/DocumentProcessingFunction, after
+`pip install -r requirements.txt -r benchmarks/requirements.txt`):
+
+    python -m benchmarks.ingestion_benchmark
+    python -m benchmarks.ingestion_benchmark --synthetic-pages 100 1000 --embedding-latency 0.2
+    python -m benchmarks.ingestion_benchmark --no-data --output bench.json
+
+Reports per-stage wall time and peak RSS, pages/sec, and the bytes each
+document adds to the orchestration history (activity inputs and outputs)
+and to staging. Results are written as JSON to benchmarks/results/ (or
+--output) so runs can be compared across changes. Activities run one after
+another, so chunk_pdf time is the sum over page ranges, not the fan-out's
+wall time.
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Dummy configuration so the activities can be imported and run offline.
+_OFFLINE_ENV = {
+    "AZURE_STORAGE_URL": "https://bench.invalid",
+    "AZURE_OPENAI_ENDPOINT": "https://bench.invalid",
+    "AZURE_OPENAI_EMBEDDING": "bench-embedding",
+    "AZURE_OPENAI_API_VERSION": "2024-06-01",
+    "AZURE_AI_SEARCH_ENDPOINT": "https://bench.invalid",
+    "AZURE_AI_SEARCH_API_KEY": "bench",
+    "AZURE_AI_SEARCH_INDEX": "policy-index",
+    "AZURE_AI_SEARCH_BATCH_SIZE": "100",
+    "AZURE_CLIENT_RESOURCE_ID": "/subscriptions/bench",
+    "DOCUMENT_CHUNK_SIZE": "2000",
+    "DOCUMENT_CHUNK_OVERLAP": "500",
+    # Measure the pipeline, not the deployment quota
+    "EMBEDDING_TPM_LIMIT": "100000000",
+}
+
+STAGES = [
+    "get_pdf_info", "chunk_pdf", "merge_staged", "deduplicate_chunks", "plan_index_update",
+    "generate_embeddings", "update_search_index", "delete_stale_chunks", "move_blob", "delete_staged_blobs",
+]
+
+_WORDS = (
+    "employee employees manager approval request leave vacation absence benefits enrollment policy "
+    "period days year month notice payroll eligible coverage plan review appraisal performance goals "
+    "department human resources company schedule accrual balance carry over unused paid sick medical "
+    "dental vision dependents documentation submit portal record compliance exception supervisor "
+    "within prior following required may must should each all any the a of to and for in on with by"
+).split()
+
+_BOILERPLATE = (
+    "This policy applies to all full-time and part-time employees of the company. Questions about "
+    "this policy should be directed to your manager or to the human resources department. The company "
+    "reserves the right to amend this policy at any time with reasonable notice to employees."
+)
+
+
+def _read_rss() -> int:
+    """Current resident set size in bytes (Linux), else the peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Samples RSS on a background thread; `reset()` starts a new peak window."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = _read_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _read_rss())
+            time.sleep(self.interval)
+
+    def reset(self) -> None:
+        self.peak = _read_rss()
+
+    def sample(self) -> int:
+        self.peak = max(self.peak, _read_rss())
+        return self.peak
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def make_synthetic_pdf(path: str, pages: int, seed: int = 0) -> None:
+    """A policy-like PDF: one section per page, numbered headings, a repeated boilerplate paragraph."""
+    import fitz
+
+    rng = random.Random(seed)
+
+    def sentence() -> str:
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(10, 24))]
+        return " ".join(words).capitalize() + "."
+
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        paragraphs = [" ".join(sentence() for _ in range(rng.randint(3, 6))) for _ in range(rng.randint(3, 5))]
+        if number % 5 == 0:
+            paragraphs.append(_BOILERPLATE)
+        text = f"{number}. Section {number} Requirements\n\n" + "\n\n".join(paragraphs)
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+class IngestionBench:
+    def __init__(self, fa, fakes, embedding_latency: float, search_latency: float, sampler: RssSampler):
+        self.fa = fa
+        self.sampler = sampler
+        self.blob_service = fakes.FakeBlobServiceClient()
+        self.embeddings = fakes.FakeEmbeddings(
+            dimensions=fa.EMBEDDING_DIMENSIONS, latency=embedding_latency
+        )
+        self.search = fakes.FakeSearchClient(latency=search_latency)
+        index_client = fakes.FakeSearchIndexClient()
+
+        # Route every client the activities create to the fakes
+        fa._clients.clear()
+        fa._blob_service_client = lambda: self.blob_service
+        fa._async_blob_service_client = lambda: fakes.AsyncFakeBlobServiceClient(self.blob_service)
+        fa._embeddings_model = lambda: self.embeddings
+        fa._search_client = lambda: self.search
+        fa._async_search_client = lambda: fakes.AsyncFakeSearchClient(self.search)
+        fa.SearchIndexClient = lambda *args, **kwargs: index_client
+        # Async activities run on one loop, like the worker's
+        self.loop = asyncio.new_event_loop()
+
+    def _call(self, stats: dict, name: str, payload):
+        """Run one activity, recording wall time, peak RSS and history bytes."""
+        self.sampler.reset()
+        start = time.perf_counter()
+        result = getattr(self.fa, name)(payload)
+        if inspect.iscoroutine(result):
+            result = self.loop.run_until_complete(result)
+        elapsed = time.perf_counter() - start
+
+        stage = stats["stages"].setdefault(name, {"calls": 0, "wall_s": 0.0, "peak_rss_mb": 0.0})
+        stage["calls"] += 1
+        stage["wall_s"] += elapsed
+        stage["peak_rss_mb"] = max(stage["peak_rss_mb"], self.sampler.sample() / 2 ** 20)
+        # Durable Functions keeps each activity's input and result in the history
+        stats["history_bytes"] += len(json.dumps(payload)) + len(json.dumps(result))
+        return result
+
+    def run_document(self, path: str, label: str) -> dict:
+        """The orchestrator's activity sequence for one PDF, run synchronously."""
+        fa = self.fa
+        filename = os.path.basename(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        self.blob_service.get_blob_client(fa.LOAD_CONTAINER, filename).upload_blob(data, overwrite=True)
+        staged_before = self.blob_service.bytes_written.get(fa.STAGING_CONTAINER, 0)
+        requests_before = (self.embeddings.requests, self.search.requests)
+
+        source = {"filename": filename, "blob": filename, "size": len(data)}
+        prefix = f"bench-{label}/"
+        stats = {"document": label, "bytes": len(data), "stages": {}, "history_bytes": len(json.dumps(source))}
+        start = time.perf_counter()
+
+        pdf = self._call(stats, "get_pdf_info", {
+            **source, "pages_per_activity": int(os.environ.get("PDF_PAGES_PER_ACTIVITY", "50")),
+            "staging_prefix": prefix,
+        })
+        parts = [
+            self._call(stats, "chunk_pdf", {**source, "etag": pdf["etag"], **part, "staging_prefix": prefix})
+            for part in pdf["ranges"]
+        ]
+        chunks = self._call(stats, "merge_staged", {"refs": parts, "blob": f"{prefix}chunks.jsonl"})
+        total_chunks = chunks["count"]
+        if os.environ.get("DEDUP_ENABLED", "true").lower() == "true":
+            chunks = self._call(stats, "deduplicate_chunks", chunks)
+        changes = self._call(stats, "plan_index_update", chunks)
+        if changes["count"]:
+            embeddings = self._call(stats, "generate_embeddings", changes)
+            self._call(stats, "update_search_index", embeddings)
+        if changes["stale_ids"]:
+            self._call(stats, "delete_stale_chunks", changes["stale_ids"])
+        self._call(stats, "move_blob", {**source, "etag": pdf["etag"]})
+        self._call(stats, "delete_staged_blobs", prefix)
+
+        wall = time.perf_counter() - start
+        for stage in stats["stages"].values():
+            stage["wall_s"] = round(stage["wall_s"], 4)
+            stage["peak_rss_mb"] = round(stage["peak_rss_mb"], 1)
+        stats.update({
+            "pages": pdf["page_count"],
+            "chunks": total_chunks,
+            "indexed_chunks": changes["count"],
+            "wall_s": round(wall, 4),
+            "pages_per_sec": round(pdf["page_count"] / wall, 2) if wall else 0.0,
+            "staged_bytes": self.blob_service.bytes_written.get(fa.STAGING_CONTAINER, 0) - staged_before,
+            "embedding_requests": self.embeddings.requests - requests_before[0],
+            "search_requests": self.search.requests - requests_before[1],
+        })
+        return stats
+
+
+def _summary(documents: List[dict]) -> dict:
+    wall = sum(d["wall_s"] for d in documents)
+    pages = sum(d["pages"] for d in documents)
+    stages = {}
+    for name in STAGES:
+        runs = [d["stages"][name] for d in documents if name in d["stages"]]
+        if runs:
+            stages[name] = {
+                "wall_s": round(sum(r["wall_s"] for r in runs), 4),
+                "share": round(sum(r["wall_s"] for r in runs) / wall, 4) if wall else 0.0,
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+            }
+    return {
+        "documents": len(documents),
+        "pages": pages,
+        "chunks": sum(d["chunks"] for d in documents),
+        "wall_s": round(wall, 4),
+        "pages_per_sec": round(pages / wall, 2) if wall else 0.0,
+        "history_bytes": sum(d["history_bytes"] for d in documents),
+        "staged_bytes": sum(d["staged_bytes"] for d in documents),
+        "stages": stages,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    data_dir: Optional[str],
+    synthetic_pages: List[int],
+    embedding_latency: float,
+    search_latency: float,
+) -> dict:
+    for key, value in _OFFLINE_ENV.items():
+        os.environ.setdefault(key, value)
+    import function_app as fa
+    from benchmarks import fakes
+
+    documents: List[Dict] = []
+    with tempfile.TemporaryDirectory() as tmp, RssSampler() as sampler:
+        bench = IngestionBench(fa, fakes, embedding_latency, search_latency, sampler)
+
+        paths = []
+        if data_dir:
+            paths += [(os.path.join(data_dir, name), name) for name in sorted(os.listdir(data_dir))
+                      if name.lower().endswith(".pdf")]
+        for pages in synthetic_pages:
+            path = os.path.join(tmp, f"synthetic-{pages}.pdf")
+            make_synthetic_pdf(path, pages, seed=pages)
+            paths.append((path, f"synthetic-{pages}"))
+
+        for path, label in paths:
+            stats = bench.run_document(path, label)
+            documents.append(stats)
+            logging.info(f"{label}: {stats['pages']} pages, {stats['chunks']} chunks in {stats['wall_s']}s "
+                         f"({stats['pages_per_sec']} pages/s)")
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "embedding_latency_s": embedding_latency,
+            "search_latency_s": search_latency,
+            "chunker": os.environ.get("DOCUMENT_CHUNKER", "tokens"),
+            "dedup": os.environ.get("DEDUP_ENABLED", "true"),
+            "vector_encoding": os.environ.get("INGESTION_VECTOR_ENCODING", "float16"),
+            "window_size": fa.INGESTION_WINDOW_SIZE,
+            "embedding_dimensions": fa.EMBEDDING_DIMENSIONS,
+        },
+        "summary": _summary(documents),
+        "documents": documents,
+    }
+
+
+def _print_report(report: dict) -> None:
+    summary = report["summary"]
+    print(f"{'document':<42} {'pages':>6} {'chunks':>7} {'wall s':>8} {'pages/s':>8} {'history':>9} {'staged':>10}")
+    for d in report["documents"]:
+        print(f"{d['document'][:42]:<42} {d['pages']:>6} {d['chunks']:>7} {d['wall_s']:>8.2f} "
+              f"{d['pages_per_sec']:>8.1f} {d['history_bytes']:>9} {d['staged_bytes']:>10}")
+    print(f"\nTotal: {summary['pages']} pages in {summary['wall_s']:.2f}s ({summary['pages_per_sec']} pages/s), "
+          f"{summary['history_bytes']} history bytes")
+    print(f"{'stage':<22} {'wall s':>8} {'share':>7} {'peak RSS MB':>12}")
+    for name, stage in summary["stages"].items():
+        print(f"{name:<22} {stage['wall_s']:>8.2f} {stage['share']:>7.1%} {stage['peak_rss_mb']:>12.1f}")
+
+
+def main():
+    default_data = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data")
+    parser = argparse.ArgumentParser(description="Benchmark the document ingestion activities offline.")
+    parser.add_argument("--data-dir", default=default_data, help="Directory of sample PDFs.")
+    parser.add_argument("--no-data", action="store_true", help="Only run the synthetic PDFs.")
+    parser.add_argument("--synthetic-pages", type=int, nargs="*", default=[200],
+                        help="Page counts of synthetic PDFs to generate (default: 200).")
+    parser.add_argument("--embedding-latency", type=float, default=0.05,
+                        help="Seconds per fake embedding request, before per-token time.")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per fake search request.")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    report = run(None if args.no_data else args.data_dir, args.synthetic_pages,
+                 args.embedding_latency, args.search_latency)
+    _print_report(report)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", report["timestamp"].replace(":", "").replace("+0000", "Z") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""
+Bulk ingestion of a local directory of PDFs, outside Durable Functions.
+
+Runs the function app's ingestion pipeline, one PDF per worker process, and
+checkpoints each finished file so an interrupted backfill resumes where it
+stopped. With `--target search` each PDF goes through the same activities as
+`document_orchestrator`: near-duplicate detection, the diff against what is
+already indexed (stale chunks are deleted), the embedding cache and the
+search upload, with chunks staged in the staging container.
+
+Usage (from src/DocumentProcessingFunction, with the function app settings
+exported as environment variables):
+
+    python bulk_ingest.py ../../data --target search
+    python bulk_ingest.py ../../data --target local --output-dir local_index --workers 4
+    python bulk_ingest.py ../../data --target local --embeddings hash   # offline dry run
+
+`--target local` writes `vectors.npy` (float32, one row per chunk) and
+`chunks.json` (chunk metadata in the same order) to the output directory
+instead of the search index; it needs numpy, and it chunks and embeds every
+PDF in full (no dedup, diff or cache). `--embeddings hash` is only allowed
+with `--target local`. Checkpoints are kept in
+`<output-dir>/checkpoint.json`; a file is skipped when its content hash
+matches a completed entry.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import fitz
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents.indexes import SearchIndexClient
+
+from embedding_batcher import EmbeddingBatcher, count_tokens
+from function_app import (
+    EMBEDDING_DIMENSIONS,
+    INGESTION_WINDOW_SIZE,
+    _embeddings_model,
+    _ensure_search_index,
+    _iter_chunks,
+    _iter_staged,
+    _search_document,
+    _stage_jsonl,
+    _windows,
+    deduplicate_chunks,
+    delete_stale_chunks,
+    delete_staged_blobs,
+    generate_embeddings,
+    plan_index_update,
+    update_search_index,
+)
+
+CHECKPOINT_FILE = "checkpoint.json"
+SHARDS_DIR = "shards"
+
+
+class HashEmbeddings:
+    """Deterministic pseudo-embeddings for offline runs; same text, same unit vector."""
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+            vector = [rng.gauss(0.0, 1.0) for _ in range(self.dimensions)]
+            norm = sum(v * v for v in vector) ** 0.5
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_checkpoint(output_dir: str) -> Dict[str, dict]:
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(output_dir: str, checkpoint: Dict[str, dict]):
+    # Write-then-rename so an interrupted run never leaves a torn checkpoint
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# --------------------------------------------------------
+# Worker process
+# --------------------------------------------------------
+_worker: dict = {}
+
+
+def _init_worker(options: dict):
+    logging.basicConfig(level=options["log_level"])
+    # Every process draws from its share of the deployment's TPM budget
+    _worker["tokens_per_minute"] = max(1, int(os.environ.get("EMBEDDING_TPM_LIMIT", "120000")) // options["workers"])
+    if options["target"] == "local":
+        embeddings = HashEmbeddings(EMBEDDING_DIMENSIONS) if options["embeddings"] == "hash" else _embeddings_model()
+        _worker["batcher"] = EmbeddingBatcher(embeddings, tokens_per_minute=_worker["tokens_per_minute"])
+    # The function app's async clients are cached per process, so its async
+    # activities all run on this process's one loop
+    _worker["loop"] = asyncio.new_event_loop()
+    _worker["options"] = options
+
+
+def _process_file(path: str, file_hash: str) -> dict:
+    """Chunk, embed and store one PDF; return its timings and counts."""
+    options = _worker["options"]
+    stats = {"file": path, "hash": file_hash, "pages": 0, "chunks": 0, "indexed": 0, "stale": 0,
+             "tokens": 0, "chunk_s": 0.0, "embed_s": 0.0, "write_s": 0.0}
+    if options["target"] == "search":
+        _index_file(path, file_hash, stats)
+    else:
+        _embed_file(path, file_hash, stats)
+    return stats
+
+
+def _index_file(path: str, file_hash: str, stats: dict):
+    """The document orchestrator's activities for one PDF, run in this process."""
+    prefix = f"bulk-{file_hash[:16]}/"
+    try:
+        start = time.perf_counter()
+        with fitz.open(path) as doc:
+            stats["pages"] = doc.page_count
+            chunks = _stage_jsonl(
+                f"{prefix}chunks.jsonl", _iter_chunks(doc, os.path.basename(path), 0, doc.page_count)
+            )
+        stats["chunks"] = chunks["count"]
+
+        # Keep one canonical copy of near-duplicates, then compare with the index
+        if os.environ.get("DEDUP_ENABLED", "true").lower() == "true":
+            chunks = deduplicate_chunks(chunks)
+        changes = plan_index_update(chunks)
+        stats["chunk_s"] += time.perf_counter() - start
+        stats["indexed"], stats["stale"] = changes["count"], len(changes["stale_ids"])
+
+        if changes["count"]:
+            start = time.perf_counter()
+            stats["tokens"] = sum(count_tokens(chunk["content"]) for chunk in _iter_staged(changes))
+            embeddings = generate_embeddings({**changes, "tokens_per_minute": _worker["tokens_per_minute"]})
+            stats["embed_s"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            update_search_index(embeddings)
+            stats["write_s"] += time.perf_counter() - start
+
+        if changes["stale_ids"]:
+            start = time.perf_counter()
+            _worker["loop"].run_until_complete(delete_stale_chunks(changes["stale_ids"]))
+            stats["write_s"] += time.perf_counter() - start
+    finally:
+        _worker["loop"].run_until_complete(delete_staged_blobs(prefix))
+
+
+def _embed_file(path: str, file_hash: str, stats: dict):
+    """Chunk and embed one PDF in full into a local index shard."""
+    filename = os.path.basename(path)
+    documents = []
+    with fitz.open(path) as doc:
+        stats["pages"] = doc.page_count
+        chunks = _iter_chunks(doc, filename, 0, doc.page_count)
+
+        while True:
+            start = time.perf_counter()
+            window = next(_windows(chunks, INGESTION_WINDOW_SIZE), None)
+            stats["chunk_s"] += time.perf_counter() - start
+            if not window:
+                break
+
+            start = time.perf_counter()
+            texts = [chunk["content"] for chunk in window]
+            vectors = _worker["batcher"].embed(texts)
+            stats["embed_s"] += time.perf_counter() - start
+            stats["chunks"] += len(window)
+            stats["tokens"] += sum(count_tokens(text) for text in texts)
+
+            documents.extend(_search_document(c, v) for c, v in zip(window, vectors))
+
+    start = time.perf_counter()
+    _write_shard(_worker["options"]["output_dir"], file_hash, documents)
+    stats["write_s"] += time.perf_counter() - start
+
+
+# --------------------------------------------------------
+# Local index
+# --------------------------------------------------------
+def _write_shard(output_dir: str, file_hash: str, documents: List[dict]):
+    import numpy as np
+
+    shard = os.path.join(output_dir, SHARDS_DIR, file_hash[:16])
+    vectors = np.asarray([d["content_vector"] for d in documents], dtype=np.float32)
+    np.save(shard + ".npy", vectors)
+    with open(shard + ".json", "w", encoding="utf-8") as f:
+        json.dump([{k: v for k, v in d.items() if k != "content_vector"} for d in documents], f)
+
+
+def _build_local_index(output_dir: str, checkpoint: Dict[str, dict]):
+    """Concatenate the shards of every completed file into vectors.npy + chunks.json."""
+    import numpy as np
+
+    vectors, chunks = [], []
+    for path in sorted(checkpoint):
+        shard = os.path.join(output_dir, SHARDS_DIR, checkpoint[path]["hash"][:16])
+        if not os.path.exists(shard + ".npy"):
+            continue
+        vectors.append(np.load(shard + ".npy"))
+        with open(shard + ".json", encoding="utf-8") as f:
+            chunks.extend(json.load(f))
+
+    matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    np.save(os.path.join(output_dir, "vectors.npy"), matrix)
+    with open(os.path.join(output_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(chunks, f)
+    logging.info(f"Local index: {matrix.shape[0]} chunks in {output_dir}")
+
+
+# --------------------------------------------------------
+# Driver
+# --------------------------------------------------------
+def ingest(
+    input_dir: str,
+    output_dir: str,
+    target: str = "search",
+    embeddings: str = "azure",
+    workers: Optional[int] = None,
+    log_level: str = "WARNING",
+) -> dict:
+    """Ingest every PDF under `input_dir` and return a throughput report."""
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(os.path.join(output_dir, SHARDS_DIR), exist_ok=True)
+
+    checkpoint = _load_checkpoint(output_dir)
+    files = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(input_dir)
+        for name in names if name.lower().endswith(".pdf")
+    )
+    hashes = {path: _file_hash(path) for path in files}
+    todo = [path for path in files if checkpoint.get(path, {}).get("hash") != hashes[path]]
+    logging.info(f"{len(files)} PDFs found, {len(files) - len(todo)} already ingested, {len(todo)} to go")
+
+    if target == "search" and todo:
+        index_client = SearchIndexClient(
+            endpoint=os.environ["AZURE_AI_SEARCH_ENDPOINT"],
+            credential=AzureKeyCredential(os.environ["AZURE_AI_SEARCH_API_KEY"]),
+        )
+        if not _ensure_search_index(index_client, os.environ["AZURE_AI_SEARCH_INDEX"]):
+            raise RuntimeError("Search index does not exist and could not be created.")
+
+    options = {"target": target, "embeddings": embeddings, "workers": workers,
+               "output_dir": output_dir, "log_level": log_level}
+    results, failures = [], {}
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+        futures = {pool.submit(_process_file, path, hashes[path]): path for path in todo}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                stats = future.result()
+            except Exception as ex:
+                failures[path] = str(ex)
+                logging.error(f"{path} failed: {ex}")
+                continue
+
+            results.append(stats)
+            checkpoint[path] = {"hash": stats["hash"], "pages": stats["pages"], "chunks": stats["chunks"]}
+            _save_checkpoint(output_dir, checkpoint)
+            logging.info(
+                f"{path}: {stats['pages']} pages, {stats['chunks']} chunks"
+                + (f", {stats['indexed']} indexed, {stats['stale']} stale" if target == "search" else "")
+            )
+
+    duration = time.perf_counter() - start
+    if target == "local":
+        _build_local_index(output_dir, checkpoint)
+
+    pages = sum(r["pages"] for r in results)
+    chunks = sum(r["chunks"] for r in results)
+    tokens = sum(r["tokens"] for r in results)
+    embed_s = sum(r["embed_s"] for r in results)
+    return {
+        "files": len(results),
+        "skipped": len(files) - len(todo),
+        "failed": failures,
+        "workers": workers,
+        "duration_s": round(duration, 3),
+        "pages": pages,
+        "chunks": chunks,
+        # Search target: new or changed chunks after dedup, and chunks deleted
+        "indexed_chunks": sum(r["indexed"] for r in results),
+        "stale_chunks": sum(r["stale"] for r in results),
+        "embedding_tokens": tokens,
+        "pages_per_sec": round(pages / duration, 2) if duration else 0.0,
+        "chunks_per_sec": round(chunks / duration, 2) if duration else 0.0,
+        # Per worker-second spent waiting on embeddings, then across the whole run
+        "embedding_chunks_per_sec": round(chunks / embed_s, 2) if embed_s else 0.0,
+        "embedding_tokens_per_sec": round(tokens / duration, 2) if duration else 0.0,
+        "stage_seconds": {
+            stage: round(sum(r[f"{stage}_s"] for r in results), 3) for stage in ("chunk", "embed", "write")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of PDFs into the search index.")
+    parser.add_argument("input_dir", help="Directory searched recursively for .pdf files.")
+    parser.add_argument("--target", choices=["search", "local"], default="search",
+                        help="Upload to AZURE_AI_SEARCH_INDEX, or write a local NumPy/JSON index.")
+    parser.add_argument("--output-dir", default="bulk_ingest_output",
+                        help="Checkpoint (and local index) directory.")
+    parser.add_argument("--embeddings", choices=["azure", "hash"], default="azure",
+                        help="'hash' produces deterministic fake vectors without calling Azure OpenAI.")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    if args.embeddings == "hash" and args.target == "search":
+        parser.error("--embeddings hash writes fake vectors; use it with --target local only.")
+
+    logging.basicConfig(level=args.log_level)
+    os.environ.setdefault("DOCUMENT_CHUNK_SIZE", "2000")
+    os.environ.setdefault("DOCUMENT_CHUNK_OVERLAP", "500")
+
+    report = ingest(args.input_dir, args.output_dir, args.target, args.embeddings, args.workers, args.log_level)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
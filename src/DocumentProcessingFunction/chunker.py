@@ -0,0 +1,235 @@
+"""
+Token-aware, structure-preserving chunking of PDF text.
+
+Pages are read as PyMuPDF text blocks and turned into a stream of headings
+and paragraphs. Chunks are packed greedily up to a token budget measured
+with the embedding tokenizer:
+
+- a heading starts a new chunk (once the current one has some substance)
+  and is repeated at the top of later chunks of the same section
+- paragraphs are never split unless a single paragraph exceeds the budget,
+  in which case it is split on sentences, then on token windows
+- runs of heading-like lines with no paragraph after them (lists, table
+  cells, sign-off blocks) are kept as chunk content rather than dropped
+- chunks flow across page boundaries, so the short tail of one page is
+  merged with the next; each chunk records its first and last page
+- consecutive chunks overlap by whole trailing sentences up to a token budget
+- a page range chunked on its own can be seeded with the heading and overlap
+  in effect at its start (`lead_in`), so sections continue across ranges
+
+Configuration:
+    DOCUMENT_CHUNK_TOKENS          max tokens per chunk (default 512)
+    DOCUMENT_CHUNK_OVERLAP_TOKENS  overlap between consecutive chunks (default 64)
+    DOCUMENT_CHUNK_MIN_TOKENS      a heading only starts a new chunk once the
+                                   current one has this many tokens (default
+                                   half of DOCUMENT_CHUNK_TOKENS)
+"""
+
+import re
+from dataclasses import dataclass
+from os import environ
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from embedding_batcher import count_tokens, split_tokens
+
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVXLC]+\.|[A-Z]\.)\s+\S")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+
+def is_heading(line: str) -> bool:
+    """Heuristic for section headings in policy documents."""
+    line = line.strip()
+    if not line or len(line) > 80 or line.endswith((".", ",", ";")):
+        return False
+    words = line.split()
+    if len(words) > 12:
+        return False
+    if _NUMBERED_HEADING.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if letters and all(c.isupper() for c in letters):
+        return True
+    # Title Case: most words capitalized (single words are usually table cells)
+    capitalized = sum(1 for w in words if w[:1].isupper())
+    return 2 <= len(words) <= 8 and capitalized >= len(words) * 0.7
+
+
+def page_units(blocks: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Turn the text blocks of a page into ("heading" | "paragraph", text) units.
+    Leading heading lines of a block become their own units; the remaining
+    lines are joined into one paragraph.
+    """
+    for block in blocks:
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        while lines and is_heading(lines[0]):
+            yield "heading", lines.pop(0)
+        if lines:
+            # Re-join words hyphenated across line breaks
+            text = " ".join(lines)
+            yield "paragraph", re.sub(r"(\w)- (\w)", r"\1\2", text)
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Split a paragraph larger than the budget on sentences, then on token windows."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        candidate = f"{current} {sentence}".strip()
+        if count_tokens(candidate) <= max_tokens:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        if count_tokens(sentence) <= max_tokens:
+            current = sentence
+            continue
+        # One sentence over budget: hard split on tokens
+        pieces.extend(split_tokens(sentence, max_tokens))
+        current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _tail_sentences(text: str, max_tokens: int) -> str:
+    """The longest run of whole trailing sentences of `text` within `max_tokens`."""
+    if max_tokens <= 0:
+        return ""
+    tail = ""
+    for sentence in reversed(_SENTENCE_END.split(text)):
+        candidate = f"{sentence} {tail}".strip()
+        if count_tokens(candidate) > max_tokens:
+            break
+        tail = candidate
+    return tail
+
+
+@dataclass
+class _Unit:
+    kind: str
+    text: str
+    page: int
+    tokens: int
+
+
+class TokenChunker:
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        min_tokens: Optional[int] = None,
+    ):
+        self.max_tokens = max_tokens or int(environ.get("DOCUMENT_CHUNK_TOKENS", "512"))
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else int(
+            environ.get("DOCUMENT_CHUNK_OVERLAP_TOKENS", "64")
+        )
+        self.min_tokens = min_tokens if min_tokens is not None else int(
+            environ.get("DOCUMENT_CHUNK_MIN_TOKENS", str(self.max_tokens // 2))
+        )
+        if self.overlap_tokens >= self.max_tokens:
+            raise ValueError("DOCUMENT_CHUNK_OVERLAP_TOKENS must be smaller than DOCUMENT_CHUNK_TOKENS")
+
+    def _units(self, pages: Iterable[Tuple[int, Iterable[str]]]) -> Iterator[_Unit]:
+        # Leave room for a repeated heading and the overlap in every chunk
+        budget = max(1, self.max_tokens - self.overlap_tokens)
+        for page_number, blocks in pages:
+            for kind, text in page_units(blocks):
+                tokens = count_tokens(text)
+                if kind == "paragraph" and tokens > budget:
+                    for piece in _split_oversized(text, budget):
+                        yield _Unit(kind, piece, page_number, count_tokens(piece))
+                else:
+                    yield _Unit(kind, text, page_number, tokens)
+
+    def lead_in(self, pages: Iterable[Tuple[int, Iterable[str]]]) -> Tuple[Optional[str], str]:
+        """
+        The section heading in effect and the overlap text at the end of
+        `pages`, to pass to `chunks` for the pages that follow them.
+        """
+        heading, last = None, None
+        for unit in self._units(pages):
+            if unit.kind == "heading":
+                heading, last = unit.text, None
+            else:
+                last = unit.text
+        return heading, _tail_sentences(last, self.overlap_tokens) if last else ""
+
+    def chunks(
+        self,
+        pages: Iterable[Tuple[int, Iterable[str]]],
+        heading: Optional[str] = None,
+        carry: str = "",
+    ) -> Iterator[dict]:
+        """
+        Chunk a stream of (page_number, text blocks) pairs, yielding
+        {"content", "page_number", "page_end"} dicts as soon as each is complete.
+        `heading` and `carry` continue a section from pages chunked separately.
+        """
+        units: List[_Unit] = []
+        tokens = 0
+        # current section heading, and the overlap text from the previous chunk
+        emitted_body = heading is not None
+
+        def emit():
+            nonlocal units, tokens, carry, emitted_body
+            body = [u for u in units if u.kind == "paragraph"]
+            if not body:
+                if not units:
+                    return None
+                # Only heading-like lines: they are the content
+                body = units
+            parts = []
+            if units[0].kind != "heading" and heading and emitted_body:
+                parts.append(heading)
+            if carry:
+                parts.append(carry)
+            parts.extend(u.text for u in units)
+            chunk = {
+                "content": "\n\n".join(parts),
+                "page_number": units[0].page,
+                "page_end": units[-1].page,
+            }
+            carry = _tail_sentences(body[-1].text, self.overlap_tokens)
+            units, tokens, emitted_body = [], 0, True
+            return chunk
+
+        for unit in self._units(pages):
+            if unit.kind == "heading":
+                # A new section: close the current chunk if it has substance
+                if tokens >= self.min_tokens and any(u.kind == "paragraph" for u in units):
+                    chunk = emit()
+                    if chunk:
+                        yield chunk
+                    carry = ""
+                elif units and tokens + unit.tokens > self.max_tokens:
+                    # A long run of heading-like lines: flush it as content
+                    chunk = emit()
+                    if chunk:
+                        yield chunk
+                    carry = ""
+                heading = unit.text
+                emitted_body = False
+                units.append(unit)
+                tokens += unit.tokens
+                continue
+
+            overhead = count_tokens(carry) + (count_tokens(heading) if heading else 0)
+            if units and tokens + unit.tokens + overhead > self.max_tokens:
+                # Keep trailing headings with the paragraph that follows them
+                trailing = []
+                while units and units[-1].kind == "heading":
+                    trailing.insert(0, units.pop())
+                chunk = emit()
+                if chunk:
+                    yield chunk
+                if trailing:
+                    carry = ""
+                units = trailing
+                tokens = sum(u.tokens for u in units)
+
+            units.append(unit)
+            tokens += unit.tokens
+
+        chunk = emit()
+        if chunk:
+            yield chunk
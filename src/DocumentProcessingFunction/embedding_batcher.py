@@ -0,0 +1,174 @@
+"""
+Batched, concurrent embedding generation for the ingestion pipeline.
+
+Texts are grouped into batches bounded by item count and token count, a
+bounded number of batches are embedded concurrently, and every request first
+takes its tokens from a shared tokens-per-minute bucket. Throttled (429)
+batches back off for the service's retry-after, or exponentially with jitter,
+and are retried. Results are returned in input order.
+
+Configuration:
+    EMBEDDING_BATCH_SIZE        max texts per request (default 16)
+    EMBEDDING_BATCH_MAX_TOKENS  max tokens per request (default 8000)
+    EMBEDDING_MAX_CONCURRENCY   concurrent requests (default 4)
+    EMBEDDING_TPM_LIMIT         tokens per minute of the deployment (default 120000)
+    EMBEDDING_MAX_RETRIES       retries of a throttled batch (default 5)
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import List, Optional
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # pragma: no cover - listed in requirements.txt
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` for the embedding models (cl100k_base), or an estimate."""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """`text` cut into consecutive pieces of at most `max_tokens` tokens (cl100k_base, or estimated)."""
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        return [_encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    size = max_tokens * 4
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def make_batches(token_counts: List[int], max_items: int, max_tokens: int) -> List[List[int]]:
+    """
+    Group item indexes into consecutive batches of at most `max_items` items
+    and `max_tokens` tokens. An item larger than `max_tokens` gets a batch of
+    its own.
+    """
+    batches, current, current_tokens = [], [], 0
+    for index, tokens in enumerate(token_counts):
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class TokenBucket:
+    """Thread-safe tokens-per-minute bucket shared by concurrent batches."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.tokens_per_minute,
+                    self._tokens + (now - self._updated) * self.tokens_per_minute / 60,
+                )
+                self._updated = now
+
+                deficit = tokens - self._tokens
+                delay = max(self._paused_until - now, deficit * 60 / self.tokens_per_minute, 0.0)
+                if delay <= 0:
+                    self._tokens -= tokens
+                    return
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Hold back every caller after the service throttled one of them."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+def _retry_after_seconds(ex: Exception) -> Optional[float]:
+    """The service's retry hint for a 429, 0.0 if it gave none, None for other errors."""
+    if getattr(ex, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(ex, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+class EmbeddingBatcher:
+    """Embeds many texts with a LangChain `Embeddings` model in concurrent, bounded batches."""
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or int(environ.get("EMBEDDING_BATCH_SIZE", "16"))
+        self.max_batch_tokens = max_batch_tokens or int(environ.get("EMBEDDING_BATCH_MAX_TOKENS", "8000"))
+        self.max_concurrency = max_concurrency or int(environ.get("EMBEDDING_MAX_CONCURRENCY", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(environ.get("EMBEDDING_MAX_RETRIES", "5"))
+        self.bucket = TokenBucket(tokens_per_minute or int(environ.get("EMBEDDING_TPM_LIMIT", "120000")))
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self.bucket.acquire(tokens)
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as ex:
+                retry_after = _retry_after_seconds(ex)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise
+
+                backoff = retry_after or min(60.0, 2.0 ** attempt)
+                delay = backoff + random.uniform(0, backoff * 0.25)
+                attempt += 1
+                logging.warning(f"Embedding batch throttled; retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                self.bucket.pause(delay)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts`, returning one vector per text in the same order."""
+        if not texts:
+            return []
+
+        token_counts = [count_tokens(text) for text in texts]
+        batches = make_batches(token_counts, self.batch_size, self.max_batch_tokens)
+        logging.info(
+            f"Embedding {len(texts)} texts ({sum(token_counts)} tokens) in {len(batches)} batches, "
+            f"{self.max_concurrency} at a time"
+        )
+
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(batch: List[int]):
+            results = self._embed_batch([texts[i] for i in batch], sum(token_counts[i] for i in batch))
+            for index, vector in zip(batch, results):
+                vectors[index] = vector
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            # list() re-raises the first batch failure
+            list(executor.map(run, batches))
+
+        return vectors
@@ -0,0 +1,74 @@
+"""
+Content-addressed cache of chunk embeddings.
+
+Vectors are stored as raw float32 blobs named `<model>/<sha256 of content>`
+in the EMBEDDING_CACHE_CONTAINER container (default "embeddingcache"), so a
+chunk whose text has been embedded before by the same model is never sent
+to Azure OpenAI again, even if it moved to another page or document.
+"""
+
+import hashlib
+import logging
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Dict, Iterable, List
+
+from azure.core.exceptions import ResourceNotFoundError
+
+
+def content_hash(content: str) -> str:
+    """Stable hash of a chunk's text."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(title: str, page_number, content_sha: str, occurrence: int = 0) -> str:
+    """
+    Deterministic search-index key for a chunk. `occurrence` tells apart
+    identical chunks on the same page.
+    """
+    key = f"{title}|{page_number}|{content_sha}|{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class BlobEmbeddingCache:
+    def __init__(self, blob_service_client, model: str, max_concurrency: int = 16):
+        self.container_client = blob_service_client.get_container_client(
+            environ.get("EMBEDDING_CACHE_CONTAINER", "embeddingcache")
+        )
+        self.model = model
+        self.max_concurrency = max_concurrency
+
+    def _blob_name(self, sha: str) -> str:
+        return f"{self.model}/{sha}"
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for whichever of `hashes` are present."""
+
+        def get(sha: str):
+            try:
+                data = self.container_client.download_blob(self._blob_name(sha)).readall()
+            except ResourceNotFoundError:
+                return sha, None
+            return sha, array("f", data).tolist()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            found = {sha: vector for sha, vector in executor.map(get, set(hashes)) if vector is not None}
+
+        logging.info(f"Embedding cache: {len(found)} hits")
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        """Store vectors by content hash. Failures are logged, never raised."""
+
+        def put(item):
+            sha, vector = item
+            try:
+                self.container_client.upload_blob(
+                    self._blob_name(sha), array("f", vector).tobytes(), overwrite=True
+                )
+            except Exception as ex:
+                logging.warning(f"Could not cache embedding {sha}: {ex}")
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            list(executor.map(put, vectors.items()))
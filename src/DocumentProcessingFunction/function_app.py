@@ -1,9 +1,12 @@
 import azure.functions as func
 import azure.durable_functions as df
-from azure.identity import DefaultAzureCredential
+from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
 from azure.core.credentials import AzureKeyCredential
 from azure.storage.blob import BlobServiceClient
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
@@ -19,24 +22,55 @@ from azure.search.documents.indexes.models import (
     SemanticSearch,
     AzureOpenAIVectorizer,
     AzureOpenAIVectorizerParameters,
-    SearchIndexerDataUserAssignedIdentity 
+    SearchIndexerDataUserAssignedIdentity,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    BinaryQuantizationCompression
 )
-from azure.core.exceptions import ResourceNotFoundError
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceModifiedError, ResourceNotFoundError
 from langchain_openai import AzureOpenAIEmbeddings
-from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+import asyncio
 import logging
+import threading
 import traceback
 from os import environ
-import base64
-import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
 import fitz
-import uuid
-from typing import List
+from typing import Iterable, Iterator, List
+
+from chunker import TokenChunker
+from embedding_batcher import EmbeddingBatcher
+from search_uploader import SearchUploader
+from embedding_cache import BlobEmbeddingCache, content_hash, make_chunk_id
+from near_duplicates import DedupRegistry, NearDuplicateIndex, band_keys, minhash, source_label
+from vector_codec import decode_vector, encode_vector
 
 
 myApp = df.DFApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+LOAD_CONTAINER = "load"
+COMPLETED_CONTAINER = "completed"
+# Intermediate chunks/embeddings, so they never enter the orchestration history
+STAGING_CONTAINER = environ.get("DOCUMENT_STAGING_CONTAINER", "staging")
+# Chunks held in memory at once while embedding a staged stream
+INGESTION_WINDOW_SIZE = int(environ.get("INGESTION_WINDOW_SIZE", "256"))
+# Search index names already known to exist in this process
+_verified_indexes = set()
+# Embedding model behind AZURE_OPENAI_EMBEDDING; EMBEDDING_DIMENSIONS (reduced
+# output size) needs a text-embedding-3 model
+EMBEDDING_MODEL_NAME = environ.get("EMBEDDING_MODEL_NAME", "text-embedding-ada-002")
+EMBEDDING_DIMENSIONS = int(environ.get("EMBEDDING_DIMENSIONS", "1536"))
+# Instance id of the single batch ingestion orchestration (INGESTION_MODE=batch)
+BATCH_INSTANCE_ID = "batch-ingestion"
+
 # Blob Trigger Function to start the Durable Function orchestration
 @myApp.blob_trigger(arg_name="myblob", path="load", connection="BlobTriggerConnection")
 @myApp.durable_client_input(client_name="client")
@@ -48,16 +82,34 @@ async def blob_trigger_start(myblob: func.InputStream, client):
     if not myblob.name.lower().endswith('.pdf'):
         logging.info(f"Skipping processing: {myblob.name} is not a .pdf file.")
         return f"Skipping processing: {myblob.name} is not a .pdf file."
-    
-    # Read the blob content and encode it to base64
-    base64_bytes = base64.b64encode(myblob.read())
 
-   
-    
-    file_name = myblob.name.split('/')[-1] 
+    # Only a reference to the blob goes into the orchestration history;
+    # activities download the bytes themselves.
+    blob_name = myblob.name.split('/', 1)[-1]
+    file_name = myblob.name.split('/')[-1]
+
+    if environ.get("INGESTION_MODE", "document") == "batch":
+        # One batch orchestration lists the load container itself; only wake it if idle
+        status = await client.get_status(BATCH_INSTANCE_ID)
+        if status and status.runtime_status in (
+            df.OrchestrationRuntimeStatus.Running,
+            df.OrchestrationRuntimeStatus.Pending,
+            df.OrchestrationRuntimeStatus.ContinuedAsNew,
+        ):
+            custom_status = status.custom_status if isinstance(status.custom_status, dict) else {}
+            if custom_status.get("state") == "idle":
+                await client.raise_event(BATCH_INSTANCE_ID, "blobs_added", blob_name)
+            return
+        await client.start_new("batch_orchestrator", BATCH_INSTANCE_ID, {})
+        logging.info(f"Started batch orchestration with ID = '{BATCH_INSTANCE_ID}'.")
+        return
 
     # Start the Durable Functions orchestration
-    instance_id = await client.start_new("document_orchestrator", None, {"filename": file_name,"data": base64_bytes.decode('ascii')})
+    instance_id = await client.start_new("document_orchestrator", None, {
+        "filename": file_name,
+        "blob": blob_name,
+        "size": myblob.length,
+    })
     logging.info(f"Started orchestration with ID = '{instance_id}'.")
 
 
@@ -66,65 +118,490 @@ async def blob_trigger_start(myblob: func.InputStream, client):
 def document_orchestrator(context):
     """
     Orchestrates multiple activities based on the input from the Blob trigger.
+    Activities exchange blob references only; chunks and embeddings are staged
+    in the staging container under the orchestration's instance id.
+
+    Started by `batch_orchestrator` (input "batch": true), it stops after
+    embedding and returns what is left to do, so the batch can upload
+    several documents at once; failures are returned rather than raised.
     """
-    data_base64 = context.get_input()["data"]
-    filename = context.get_input()["filename"]
+    source = context.get_input()
+    staging_prefix = f"{context.instance_id}/"
 
-    logging.info(f"File Name: {filename} ")
-    logging.info(f"Data: {data_base64} ")
-    
-    # Chunk the document
-    chunks = yield context.call_activity('chunk_pdf', {"filename": filename,"data": data_base64})
+    if not context.is_replaying:
+        logging.info(f"File Name: {source['filename']} ({source.get('size')} bytes)")
 
-    # Generate embeddings
-    embeddings = yield context.call_activity('generate_embeddings', chunks)
+    if source.get("batch"):
+        try:
+            prepared = yield from _prepare_document(context, source, staging_prefix)
+        except Exception as ex:
+            return {"source": source, "staging_prefix": staging_prefix, "failed": str(ex)}
+        return {**prepared, "source": source, "staging_prefix": staging_prefix}
+
+    prepared = yield from _prepare_document(context, source, staging_prefix)
 
     # Update search index
-    yield context.call_activity('update_search_index', embeddings)
+    if prepared["embeddings"]:
+        yield context.call_activity('update_search_index', prepared["embeddings"])
+
+    # Drop chunks that are no longer part of the document
+    if prepared["stale_ids"]:
+        yield context.call_activity('delete_stale_chunks', prepared["stale_ids"])
 
-    # Move the blob to a "completed" container
-    yield context.call_activity('move_blob', {"filename": filename,"data": data_base64})
+    # Move the blob to a "completed" container (only the version that was indexed)
+    yield context.call_activity('move_blob', {**source, "etag": prepared["etag"]})
+
+    # Remove the staged chunks and embeddings
+    yield context.call_activity('delete_staged_blobs', staging_prefix)
     
     return "Orchestration Completed"
 
 
-### Activity Functions ##
+def _prepare_document(context, source: dict, staging_prefix: str):
+    """Chunk, deduplicate, diff and embed one PDF (used with `yield from`)."""
+    # Read the page count once, then extract and chunk page ranges in parallel.
+    # Each range starts with the heading and overlap in effect at its first
+    # page, but a chunk never runs across a range boundary: the short tail of
+    # a range's last page is not merged with the next range.
+    # The PDF is downloaded once; each range activity reads only its own pages
+    pdf = yield context.call_activity('get_pdf_info', {
+        **source,
+        "pages_per_activity": int(environ.get("PDF_PAGES_PER_ACTIVITY", "50")),
+        "staging_prefix": staging_prefix,
+    })
 
-# Chunking the PDF
-@myApp.activity_trigger(input_name="input")
-def chunk_pdf(input: dict):
-    try:
+    chunk_tasks = [
+        context.call_activity('chunk_pdf', {**source, "etag": pdf["etag"], **part, "staging_prefix": staging_prefix})
+        for part in pdf["ranges"]
+    ]
+    parts = (yield context.task_all(chunk_tasks)) if chunk_tasks else []
 
-        data_base64 = input.get("data")
-        filename = input.get("filename")
+    # Merge the ranges in page order
+    chunks = yield context.call_activity('merge_staged', {"refs": parts, "blob": f"{staging_prefix}chunks.jsonl"})
 
-        logging.info(f"Reading and chunking PDF: {len(data_base64)} bytes")
+    # Keep one canonical copy of chunks that near-duplicate others in the corpus
+    if environ.get("DEDUP_ENABLED", "true").lower() == "true":
+        chunks = yield context.call_activity('deduplicate_chunks', chunks)
+        context.set_custom_status({"dedup_ratio": chunks["dedup_ratio"], "duplicates": chunks["duplicates"]})
 
+    # Compare with what is already indexed for this document
+    changes = yield context.call_activity('plan_index_update', chunks)
 
-        base64_bytes = data_base64.encode('ascii')
-        pdf_data = base64.b64decode(base64_bytes)
-        pdf_file = io.BytesIO(pdf_data)
-        doc = fitz.open(stream=pdf_file, filetype="pdf")
+    # Generate embeddings (new or changed chunks only), within the batch's share of the quota
+    embeddings = None
+    if changes["count"]:
+        embeddings = yield context.call_activity('generate_embeddings', {
+            **changes, "tokens_per_minute": source.get("tokens_per_minute"),
+        })
 
-        documents = []
-        for index, page in enumerate(doc):
-            documents.append({
-                "page_content": page.get_text(),
-                "metadata": {"title": filename, "page_number": index + 1}
-            })
+    return {"etag": pdf["etag"], "embeddings": embeddings, "stale_ids": changes["stale_ids"]}
+
+
+# Batch Orchestrator Function (INGESTION_MODE=batch)
+@myApp.orchestration_trigger(context_name="context")
+def batch_orchestrator(context):
+    """
+    Ingests the PDFs waiting in the load container as one batch:
+
+    - at most BATCH_MAX_CONCURRENT_DOCUMENTS `document_orchestrator`
+      sub-orchestrations run at once, each embedding within an equal share of
+      EMBEDDING_TPM_LIMIT, so the batch as a whole stays under the quota
+    - embedded documents are uploaded together once BATCH_UPLOAD_CHUNKS chunks
+      are ready (full search batches across documents), then moved and cleaned up
+    - up to BATCH_MAX_FILES blobs per generation; the orchestration continues
+      as new until the load container is empty and stays so for
+      BATCH_IDLE_SECONDS
+
+    Input carries {"failed": {blob: etag}} across generations, so a version
+    that failed is not retried until it is uploaded again.
+    """
+    state = context.get_input() or {}
+    failed = state.get("failed", {})
+    processed = state.get("processed", 0)
+
+    max_documents = int(environ.get("BATCH_MAX_CONCURRENT_DOCUMENTS", "8"))
+    upload_chunks = int(environ.get("BATCH_UPLOAD_CHUNKS", "2000"))
+
+    pending = yield context.call_activity('list_pending_blobs', {
+        "limit": int(environ.get("BATCH_MAX_FILES", "500")), "skip": failed,
+    })
+
+    if not pending:
+        # Uploads that arrive after the listing raise "blobs_added" while idle
+        context.set_custom_status({"state": "idle", "processed": processed, "failed": len(failed)})
+        idle = context.create_timer(
+            context.current_utc_datetime + timedelta(seconds=int(environ.get("BATCH_IDLE_SECONDS", "60")))
+        )
+        added = context.wait_for_external_event("blobs_added")
+        winner = yield context.task_any([added, idle])
+        if winner == added:
+            idle.cancel()
+            context.continue_as_new(state)
+            return None
+        return {"processed": processed, "failed": failed}
+
+    # Verified once per batch, not in every document
+    yield context.call_activity('ensure_search_index', None)
+
+    share = int(environ.get("EMBEDDING_TPM_LIMIT", "120000")) // min(max_documents, len(pending))
+    queue = list(pending)
+    running, ready = [], []
+    sources = {}  # id(task) -> source of the running sub-orchestrations
+
+    def flush():
+        """Upload, prune, move and clean up every embedded document in `ready`."""
+        refs = [doc["embeddings"] for doc in ready if doc["embeddings"]]
+        if refs:
+            yield context.call_activity('update_search_index', {"refs": refs, "count": sum(r["count"] for r in refs)})
+        stale_ids = [chunk_id for doc in ready for chunk_id in doc["stale_ids"]]
+        if stale_ids:
+            yield context.call_activity('delete_stale_chunks', stale_ids)
+        yield context.task_all([
+            context.call_activity('move_blob', {**doc["source"], "etag": doc["etag"]}) for doc in ready
+        ])
+        yield context.task_all([context.call_activity('delete_staged_blobs', doc["staging_prefix"]) for doc in ready])
+        ready.clear()
+
+    while queue or running:
+        while queue and len(running) < max_documents:
+            source = queue.pop(0)
+            task = context.call_sub_orchestrator('document_orchestrator', {
+                **source, "batch": True, "tokens_per_minute": share,
+            }, f"{context.instance_id}-{context.new_uuid()}")
+            running.append(task)
+            sources[id(task)] = source
+
+        done = yield context.task_any(running)
+        running.remove(done)
+        source = sources.pop(id(done))
+        result = done.result if isinstance(done.result, dict) else {
+            "source": source, "staging_prefix": None, "failed": str(done.result),
+        }
+
+        if result.get("failed"):
+            failed[result["source"]["blob"]] = result["source"].get("etag")
+            if not context.is_replaying:
+                logging.error(f"Batch: {result['source']['blob']} failed: {result['failed']}")
+            if result["staging_prefix"]:
+                yield context.call_activity('delete_staged_blobs', result["staging_prefix"])
+        else:
+            ready.append(result)
+            processed += 1
+
+        ready_chunks = sum(doc["embeddings"]["count"] for doc in ready if doc["embeddings"])
+        if ready and (ready_chunks >= upload_chunks or not (queue or running)):
+            yield from flush()
+
+        context.set_custom_status({
+            "state": "running", "processed": processed, "failed": len(failed),
+            "in_flight": len(running), "queued": len(queue),
+        })
+
+    # Pick up whatever was uploaded in the meantime
+    context.continue_as_new({"failed": failed, "processed": processed})
+    return None
+
+
+### Clients ###
+# Created on first use and reused by every activity invocation in the worker.
+# The credentials cache tokens and refresh them before they expire.
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client(name: str, factory):
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                _clients[name] = factory()
+    return _clients[name]
+
+
+def _credential() -> DefaultAzureCredential:
+    return _client("credential", DefaultAzureCredential)
+
+
+def _async_credential() -> AsyncDefaultAzureCredential:
+    return _client("async_credential", AsyncDefaultAzureCredential)
+
+
+def _blob_service_client() -> BlobServiceClient:
+    return _client("blob", lambda: BlobServiceClient(environ.get("AZURE_STORAGE_URL"), credential=_credential()))
+
+
+def _async_blob_service_client() -> AsyncBlobServiceClient:
+    return _client(
+        "async_blob", lambda: AsyncBlobServiceClient(environ.get("AZURE_STORAGE_URL"), credential=_async_credential())
+    )
+
+
+### Staging helpers ###
+
+
+def _stage_jsonl(blob_name: str, records: Iterable[dict], **extra) -> dict:
+    """
+    Stream records as JSON lines to the staging container and return a
+    reference to them. The SDK uploads in blocks, so only one block of
+    records is held in memory at a time.
+    """
+    count = 0
+
+    def lines():
+        nonlocal count
+        for record in records:
+            count += 1
+            yield (json.dumps(record) + "\n").encode("utf-8")
+
+    blob_client = _blob_service_client().get_blob_client(container=STAGING_CONTAINER, blob=blob_name)
+    blob_client.upload_blob(lines(), overwrite=True)
+    return {"container": STAGING_CONTAINER, "blob": blob_name, "count": count, **extra}
+
+
+def _iter_staged(ref: dict) -> Iterator[dict]:
+    """Lazily read the records written by `_stage_jsonl`, one download chunk at a time."""
+    blob_client = _blob_service_client().get_blob_client(container=ref["container"], blob=ref["blob"])
+    pending = b""
+    for data in blob_client.download_blob().chunks():
+        *lines, pending = (pending + data).split(b"\n")
+        for line in lines:
+            if line:
+                yield json.loads(line)
+    if pending.strip():
+        yield json.loads(pending)
 
-        # Chunking
+
+def _windows(records: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    """Group a record stream into lists of at most `size` records."""
+    iterator = iter(records)
+    while window := list(itertools.islice(iterator, size)):
+        yield window
+
+
+@contextmanager
+def _open_pdf(blob_name: str, etag: str = None, container: str = LOAD_CONTAINER):
+    """
+    Download a PDF (from the load container by default) to a temporary file
+    and open it, so PyMuPDF reads pages from disk instead of an in-memory
+    copy. With `etag`, fail if the blob has been replaced since that version
+    was seen.
+    """
+    blob_client = _blob_service_client().get_blob_client(container=container, blob=blob_name)
+    conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+    downloader = blob_client.download_blob(**conditions)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "source.pdf")
+        with open(path, "wb") as pdf_file:
+            downloader.readinto(pdf_file)
+
+        doc = fitz.open(path)
+        try:
+            yield doc, downloader.properties.etag
+        finally:
+            doc.close()
+
+
+def _lookback_pages() -> int:
+    return int(environ.get("PDF_CHUNK_LOOKBACK_PAGES", "2"))
+
+
+def _iter_chunks(doc, filename: str, start_page: int, end_page: int, first_page: int = 0) -> Iterator[dict]:
+    """
+    Extract and split one page at a time, yielding chunk dicts as they are
+    produced. Pages are numbered in the whole PDF; `doc` starts at its page
+    `first_page` when it is a range's part (see get_pdf_info).
+    """
+    if environ.get("DOCUMENT_CHUNKER", "tokens") == "characters":
+        # Legacy character-based splitting, one page at a time
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=int(environ.get("DOCUMENT_CHUNK_SIZE")),
             chunk_overlap=int(environ.get("DOCUMENT_CHUNK_OVERLAP"))
         )
-        chunks = splitter.split_documents([Document(**doc) for doc in documents])
+        pieces = (
+            {"content": text, "page_number": index + 1, "page_end": index + 1}
+            for index in range(start_page, end_page)
+            for text in splitter.split_text(doc.load_page(index - first_page).get_text())
+        )
+    else:
+        # Token budgets, headings and paragraphs; chunks may continue onto the next page
+        def pages(start: int, end: int):
+            return (
+                (index + 1, [block[4] for block in doc.load_page(index - first_page).get_text("blocks") if block[6] == 0])
+                for index in range(start, end)
+            )
+
+        # A range after the first continues the section and overlap of the
+        # pages just before it, read again here (PDF_CHUNK_LOOKBACK_PAGES)
+        chunker = TokenChunker()
+        heading, carry = chunker.lead_in(pages(max(first_page, start_page - _lookback_pages()), start_page))
+        pieces = chunker.chunks(pages(start_page, end_page), heading=heading, carry=carry)
+
+    # Deterministic ids: an unchanged chunk keeps its id across re-uploads
+    occurrences = {}
+    for piece in pieces:
+        text, page_number = piece["content"], piece["page_number"]
+        sha = content_hash(text)
+        occurrence = occurrences.get((page_number, sha), 0)
+        occurrences[(page_number, sha)] = occurrence + 1
+
+        yield {
+            "content": text,
+            "metadata": {
+                "title": filename,
+                "page_number": page_number,
+                "page_end": piece["page_end"],
+                "content_hash": sha,
+                "chunk_id": make_chunk_id(filename, page_number, sha, occurrence),
+            },
+        }
+
+
+def _search_document(chunk: dict, embedding: List[float]) -> dict:
+    """Search index document for a chunk and its vector."""
+    metadata = chunk.get("metadata", {})
+    return {
+        "chunk_id": str(metadata.get("chunk_id")),
+        "content": chunk["content"],
+        "title": str(metadata.get("title")),
+        "pageNumber": str(metadata.get("page_number")),
+        # Chunks may run across pages; pageNumber is the first, pageEnd the last
+        "pageEnd": int(metadata.get("page_end") or metadata.get("page_number")),
+        "sources": metadata.get("sources") or [
+            source_label([metadata.get("title"), metadata.get("page_number"), metadata.get("page_end")])
+        ],
+        "content_vector": embedding
+    }
+
+
+def _embeddings_model() -> AzureOpenAIEmbeddings:
+    # Only text-embedding-3 models accept a reduced output size
+    dimensions = None
+    if EMBEDDING_MODEL_NAME.startswith("text-embedding-3"):
+        dimensions = EMBEDDING_DIMENSIONS
+    elif EMBEDDING_DIMENSIONS != 1536:
+        raise ValueError(f"EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS} is not supported by {EMBEDDING_MODEL_NAME}")
+
+    return _client("embeddings", lambda: AzureOpenAIEmbeddings(
+        azure_deployment=environ.get("AZURE_OPENAI_EMBEDDING"),
+        openai_api_version=environ.get("AZURE_OPENAI_API_VERSION"),
+        azure_endpoint=environ.get("AZURE_OPENAI_ENDPOINT"),
+        # Entra ID token fetched per request from the shared credential's cache
+        azure_ad_token_provider=get_bearer_token_provider(
+            _credential(), "https://cognitiveservices.azure.com/.default"
+        ),
+        dimensions=dimensions,
+        # Throttling is retried by the batcher, which shares one TPM budget
+        max_retries=0,
+    ))
+
+
+def _verify_search_index():
+    """Create or upgrade the index once per process."""
+    index_name = environ["AZURE_AI_SEARCH_INDEX"]
+    if index_name not in _verified_indexes:
+        search_index_client = _client("search_index", lambda: SearchIndexClient(
+            endpoint=environ["AZURE_AI_SEARCH_ENDPOINT"],
+            credential=AzureKeyCredential(environ["AZURE_AI_SEARCH_API_KEY"]),
+        ))
+        if _ensure_search_index(search_index_client, index_name):
+            _verified_indexes.add(index_name)
+
+
+def _search_client() -> SearchClient:
+    return _client("search", lambda: SearchClient(
+        endpoint=environ["AZURE_AI_SEARCH_ENDPOINT"],
+        index_name=environ["AZURE_AI_SEARCH_INDEX"],
+        ### Switched to Key to resolve ###
+        ### - occasional random failures:Failed to get Azure RBAC authorization decision ###
+        credential=AzureKeyCredential(environ["AZURE_AI_SEARCH_API_KEY"]),
+    ))
 
-        for chunk in chunks:
-            chunk.metadata["chunk_id"] = str(uuid.uuid4())
 
-        # Return as list of plain dicts (JSON-serializable)
-        return [{"content": c.page_content, "metadata": c.metadata} for c in chunks]
+def _async_search_client() -> AsyncSearchClient:
+    return _client("async_search", lambda: AsyncSearchClient(
+        endpoint=environ["AZURE_AI_SEARCH_ENDPOINT"],
+        index_name=environ["AZURE_AI_SEARCH_INDEX"],
+        credential=AzureKeyCredential(environ["AZURE_AI_SEARCH_API_KEY"]),
+    ))
+
+
+### Activity Functions ##
+
+# Page count and version of the PDF, and the page ranges to chunk in parallel
+@myApp.activity_trigger(input_name="input")
+async def get_pdf_info(input: dict):
+    """
+    Download the PDF once and plan its page ranges. With more than one range,
+    each range's pages (and the lookback pages before it) are staged as a
+    PDF of their own, so a chunk_pdf activity only downloads its part.
+    """
+    try:
+        blob_client = _async_blob_service_client().get_blob_client(
+            container=LOAD_CONTAINER, blob=input.get("blob", input.get("filename"))
+        )
+        downloader = await blob_client.download_blob()
+        pages_per_activity = input.get("pages_per_activity") or int(environ.get("PDF_PAGES_PER_ACTIVITY", "50"))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "source.pdf")
+            with open(path, "wb") as pdf_file:
+                await downloader.readinto(pdf_file)
+            with fitz.open(path) as doc:
+                page_count = doc.page_count
+                ranges = [
+                    {"start_page": start, "end_page": min(start + pages_per_activity, page_count)}
+                    for start in range(0, page_count, pages_per_activity)
+                ]
+                if len(ranges) > 1:
+                    for part in ranges:
+                        first_page = max(0, part["start_page"] - _lookback_pages())
+                        part_path = os.path.join(tmp, "part.pdf")
+                        with fitz.open() as part_doc:
+                            part_doc.insert_pdf(doc, from_page=first_page, to_page=part["end_page"] - 1)
+                            part_doc.save(part_path, garbage=3, deflate=True)
+                        part["part"] = {
+                            "blob": f"{input['staging_prefix']}pages_{part['start_page']:05d}.pdf",
+                            "first_page": first_page,
+                        }
+                        with open(part_path, "rb") as part_file:
+                            await _async_blob_service_client().get_blob_client(
+                                container=STAGING_CONTAINER, blob=part["part"]["blob"]
+                            ).upload_blob(part_file, overwrite=True)
+
+        logging.info(f"{input.get('filename')}: {page_count} pages in {len(ranges)} ranges")
+        return {"page_count": page_count, "etag": downloader.properties.etag, "ranges": ranges}
+
+    except Exception as ex:
+        logging.error(f"Error reading PDF info: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
+
+
+# Chunking a page range of the PDF
+@myApp.activity_trigger(input_name="input")
+def chunk_pdf(input: dict):
+    try:
+
+        filename = input.get("filename")
+        part = input.get("part")
+        if part:
+            # The range's pages, staged by get_pdf_info
+            opened = _open_pdf(part["blob"], container=STAGING_CONTAINER)
+        else:
+            opened = _open_pdf(input.get("blob", filename), input.get("etag"))
+
+        with opened as (doc, _):
+            first_page = part["first_page"] if part else 0
+            start_page = input.get("start_page", 0)
+            end_page = input.get("end_page", first_page + doc.page_count)
+            logging.info(f"Reading and chunking PDF pages {start_page + 1}-{end_page} of {filename}")
+
+            # Pages are read, split and uploaded as a stream
+            return _stage_jsonl(
+                f"{input['staging_prefix']}chunks_{start_page:05d}.jsonl",
+                _iter_chunks(doc, filename, start_page, end_page, first_page),
+            )
 
     except Exception as ex:
         logging.error(f"Error chunking PDF: {ex}")
@@ -132,48 +609,238 @@ def chunk_pdf(input: dict):
         raise ex
 
 
-# Generate embeddings for the chunks
-@myApp.activity_trigger(input_name="chunks")
-def generate_embeddings(chunks: List[dict]):
+# Concatenate staged results in order
+@myApp.activity_trigger(input_name="input")
+def merge_staged(input: dict):
+    try:
+        return _stage_jsonl(
+            input["blob"],
+            itertools.chain.from_iterable(_iter_staged(ref) for ref in input["refs"]),
+        )
+
+    except Exception as ex:
+        logging.error(f"Error merging staged results: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
+
+
+# Diff the new chunks against the chunks already indexed for the document
+@myApp.activity_trigger(input_name="chunks_ref")
+def plan_index_update(chunks_ref: dict):
     try:
-        logging.info(f"Generating embeddings for {len(chunks)} chunks")
+        chunks = _iter_staged(chunks_ref)
+        first = next(chunks, None)
+        title = first["metadata"]["title"] if first else None
 
-        credential = DefaultAzureCredential()
+        indexed_ids = set()
+        if title:
+            try:
+                escaped = title.replace("'", "''")
+                results = _search_client().search(search_text="*", filter=f"title eq '{escaped}'", select=["chunk_id"])
+                indexed_ids = {r["chunk_id"] for r in results}
+            except ResourceNotFoundError:
+                logging.info("AI Search index not found; every chunk is new.")
 
-        # Set the API type to `azure_ad`
-        environ["OPENAI_API_TYPE"] = "azure_ad"
-        # Set the API_KEY to the token from the Azure credential
-        token = credential.get_token("https://cognitiveservices.azure.com/.default").token
-        environ["OPENAI_API_KEY"] = token
+        # Only ids are kept in memory; changed chunks stream back to staging
+        new_ids = set()
 
-        environ["AZURE_OPENAI_AD_TOKEN"] = environ["OPENAI_API_KEY"]
+        def changed():
+            for chunk in itertools.chain([first] if first else [], chunks):
+                new_ids.add(chunk["metadata"]["chunk_id"])
+                if chunk["metadata"]["chunk_id"] not in indexed_ids:
+                    yield chunk
 
-        embeddings = AzureOpenAIEmbeddings(
-            azure_deployment=environ.get("AZURE_OPENAI_EMBEDDING"),
-            openai_api_version=environ.get("AZURE_OPENAI_API_VERSION"),
-            azure_endpoint=environ.get("AZURE_OPENAI_ENDPOINT"),
-            api_key=environ.get("OPENAI_API_KEY")
+        ref = _stage_jsonl(chunks_ref["blob"].replace("chunks.jsonl", "changed_chunks.jsonl"), changed())
+        # Canonical copies other documents still point to stay in the index
+        stale_ids = sorted(indexed_ids - new_ids - set(chunks_ref.get("retained_ids", [])))
+
+        logging.info(
+            f"{title}: {ref['count']} new or changed chunks, "
+            f"{len(new_ids) - ref['count']} unchanged, {len(stale_ids)} stale"
         )
-        
-        embeddings_list = []
-        for chunk in chunks:
-            content = chunk["content"]
-            metadata = chunk.get("metadata", {})
-            embedding = embeddings.embed_query(content)
-
-            chunk_id = str(metadata.get("chunk_id"))
-            title = str(metadata.get("title"))
-            page_number = str(metadata.get("page_number")) 
-            
-            embeddings_list.append({           
-                "chunk_id": chunk_id,
-                "content": content,
-                "title": title,
-                "pageNumber": page_number,
-                "content_vector": embedding
+        return {**ref, "stale_ids": stale_ids}
+
+    except Exception as ex:
+        logging.error(f"Error planning index update: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
+
+
+# Drop chunks that near-duplicate a canonical chunk elsewhere in the corpus
+@myApp.activity_trigger(input_name="chunks_ref")
+def deduplicate_chunks(chunks_ref: dict):
+    try:
+        chunks = _iter_staged(chunks_ref)
+        first = next(chunks, None)
+        if first is None:
+            return {**chunks_ref, "total": 0, "duplicates": 0, "dedup_ratio": 0.0, "retained_ids": []}
+        title = first["metadata"]["title"]
+
+        # One registry (and thread pool) for all of the document's lookups and updates
+        with DedupRegistry(_blob_service_client()) as registry:
+            previous = registry.document(title)
+
+            # First pass: signatures only, to fetch the LSH buckets they fall in
+            signatures = {}
+            for chunk in itertools.chain([first], chunks):
+                signatures[chunk["metadata"]["chunk_id"]] = minhash(chunk["content"])
+
+            # Compare against other documents' canonical chunks sharing a bucket;
+            # this document's own are rebuilt from its current chunks below
+            index = NearDuplicateIndex()
+            keys = {key for signature in signatures.values() for key in band_keys(signature)}
+            for chunk_id, signature in registry.candidates(keys, exclude_title=title).items():
+                index.add(chunk_id, signature)
+
+            canonical = {}  # chunk_id -> registry entry for this document's canonical chunks
+            duplicates = {}  # chunk_id of another document's canonical chunk -> sources found here
+
+            def unique():
+                for chunk in _iter_staged(chunks_ref):
+                    metadata = chunk["metadata"]
+                    signature = signatures[metadata["chunk_id"]]
+                    source = [title, metadata["page_number"], metadata.get("page_end", metadata["page_number"])]
+                    match = index.find(signature)
+
+                    if match is None:
+                        index.add(metadata["chunk_id"], signature)
+                        canonical[metadata["chunk_id"]] = {"title": title, "signature": signature, "sources": [source]}
+                        yield chunk
+                    elif match in canonical:
+                        if source not in canonical[match]["sources"]:
+                            canonical[match]["sources"].append(source)
+                    elif source not in duplicates.setdefault(match, []):
+                        duplicates[match].append(source)
+
+            ref = _stage_jsonl(chunks_ref["blob"].replace("chunks.jsonl", "unique_chunks.jsonl"), unique())
+            total = len(signatures)
+
+            def others(entry) -> list:
+                return [s for s in entry["sources"] if s[0] != title] if entry else []
+
+            # Each update only touches its own registry entry; returns
+            # (chunk_id, sources to merge into the index or None, retained)
+            def keep(chunk_id):
+                existed = []
+
+                def mutate(current):
+                    existed[:] = [current is not None]
+                    return {**canonical[chunk_id], "sources": canonical[chunk_id]["sources"] + others(current)}
+
+                entry = registry.update(chunk_id, mutate)
+                return chunk_id, entry["sources"] if existed[0] else None, False
+
+            released_signatures = {}
+
+            def release(chunk_id):
+                # No longer in this document, but other documents' copies may point here
+                def mutate(current):
+                    if current is not None:
+                        released_signatures[chunk_id] = current["signature"]
+                    return {**current, "sources": others(current)} if others(current) else None
+
+                entry = registry.update(chunk_id, mutate)
+                return chunk_id, entry["sources"] if entry else None, entry is not None
+
+            def point(chunk_id):
+                def mutate(current):
+                    if current is None:
+                        if chunk_id in duplicates:
+                            logging.warning(
+                                f"Canonical chunk {chunk_id} was removed concurrently; duplicates not recorded"
+                            )
+                        return None
+                    return {**current, "sources": others(current) + duplicates.get(chunk_id, [])}
+
+                entry = registry.update(chunk_id, mutate)
+                return chunk_id, entry["sources"] if entry else None, False
+
+            released = set(previous["canonical"]) - set(canonical)
+            pointed = set(previous["duplicates_of"]) | set(duplicates)
+            updates = [(keep, c) for c in canonical] + [(release, c) for c in released] + [(point, c) for c in pointed]
+            results = registry.map(lambda update: update[0](update[1]), updates)
+            touched = {chunk_id: sources for chunk_id, sources, _ in results if sources is not None}
+            retained = [chunk_id for chunk_id, _, kept in results if kept]
+
+            # Bucket membership of the canonical chunks, batched per shard
+            registry.index(
+                title,
+                members={
+                    **{chunk_id: entry["signature"] for chunk_id, entry in canonical.items()},
+                    **{chunk_id: released_signatures[chunk_id] for chunk_id in retained},
+                },
+                removed={c: sig for c, sig in released_signatures.items() if c not in retained},
+            )
+            registry.save_document(title, {
+                "canonical": sorted(set(canonical) | set(retained)),
+                "duplicates_of": sorted(chunk_id for chunk_id in duplicates if chunk_id in touched),
             })
-        
-        return embeddings_list
+
+        # Canonical copies already in the index get their new list of sources;
+        # new ones carry it through embedding and upload
+        if touched:
+            _verify_search_index()
+            results = _search_client().merge_documents(documents=[
+                {"chunk_id": chunk_id, "sources": [source_label(s) for s in sources]}
+                for chunk_id, sources in touched.items()
+            ])
+            missing = sum(1 for r in results if not r.succeeded)
+            if missing:
+                logging.info(f"{missing} canonical chunks are not indexed yet; their sources are set on upload")
+
+        duplicate_count = total - ref["count"]
+        dedup_ratio = round(duplicate_count / total, 4)
+        logging.info(
+            f"{title}: {duplicate_count} of {total} chunks are near-duplicates (ratio {dedup_ratio}); "
+            f"{len(touched)} canonical chunks shared with other documents"
+        )
+        return {
+            **ref,
+            "total": total,
+            "duplicates": duplicate_count,
+            "dedup_ratio": dedup_ratio,
+            "retained_ids": sorted(retained),
+        }
+
+    except Exception as ex:
+        logging.error(f"Error deduplicating chunks: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
+
+
+# Generate embeddings for the chunks
+@myApp.activity_trigger(input_name="chunks_ref")
+def generate_embeddings(chunks_ref: dict):
+    try:
+        logging.info(f"Generating embeddings for {chunks_ref['count']} chunks")
+
+        # A batch passes each document its share of the deployment's quota
+        batcher = EmbeddingBatcher(_embeddings_model(), tokens_per_minute=chunks_ref.get("tokens_per_minute"))
+        # Reuse vectors of any text embedded before by the same deployment
+        cache = BlobEmbeddingCache(
+            _blob_service_client(), model=f"{environ.get('AZURE_OPENAI_EMBEDDING')}-{EMBEDDING_DIMENSIONS}"
+        )
+
+        def embedded():
+            # Bounded windows keep memory flat however large the document is
+            for chunks in _windows(_iter_staged(chunks_ref), INGESTION_WINDOW_SIZE):
+                hashes = [chunk["metadata"].get("content_hash") or content_hash(chunk["content"]) for chunk in chunks]
+                cached = cache.get_many(hashes)
+
+                # Size- and token-bounded batches, embedded concurrently, in input order
+                missing = [i for i, sha in enumerate(hashes) if sha not in cached]
+                fresh = batcher.embed([chunks[i]["content"] for i in missing])
+                cache.put_many({hashes[i]: vector for i, vector in zip(missing, fresh)})
+
+                vectors = [cached.get(sha) for sha in hashes]
+                for i, vector in zip(missing, fresh):
+                    vectors[i] = vector
+
+                for chunk, embedding in zip(chunks, vectors):
+                    # Compact vector encoding keeps the staged stream small
+                    yield _search_document(chunk, encode_vector(embedding))
+
+        return _stage_jsonl(chunks_ref["blob"].replace("chunks.jsonl", "embeddings.jsonl"), embedded())
 
     except Exception as ex:
         logging.error(f"Error generating embeddings: {ex}")
@@ -184,162 +851,299 @@ def generate_embeddings(chunks: List[dict]):
 
 
 # Update search index with the embeddings
-@myApp.activity_trigger(input_name="embeddings")
-def update_search_index(embeddings):
+@myApp.activity_trigger(input_name="embeddings_ref")
+def update_search_index(embeddings_ref: dict):
     try:
-        logging.info(f"Updating search index with {len(embeddings)} embeddings")
+        logging.info(f"Updating search index with {embeddings_ref['count']} embeddings")
 
-    
-        # Configuration for Azure Cognitive Search
-        search_endpoint = environ["AZURE_AI_SEARCH_ENDPOINT"]
-        index_name = environ["AZURE_AI_SEARCH_INDEX"]
-        search_api_key = environ["AZURE_AI_SEARCH_API_KEY"]
+        # A batch uploads the embeddings of several documents together
+        refs = embeddings_ref.get("refs", [embeddings_ref])
 
-        ### Switched to Key to resolve ###
-        ### - occasional random failures:Failed to get Azure RBAC authorization decision ###
+        # Checked once per process, not on every run
+        _verify_search_index()
 
-        # Initialize the Azure credentials
-        credential = AzureKeyCredential(search_api_key)
+        # Size-bounded batches uploaded concurrently; only failed documents are retried
+        documents = (
+            {
+                "chunk_id": str(embedding["chunk_id"]),
+                "content": str(embedding["content"]),
+                "title": str(embedding["title"]),
+                "pageNumber": str(embedding["pageNumber"]),
+                "pageEnd": int(embedding.get("pageEnd") or embedding["pageNumber"]),
+                "sources": embedding.get("sources") or [],
+                "content_vector": decode_vector(embedding["content_vector"])
+            }
+            for ref in refs
+            for embedding in _iter_staged(ref)
+        )
+        SearchUploader(_search_client()).upload(documents)
 
-        # Create SearchClient
-        search_client = SearchClient(endpoint=search_endpoint, index_name=index_name, credential=credential)
+    except Exception as ex:
+        logging.error(f"Error updating search index: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
 
-        # Create SearchIndexClient
-        search_index_client = SearchIndexClient(endpoint=search_endpoint, credential=credential)
 
-        # Check if the index exists and contains documents
-        index_exists = False
-        try:
-            logging.info("Verifying if AI Search index exists...")
-            search_index_client.get_index(index_name)
-            index_exists = True
-        except ResourceNotFoundError:
-            logging.info("AI Search index not found, creating index...")
-
-        # Create the index if it doesn't exist
-        if not index_exists:
-            semantic_config = SemanticConfiguration(
-                name="default",
-                prioritized_fields=SemanticPrioritizedFields(
-                    title_field=SemanticField(field_name="title"),
-                    content_fields=[SemanticField(field_name="content")]
-                )
+def _vector_compression():
+    """
+    Quantized HNSW graph for content_vector, per AZURE_AI_SEARCH_VECTOR_COMPRESSION:
+    "scalar" (int8, default), "binary" (1 bit per dimension) or "none". Queries
+    oversample the quantized candidates and rescore them with the full vectors.
+    """
+    kind = environ.get("AZURE_AI_SEARCH_VECTOR_COMPRESSION", "scalar")
+    oversampling = float(environ.get("AZURE_AI_SEARCH_VECTOR_OVERSAMPLING", "4"))
+    if kind == "scalar":
+        return ScalarQuantizationCompression(
+            compression_name="my-compression-config",
+            rerank_with_original_vectors=True,
+            default_oversampling=oversampling,
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+        )
+    if kind == "binary":
+        return BinaryQuantizationCompression(
+            compression_name="my-compression-config",
+            rerank_with_original_vectors=True,
+            default_oversampling=oversampling,
+        )
+    if kind != "none":
+        raise ValueError(f"Unknown AZURE_AI_SEARCH_VECTOR_COMPRESSION: {kind}")
+    return None
+
+
+def _vector_field() -> SearchField:
+    """
+    content_vector, stored as half precision unless AZURE_AI_SEARCH_VECTOR_PRECISION
+    is "single" (binary quantization always uses single). The retrievable copy of
+    the vectors is dropped unless AZURE_AI_SEARCH_STORE_VECTORS is "true";
+    nothing reads vectors back from the index.
+    """
+    half = (
+        environ.get("AZURE_AI_SEARCH_VECTOR_PRECISION", "half") == "half"
+        and environ.get("AZURE_AI_SEARCH_VECTOR_COMPRESSION", "scalar") != "binary"
+    )
+    stored = environ.get("AZURE_AI_SEARCH_STORE_VECTORS", "false").lower() == "true"
+    return SearchField(
+        name="content_vector",
+        type="Collection(Edm.Half)" if half else "Collection(Edm.Single)",
+        vector_search_dimensions=EMBEDDING_DIMENSIONS,
+        vector_search_profile_name="my-vector-config",
+        hidden=not stored,
+        stored=stored,
+    )
+
+
+def _added_fields() -> List[SimpleField]:
+    """Fields added after the index was first released; existing indexes are upgraded."""
+    return [
+        SimpleField(name="sources", type="Collection(Edm.String)", filterable=True),
+        SimpleField(name="pageEnd", type="Edm.Int32", filterable=True, sortable=True),
+    ]
+
+
+def _ensure_search_index(search_index_client: SearchIndexClient, index_name: str) -> bool:
+    """Create the index if it is missing; return whether it now exists."""
+    # Check if the index exists and contains documents
+    index_exists = False
+    try:
+        logging.info("Verifying if AI Search index exists...")
+        existing = search_index_client.get_index(index_name)
+        index_exists = True
+
+        # Indexes created before near-duplicate detection (sources) or
+        # multi-page chunks (pageEnd) lack those fields
+        missing = [field for field in _added_fields() if not any(f.name == field.name for f in existing.fields)]
+        if missing:
+            logging.info(f"Adding {[field.name for field in missing]} to the AI Search index...")
+            existing.fields.extend(missing)
+            search_index_client.create_or_update_index(existing)
+    except ResourceNotFoundError:
+        logging.info("AI Search index not found, creating index...")
+
+    # Create the index if it doesn't exist
+    if not index_exists:
+        compression = _vector_compression()
+        semantic_config = SemanticConfiguration(
+            name="default",
+            prioritized_fields=SemanticPrioritizedFields(
+                title_field=SemanticField(field_name="title"),
+                content_fields=[SemanticField(field_name="content")]
             )
+        )
 
-            index = SearchIndex(
-                name=index_name,
-                fields=[
-                    SimpleField(name="chunk_id", type="Edm.String", key=True, filterable=True, sortable=True),
-                    SearchableField(name="content", type="Edm.String", filterable=True, sortable=True),
-                    SearchableField(name="title", type="Edm.String", filterable=True, sortable=True),
-                    SearchableField(name="pageNumber", type="Edm.Int", filterable=True, sortable=True),
-                    SearchField(name="content_vector", type="Collection(Edm.Single)", vector_search_dimensions=1536, vector_search_profile_name="my-vector-config")
-                ],
-                semantic_search=SemanticSearch(configurations=[semantic_config]),
-                vector_search=VectorSearch(
-                    profiles=[VectorSearchProfile(name="my-vector-config", algorithm_configuration_name="my-algorithms-config",vectorizer_name="my-vectorizer")],
-                    algorithms=[HnswAlgorithmConfiguration(name="my-algorithms-config", kind="hnsw")],
-                    vectorizers=[
-                    AzureOpenAIVectorizer(
-                        vectorizer_name="my-vectorizer",
-                        kind= "azureOpenAI",
-                         parameters=AzureOpenAIVectorizerParameters(
-                                resource_url=environ["AZURE_OPENAI_ENDPOINT"],   
-                                deployment_name=environ["AZURE_OPENAI_EMBEDDING"],
-                                model_name="text-embedding-ada-002",
-                                auth_identity= SearchIndexerDataUserAssignedIdentity(odata_type="#Microsoft.Azure.Search.DataUserAssignedIdentity",
-                                 resource_id=str(environ["AZURE_CLIENT_RESOURCE_ID"]))
-                                )
-                        )
-                ]
-                )
-                
+        index = SearchIndex(
+            name=index_name,
+            fields=[
+                SimpleField(name="chunk_id", type="Edm.String", key=True, filterable=True, sortable=True),
+                SearchableField(name="content", type="Edm.String", filterable=True, sortable=True),
+                SearchableField(name="title", type="Edm.String", filterable=True, sortable=True),
+                SearchableField(name="pageNumber", type="Edm.Int", filterable=True, sortable=True),
+                *_added_fields(),
+                _vector_field()
+            ],
+            semantic_search=SemanticSearch(configurations=[semantic_config]),
+            vector_search=VectorSearch(
+                profiles=[VectorSearchProfile(name="my-vector-config", algorithm_configuration_name="my-algorithms-config",vectorizer_name="my-vectorizer",
+                                              compression_name=compression.compression_name if compression else None)],
+                algorithms=[HnswAlgorithmConfiguration(name="my-algorithms-config", kind="hnsw")],
+                compressions=[compression] if compression else None,
+                vectorizers=[
+                AzureOpenAIVectorizer(
+                    vectorizer_name="my-vectorizer",
+                    kind= "azureOpenAI",
+                     parameters=AzureOpenAIVectorizerParameters(
+                            resource_url=environ["AZURE_OPENAI_ENDPOINT"],   
+                            deployment_name=environ["AZURE_OPENAI_EMBEDDING"],
+                            model_name=EMBEDDING_MODEL_NAME,
+                            auth_identity= SearchIndexerDataUserAssignedIdentity(odata_type="#Microsoft.Azure.Search.DataUserAssignedIdentity",
+                             resource_id=str(environ["AZURE_CLIENT_RESOURCE_ID"]))
+                            )
+                    )
+            ]
             )
 
-            try:
-                search_index_client.create_index(index)
-            except Exception as ex:
-                logging.error(f"Error creating search index: {ex}")
-                logging.error(traceback.format_exc())
+        )
 
-        # Now process the embeddings and upload them in batches
-        documents = []
-        batch_size = int(environ.get("AZURE_AI_SEARCH_BATCH_SIZE"))
-        total_batches = (len(embeddings) + batch_size - 1) // batch_size
-        batches_processed = 0
+        try:
+            search_index_client.create_index(index)
+        except Exception as ex:
+            logging.error(f"Error creating search index: {ex}")
+            logging.error(traceback.format_exc())
+            return False
 
-        for index, embedding in enumerate(embeddings):
-            try:
-                # Prepare the metadata and content for the index
-                chunk_id = str(embedding["chunk_id"])
-                content = str(embedding["content"])
-                title = str(embedding["title"])
-                page_number = str(embedding["pageNumber"])
-                content_vector = embedding["content_vector"]
-
-                # Add the document to the batch
-                documents.append({
-                    "chunk_id": chunk_id,
-                    "content": content,
-                    "title": title,
-                    "pageNumber": page_number,
-                    "content_vector": content_vector
-                })
-
-                # Upload the batch if the batch size is reached or this is the last document
-                if (index + 1) % batch_size == 0 or (index + 1) == len(embeddings):
-                    result = search_client.upload_documents(documents=documents)
-
-                    batches_processed += 1
-                    batches_remaining = total_batches - batches_processed
-                    logging.info(f"Batch {batches_processed}/{total_batches} uploaded. Remaining: {batches_remaining}")
-
-                    # Clear the documents list for the next batch
-                    documents = []
-            except Exception as ex:
-                logging.error(f"Error processing embedding: {ex}")
-                logging.info((embedding))
-                raise ex
+    return True
+
+
+# PDFs waiting in the load container, for a batch
+@myApp.activity_trigger(input_name="input")
+async def list_pending_blobs(input: dict):
+    try:
+        skip = input.get("skip", {})
+        container_client = _async_blob_service_client().get_container_client(LOAD_CONTAINER)
+
+        pending = []
+        async for blob in container_client.list_blobs():
+            if not blob.name.lower().endswith(".pdf") or skip.get(blob.name) == blob.etag:
+                continue
+            pending.append({
+                "filename": blob.name.split("/")[-1],
+                "blob": blob.name,
+                "size": blob.size,
+                "etag": blob.etag,
+            })
+            if len(pending) >= input.get("limit", 500):
+                break
+
+        logging.info(f"{len(pending)} PDFs pending in the load container")
+        return pending
 
     except Exception as ex:
-        logging.error(f"Error updating search index: {ex}")
+        logging.error(f"Error listing pending blobs: {ex}")
         logging.error(traceback.format_exc())
         raise ex
 
 
+# Create or upgrade the search index once, ahead of a batch
+@myApp.activity_trigger(input_name="input")
+def ensure_search_index(input):
+    try:
+        _verify_search_index()
+        if environ["AZURE_AI_SEARCH_INDEX"] not in _verified_indexes:
+            raise RuntimeError("Search index does not exist and could not be created.")
+
+    except Exception as ex:
+        logging.error(f"Error verifying search index: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
+
+
+# Remove chunks of a re-uploaded document that no longer exist
+@myApp.activity_trigger(input_name="stale_ids")
+async def delete_stale_chunks(stale_ids: List[str]):
+    try:
+        logging.info(f"Deleting {len(stale_ids)} stale chunks from the search index")
+
+        search_client = _async_search_client()
+        batch_size = int(environ.get("AZURE_AI_SEARCH_BATCH_SIZE"))
+        limit = asyncio.Semaphore(int(environ.get("AZURE_AI_SEARCH_MAX_CONCURRENCY", "4")))
+
+        async def delete(batch: List[str]):
+            async with limit:
+                await search_client.delete_documents(documents=[{"chunk_id": chunk_id} for chunk_id in batch])
+
+        await asyncio.gather(*(
+            delete(stale_ids[start:start + batch_size]) for start in range(0, len(stale_ids), batch_size)
+        ))
+
+    except Exception as ex:
+        logging.error(f"Error deleting stale chunks: {ex}")
+        logging.error(traceback.format_exc())
+        raise ex
+
 
 # Move the processed blob to the "completed" container
 @myApp.activity_trigger(input_name="input")
-def move_blob(input: dict):
+async def move_blob(input: dict):
     try:
 
-        data_base64 = input.get("data")
         filename = input.get("filename")
+        blob_name = input.get("blob", filename)
+        etag = input.get("etag")
 
         logging.info(f"Moving blob {filename} to the completed container")
 
-        base64_bytes = data_base64.encode('ascii')
-        pdf_data = base64.b64decode(base64_bytes)
+        blob_service_client = _async_blob_service_client()
+        blob_client = blob_service_client.get_blob_client(container=LOAD_CONTAINER, blob=blob_name)
+        completed_blob_client = blob_service_client.get_blob_client(container=COMPLETED_CONTAINER, blob=blob_name)
+
+        # Server-side copy of the version that was indexed; a newer upload has its own orchestration
+        try:
+            await completed_blob_client.start_copy_from_url(
+                blob_client.url, source_etag=etag, source_match_condition=MatchConditions.IfNotModified
+            )
+        except HttpResponseError as ex:
+            # 412 SourceConditionNotMet is not mapped to ResourceModifiedError
+            if ex.status_code not in (404, 412):
+                raise
+            logging.warning(f"Blob {blob_name} changed or was removed since it was indexed; leaving it in place.")
+            return
 
-        container_name = "load"
-        completed_container = "completed"
+        # Same-account copies usually complete at once; poll in case they don't
+        timeout = float(environ.get("BLOB_COPY_TIMEOUT_SECONDS", "300"))
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        copy = (await completed_blob_client.get_blob_properties()).copy
+        while copy.status == "pending":
+            if time.monotonic() > deadline:
+                await completed_blob_client.abort_copy(copy.id)
+                raise TimeoutError(f"Copy of {blob_name} did not finish within {timeout:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+            copy = (await completed_blob_client.get_blob_properties()).copy
 
-        # Blob storage logic to move the file
-        credential = DefaultAzureCredential()
-        AZURE_STORAGE_URL = environ.get("AZURE_STORAGE_URL")
+        if copy.status != "success":
+            raise RuntimeError(f"Copy of {blob_name} ended with status {copy.status}: {copy.status_description}")
 
-        # Create the BlobServiceClient object    
-        blob_service_client =  BlobServiceClient(AZURE_STORAGE_URL, credential=credential)    
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=filename)
-        
-        # Upload to completed container
-        completed_blob_client = blob_service_client.get_blob_client(container=completed_container, blob=filename)
-        completed_blob_client.upload_blob(pdf_data, overwrite=True)
-        
-        logging.info(f"Deleted blob: {filename}")
-        blob_client.delete_blob()
+        # Delete the source only if it is still the version that was copied
+        try:
+            await blob_client.delete_blob(etag=etag, match_condition=MatchConditions.IfNotModified)
+            logging.info(f"Deleted blob: {filename}")
+        except (ResourceModifiedError, ResourceNotFoundError):
+            logging.warning(f"Blob {blob_name} changed during the move; leaving the new version in place.")
 
     except Exception as ex:
         logging.error(f"Error moving blob: {ex}")
         logging.error(traceback.format_exc())
         raise ex
+
+
+# Remove the intermediate results of an orchestration
+@myApp.activity_trigger(input_name="prefix")
+async def delete_staged_blobs(prefix: str):
+    try:
+        container_client = _async_blob_service_client().get_container_client(STAGING_CONTAINER)
+        names = [blob.name async for blob in container_client.list_blobs(name_starts_with=prefix)]
+        await asyncio.gather(*(container_client.delete_blob(name) for name in names))
+
+    except Exception as ex:
+        # Leftovers are harmless; don't fail an otherwise completed ingestion
+        logging.warning(f"Error deleting staged blobs under {prefix}: {ex}")
@@ -0,0 +1,277 @@
+"""
+Near-duplicate chunk detection with MinHash and locality-sensitive hashing.
+
+Each chunk is reduced to a MinHash signature of its word 5-gram shingles.
+Signatures are split into LSH bands so that only chunks sharing a band are
+compared. A chunk whose estimated Jaccard similarity with an already known
+chunk reaches the threshold is a duplicate of that (canonical) chunk.
+
+The corpus-wide set of canonical chunks is kept in blob storage
+(`DedupRegistry`), so a document only reads and writes what it shares with
+others instead of a corpus-wide file:
+
+    dedup/chunks/<chunk id>.json       canonical chunk: owning title,
+                                       signature and the sources
+                                       ([title, first page, last page])
+                                       it stands for
+    dedup/buckets/<band>/<prefix>.json LSH buckets of one band whose key
+                                       starts with <prefix>: bucket key ->
+                                       {chunk id: owning document}
+    dedup/documents/<doc>.json         the chunks a document owns or
+                                       added sources to
+
+A document reads each bucket shard its signatures fall in once, and writes
+each shard whose membership it changes once. Chunk entries and shards are
+updated under their ETags, so concurrent orchestrations only contend on
+what they both touch. Two documents ingested at the same moment may still
+both keep a copy of a chunk they share, since neither sees the other's new
+chunks while it runs.
+
+Configuration:
+    DEDUP_ENABLED               "true" (default) or "false"
+    DEDUP_THRESHOLD             estimated Jaccard similarity for a duplicate (default 0.85)
+    DEDUP_REGISTRY_PREFIX       registry blob prefix in EMBEDDING_CACHE_CONTAINER
+                                (default "dedup/")
+    DEDUP_REGISTRY_CONCURRENCY  parallel registry requests (default 32)
+    DEDUP_BUCKET_SHARD_CHARS    bucket key characters per shard name, i.e. 16^n
+                                shards per band (default 1: a document reads and
+                                writes at most 256 shards; raise it for corpora
+                                of hundreds of thousands of chunks to keep
+                                shards small)
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """64-bit hashes of the normalized word n-grams of `text`."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        words = words or [""]
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return {int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams}
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of `text`."""
+    values = shingles(text)
+    return [min((a * v + b) % _PRIME for v in values) for a, b in _PERMUTATIONS]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    return [
+        f"{band}:" + hashlib.blake2b(
+            ",".join(map(str, signature[band * ROWS:(band + 1) * ROWS])).encode(), digest_size=8
+        ).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+def source_label(source: List) -> str:
+    """Display form of a [title, page] or [title, first page, last page] source."""
+    if len(source) > 2 and source[2] not in (None, source[1]):
+        return f"{source[0]} (pages {source[1]}-{source[2]})"
+    return f"{source[0]} (page {source[1]})"
+
+
+class NearDuplicateIndex:
+    """In-memory LSH index over canonical chunk signatures."""
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = threshold or float(environ.get("DEDUP_THRESHOLD", "0.85"))
+        self.signatures: Dict[str, List[int]] = {}
+        self._buckets: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, chunk_id: str, signature: List[int]):
+        self.signatures[chunk_id] = signature
+        for key in band_keys(signature):
+            self._buckets[key].add(chunk_id)
+
+    def remove(self, chunk_id: str):
+        signature = self.signatures.pop(chunk_id, None)
+        if signature is not None:
+            for key in band_keys(signature):
+                self._buckets[key].discard(chunk_id)
+
+    def find(self, signature: List[int]) -> Optional[str]:
+        """The most similar known chunk at or above the threshold, if any."""
+        candidates = set().union(*(self._buckets.get(key, ()) for key in band_keys(signature)))
+        best, best_score = None, self.threshold
+        for chunk_id in candidates:
+            score = similarity(signature, self.signatures[chunk_id])
+            if score >= best_score:
+                best, best_score = chunk_id, score
+        return best
+
+
+class DedupRegistry:
+    """
+    Corpus-wide canonical chunks: one blob per chunk and per document, and
+    LSH bucket membership in shard blobs. Use as a context manager; one
+    thread pool serves all of a document's registry requests.
+    """
+
+    def __init__(self, blob_service_client):
+        self.container_client = blob_service_client.get_container_client(
+            environ.get("EMBEDDING_CACHE_CONTAINER", "embeddingcache")
+        )
+        self.prefix = environ.get("DEDUP_REGISTRY_PREFIX", "dedup/")
+        self.shard_chars = int(environ.get("DEDUP_BUCKET_SHARD_CHARS", "1"))
+        self._pool = ThreadPoolExecutor(max_workers=int(environ.get("DEDUP_REGISTRY_CONCURRENCY", "32")))
+        # Shard name -> (bucket key -> {chunk id: owning document key}, etag) as last read
+        self._shards: Dict[str, tuple] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._pool.shutdown()
+
+    @staticmethod
+    def document_key(title: str) -> str:
+        return hashlib.sha1(title.encode("utf-8")).hexdigest()[:16]
+
+    def map(self, fn: Callable, items: Iterable) -> list:
+        """`fn` over `items` on the registry's threads, in order."""
+        return list(self._pool.map(fn, items))
+
+    def _read(self, name: str):
+        try:
+            downloader = self.container_client.download_blob(self.prefix + name)
+        except ResourceNotFoundError:
+            return None, None
+        return json.loads(downloader.readall()), downloader.properties.etag
+
+    def _modify(self, name: str, mutate: Callable, attempts: int = 8, current=None):
+        """
+        Replace blob `name` with `mutate(current content or None)` under its
+        ETag; None deletes it. Re-reads and re-applies on a concurrent write,
+        so `mutate` must be idempotent. `current` is an already read
+        (content, etag) pair. Returns the new content.
+        """
+        for attempt in range(attempts):
+            content, etag = current or self._read(name)
+            current = None
+            updated = mutate(content)
+            try:
+                if updated is None:
+                    if content is not None:
+                        self.container_client.delete_blob(
+                            self.prefix + name, etag=etag, match_condition=MatchConditions.IfNotModified
+                        )
+                elif content is None:
+                    self.container_client.upload_blob(self.prefix + name, json.dumps(updated), overwrite=False)
+                elif updated != content:
+                    self.container_client.upload_blob(
+                        self.prefix + name, json.dumps(updated), overwrite=True,
+                        etag=etag, match_condition=MatchConditions.IfNotModified,
+                    )
+                return updated
+            except (ResourceExistsError, ResourceModifiedError, ResourceNotFoundError):
+                logging.info(f"Dedup registry blob {name} changed concurrently; retry {attempt + 1}/{attempts}")
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        raise RuntimeError(f"Could not update dedup registry blob {name} after concurrent writes")
+
+    # Documents
+    def document(self, title: str) -> dict:
+        """What `title` owned and contributed sources to when it was last ingested."""
+        record, _ = self._read(f"documents/{self.document_key(title)}.json")
+        return record or {"canonical": [], "duplicates_of": []}
+
+    def save_document(self, title: str, record: dict):
+        # Only the orchestration of this document writes its record
+        self.container_client.upload_blob(
+            self.prefix + f"documents/{self.document_key(title)}.json", json.dumps(record), overwrite=True
+        )
+
+    # Buckets
+    def _shard(self, key: str) -> str:
+        band, digest = key.split(":")
+        return f"buckets/{band}/{digest[:self.shard_chars]}.json"
+
+    def _load_shards(self, keys: Iterable[str]):
+        names = sorted({self._shard(key) for key in keys} - set(self._shards))
+        for name, (content, etag) in zip(names, self.map(self._read, names)):
+            self._shards[name] = (content or {}, etag)
+
+    def candidates(self, keys: Iterable[str], exclude_title: str) -> Dict[str, List[int]]:
+        """Signatures of other documents' canonical chunks sharing any of the LSH band `keys`."""
+        own = self.document_key(exclude_title)
+        keys = set(keys)
+        self._load_shards(keys)
+        ids = sorted({
+            chunk_id
+            for key in keys
+            for chunk_id, owner in self._shards[self._shard(key)][0].get(key, {}).items()
+            if owner != own
+        })
+        entries = self.map(lambda chunk_id: self._read(f"chunks/{chunk_id}.json")[0], ids)
+        return {chunk_id: entry["signature"] for chunk_id, entry in zip(ids, entries) if entry}
+
+    def index(self, title: str, members: Dict[str, List[int]], removed: Dict[str, List[int]]):
+        """
+        Set the bucket membership of `title`'s canonical chunks (chunk id ->
+        signature) and drop that of its `removed` ones, one conditional write
+        per shard whose content changes.
+        """
+        own = self.document_key(title)
+        changes = defaultdict(list)  # shard -> [(key, chunk id, owner or None)]
+        for chunks, owner in ((removed, None), (members, own)):
+            for chunk_id, signature in chunks.items():
+                for key in band_keys(signature):
+                    changes[self._shard(key)].append((key, chunk_id, owner))
+        self._load_shards(key for updates in changes.values() for key, _, _ in updates)
+
+        def apply(name: str):
+            def mutate(buckets):
+                buckets = {key: dict(ids) for key, ids in (buckets or {}).items()}
+                for key, chunk_id, owner in changes[name]:
+                    if owner is None:
+                        buckets.get(key, {}).pop(chunk_id, None)
+                        if not buckets.get(key, True):
+                            del buckets[key]
+                    else:
+                        buckets.setdefault(key, {})[chunk_id] = owner
+                return buckets
+
+            content, etag = self._shards[name]
+            self._modify(name, mutate, current=(content if etag else None, etag))
+
+        self.map(apply, sorted(changes))
+
+    # Entries
+    def update(self, chunk_id: str, mutate: Callable[[Optional[dict]], Optional[dict]]) -> Optional[dict]:
+        """
+        Replace the entry of `chunk_id` with `mutate(current entry or None)`;
+        None deletes it (see `_modify`). Bucket membership is set by `index`.
+        """
+        return self._modify(f"chunks/{chunk_id}.json", mutate)
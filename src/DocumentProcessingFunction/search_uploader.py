@@ -0,0 +1,146 @@
+"""
+Concurrent, payload-size-aware document upload to Azure AI Search.
+
+Documents are grouped into batches bounded by document count and by
+serialized request size (vectors make documents large), several batches are
+uploaded at once, and only the documents that fail with a retryable status
+in a partial (207) response are sent again, with backoff.
+
+Configuration:
+    AZURE_AI_SEARCH_BATCH_SIZE        max documents per request
+    AZURE_AI_SEARCH_BATCH_MAX_BYTES   max serialized request size (default 12 MiB,
+                                      under the service's 16 MB limit)
+    AZURE_AI_SEARCH_MAX_CONCURRENCY   concurrent requests (default 4)
+    AZURE_AI_SEARCH_MAX_RETRIES       retries of failed documents (default 5)
+"""
+
+import json
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from os import environ
+from typing import Iterable, Iterator, List, Optional
+
+from azure.core.exceptions import HttpResponseError
+
+# Per-document statuses worth retrying: version conflict, throttling, unavailable
+RETRYABLE_STATUS_CODES = {409, 422, 429, 503}
+
+
+class SearchUploadError(Exception):
+    """Raised when documents still fail after all retries."""
+
+    def __init__(self, failed: List[dict]):
+        super().__init__(
+            f"{len(failed)} documents failed to upload, e.g. {failed[0]['key']}: {failed[0]['error']}"
+        )
+        self.failed = failed
+
+
+class SearchUploader:
+    def __init__(
+        self,
+        search_client,
+        batch_size: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        key_field: str = "chunk_id",
+    ):
+        self.search_client = search_client
+        self.batch_size = batch_size or int(environ.get("AZURE_AI_SEARCH_BATCH_SIZE", "100"))
+        self.max_batch_bytes = max_batch_bytes or int(
+            environ.get("AZURE_AI_SEARCH_BATCH_MAX_BYTES", str(12 * 1024 * 1024))
+        )
+        self.max_concurrency = max_concurrency or int(environ.get("AZURE_AI_SEARCH_MAX_CONCURRENCY", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(
+            environ.get("AZURE_AI_SEARCH_MAX_RETRIES", "5")
+        )
+        self.key_field = key_field
+
+    def batches(self, documents: Iterable[dict]) -> Iterator[List[dict]]:
+        """Group documents by count and serialized size; an oversized document goes alone."""
+        batch, batch_bytes = [], 0
+        for document in documents:
+            size = len(json.dumps(document)) + 64  # action envelope
+            if batch and (len(batch) >= self.batch_size or batch_bytes + size > self.max_batch_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(document)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def _backoff(self, attempt: int):
+        delay = min(30.0, 2.0 ** attempt)
+        time.sleep(delay + random.uniform(0, delay * 0.25))
+
+    def _upload_batch(self, documents: List[dict]) -> List[dict]:
+        """Upload one batch, retrying failed documents; return the ones that never succeeded."""
+        pending, rejected, attempt = documents, [], 0
+        while True:
+            try:
+                results = self.search_client.upload_documents(documents=pending)
+            except HttpResponseError as ex:
+                # Whole request throttled or unavailable
+                if ex.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logging.warning(f"Search upload returned {ex.status_code}; retry {attempt}/{self.max_retries}")
+                self._backoff(attempt)
+                continue
+
+            failed = {r.key: r for r in results if not r.succeeded}
+            retryable = []
+            for document in pending:
+                result = failed.get(document[self.key_field])
+                if result is None:
+                    continue
+                if result.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    retryable.append(document)
+                else:
+                    rejected.append({"key": result.key, "status_code": result.status_code,
+                                     "error": result.error_message})
+
+            if not retryable:
+                return rejected
+
+            attempt += 1
+            logging.warning(
+                f"{len(retryable)} of {len(pending)} documents failed; retry {attempt}/{self.max_retries}"
+            )
+            self._backoff(attempt)
+            pending = retryable
+
+    def upload(self, documents: Iterable[dict]) -> int:
+        """
+        Upload a document stream, keeping at most `max_concurrency` batches in
+        flight. Returns the number of documents uploaded; raises
+        SearchUploadError if any document failed permanently.
+        """
+        uploaded = 0
+        failed: List[dict] = []
+        in_flight: dict = {}
+
+        def collect(done: Iterable[Future]):
+            nonlocal uploaded
+            for future in done:
+                batch_failed = future.result()
+                uploaded += in_flight.pop(future) - len(batch_failed)
+                failed.extend(batch_failed)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for number, batch in enumerate(self.batches(documents), start=1):
+                if len(in_flight) >= self.max_concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(self._upload_batch, batch)] = len(batch)
+                logging.info(f"Batch {number} ({len(batch)} documents) submitted")
+
+            collect(wait(in_flight).done)
+
+        logging.info(f"Uploaded {uploaded} documents, {len(failed)} failed")
+        if failed:
+            raise SearchUploadError(failed)
+        return uploaded
@@ -0,0 +1,86 @@
+from chunker import TokenChunker, is_heading, page_units
+from embedding_batcher import count_tokens
+
+POLICY = (
+    "Employees accrue paid leave monthly. Unused leave carries over to the next year. "
+    "Requests must be approved by a manager at least two weeks in advance. "
+)
+
+
+def _chunks(pages, **kwargs):
+    return list(TokenChunker(**kwargs).chunks(pages))
+
+
+def test_heading_detection():
+    assert is_heading("1. Scope")
+    assert is_heading("LEAVE TYPE")
+    assert is_heading("Approved By Human Resources")
+    assert not is_heading("Employees accrue paid leave monthly.")
+
+
+def test_page_units_split_leading_headings():
+    units = list(page_units(["Annual Leave\nEmployees accrue paid leave\nmonthly."]))
+    assert units == [("heading", "Annual Leave"), ("paragraph", "Employees accrue paid leave monthly.")]
+
+
+def test_heading_only_page_is_kept():
+    chunks = _chunks([(1, ["LEAVE TYPE\nPaid Leave\nUnpaid Leave\nSick Leave"])])
+    assert len(chunks) == 1
+    for line in ("LEAVE TYPE", "Paid Leave", "Unpaid Leave", "Sick Leave"):
+        assert line in chunks[0]["content"]
+
+
+def test_trailing_heading_lines_are_kept():
+    pages = [
+        (1, ["1. Scope\n" + POLICY * 20]),
+        (2, ["Approved By Human Resources\nEffective Date January 2024"]),
+    ]
+    chunks = _chunks(pages, max_tokens=256, overlap_tokens=16, min_tokens=1)
+    content = "\n".join(c["content"] for c in chunks)
+    assert "Approved By Human Resources" in content
+    assert "Effective Date January 2024" in content
+    assert chunks[-1]["page_end"] == 2
+
+
+def test_long_run_of_short_lines_is_flushed_within_budget():
+    lines = "\n".join(f"Leave Category {chr(ord('A') + i % 26)}" for i in range(80))
+    chunks = _chunks([(1, [lines])], max_tokens=40, overlap_tokens=0, min_tokens=10)
+    assert len(chunks) > 1
+    assert all(count_tokens(c["content"]) <= 40 + 10 for c in chunks)
+    assert sum(c["content"].count("Leave Category") for c in chunks) == 80
+
+
+def test_oversized_sentence_is_split_within_budget():
+    sentence = " ".join(f"clause{i}" for i in range(400))
+    chunks = _chunks([(1, [sentence])], max_tokens=64, overlap_tokens=0, min_tokens=1)
+    assert len(chunks) > 1
+    assert all(count_tokens(c["content"]) <= 64 + 2 for c in chunks)
+    assert "".join(c["content"] for c in chunks).replace(" ", "") == sentence.replace(" ", "")
+
+
+def test_chunks_flow_across_pages():
+    pages = [(1, ["Annual Leave\n" + POLICY]), (2, [POLICY])]
+    chunks = _chunks(pages, max_tokens=512, overlap_tokens=0)
+    assert len(chunks) == 1
+    assert (chunks[0]["page_number"], chunks[0]["page_end"]) == (1, 2)
+
+
+def test_empty_input():
+    assert _chunks([]) == []
+    assert _chunks([(1, [])]) == []
+
+
+def test_lead_in_continues_section_across_ranges():
+    chunker = TokenChunker(max_tokens=96, overlap_tokens=32)
+    before = [(1, ["Annual Leave\n" + POLICY])]
+    heading, carry = chunker.lead_in(before)
+    assert heading == "Annual Leave"
+    assert carry and POLICY.strip().endswith(carry)
+
+    chunks = list(chunker.chunks([(2, [POLICY])], heading=heading, carry=carry))
+    assert chunks[0]["content"].startswith("Annual Leave\n\n" + carry)
+    assert chunks[0]["page_number"] == 2
+
+
+def test_lead_in_of_no_pages():
+    assert TokenChunker().lead_in([]) == (None, "")
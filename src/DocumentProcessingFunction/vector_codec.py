@@ -0,0 +1,30 @@
+"""
+Compact transport of embedding vectors between activities.
+
+Staged vectors are written as base64 of little-endian float16 values
+instead of JSON float lists: 2 bytes per dimension plus base64 overhead,
+against roughly 20 characters per dimension as JSON. Half precision keeps
+about three significant digits, well inside what cosine ranking notices.
+
+Configuration:
+    INGESTION_VECTOR_ENCODING  "float16" (default) or "json" (plain lists)
+"""
+
+import base64
+import struct
+from os import environ
+from typing import List, Union
+
+
+def encode_vector(vector: List[float]) -> Union[str, List[float]]:
+    if environ.get("INGESTION_VECTOR_ENCODING", "float16") == "json":
+        return vector
+    return base64.b64encode(struct.pack(f"<{len(vector)}e", *vector)).decode("ascii")
+
+
+def decode_vector(value: Union[str, List[float]]) -> List[float]:
+    """Accept both encodings, so staged data from either setting can be uploaded."""
+    if not isinstance(value, str):
+        return value
+    data = base64.b64decode(value)
+    return list(struct.unpack(f"<{len(data) // 2}e", data))
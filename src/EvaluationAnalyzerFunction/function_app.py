@@ -1,18 +1,104 @@
 import azure.functions as func
 import azure.durable_functions as df
-from azure.identity import DefaultAzureCredential
-from azure.ai.projects import AIProjectClient
+from azure.ai.agents.models import MessageRole, ThreadMessageOptions
+from azure.ai.projects.aio import AIProjectClient
+from azure.core.exceptions import HttpResponseError
 from azure.cosmos.aio import CosmosClient
+from azure.storage.blob.aio import BlobServiceClient
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential, get_bearer_token_provider
+from openai import AsyncAzureOpenAI
+import asyncio
 import logging
+import random
 import traceback
 from os import environ
-from datetime import datetime
+from datetime import datetime, timedelta
+import itertools
 import json
 import uuid
-from typing import List
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from query_clusters import cluster_records
 
 myApp = df.DFApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+# Evaluations read per query_cosmos_activity call
+EVALUATION_PAGE_SIZE = int(environ.get("EVALUATION_PAGE_SIZE", "200"))
+# Blob container for a run's records and batches, so the orchestration
+# history only carries references to them
+STAGING_CONTAINER = environ.get("EVALUATION_STAGING_CONTAINER", "staging")
+
+# Token-aware packing of failed records into agent batches
+BATCH_MAX_TOKENS = int(environ.get("BATCH_ANALYSIS_MAX_TOKENS", "6000"))
+BATCH_MAX_RECORDS = int(environ.get("BATCH_ANALYSIS_MAX_RECORDS", "50"))
+# Agent calls (batch analyses, summary merges) running at once per request;
+# a range analysis splits them across the days it analyzes at once
+BATCH_MAX_CONCURRENCY = int(environ.get("BATCH_ANALYSIS_MAX_CONCURRENCY", "4"))
+# Prompt budget of one summarizer call; larger days are reduced level by level
+SUMMARY_MAX_TOKENS = int(environ.get("SUMMARY_MAX_TOKENS", "8000"))
+# Longest from/to range, and days of a range analyzed at once
+EVALUATION_MAX_RANGE_DAYS = int(environ.get("EVALUATION_MAX_RANGE_DAYS", "92"))
+EVALUATION_MAX_CONCURRENT_DAYS = int(environ.get("EVALUATION_MAX_CONCURRENT_DAYS", "2"))
+# Retries of an agent run that failed on throttling
+AGENT_MAX_RETRIES = int(environ.get("AGENT_MAX_RETRIES", "4"))
+CHARS_PER_TOKEN = 4
+
+# Group failed queries by embedding before batch analysis
+QUERY_CLUSTERING_ENABLED = environ.get("QUERY_CLUSTERING_ENABLED", "true").lower() == "true"
+# Texts per embeddings request / per semantic cache lookup
+EMBEDDING_BATCH_SIZE = 256
+CACHE_LOOKUP_BATCH_SIZE = 50
+
+# Clients shared by every activity invocation in the worker
+_cosmos_client = None
+_blob_service_client = None
+_project_client = None
+_openai_client = None
+
+
+def _cosmos_container(container_env: str):
+    global _cosmos_client
+    url = environ.get("COSMOSDB_ENDPOINT")
+    database_name = environ.get("COSMOSDB_DATABASE")
+    container_name = environ.get(container_env)
+
+    missing = [
+        name
+        for name, value in [
+            ("COSMOSDB_ENDPOINT", url),
+            ("COSMOSDB_DATABASE", database_name),
+            (container_env, container_name),
+        ]
+        if not value
+    ]
+    if missing:
+        raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+
+    if _cosmos_client is None:
+        _cosmos_client = CosmosClient(url, credential=AsyncDefaultAzureCredential())
+    return _cosmos_client.get_database_client(database_name).get_container_client(container_name)
+
+def _staging_container():
+    global _blob_service_client
+    if _blob_service_client is None:
+        _blob_service_client = BlobServiceClient(
+            environ["AZURE_STORAGE_URL"], credential=AsyncDefaultAzureCredential()
+        )
+    return _blob_service_client.get_container_client(STAGING_CONTAINER)
+
+
+async def _stage(blob: str, data) -> dict:
+    await _staging_container().upload_blob(blob, json.dumps(data), overwrite=True)
+    return {"blob": blob}
+
+
+async def _load(ref: dict):
+    downloader = await _staging_container().download_blob(ref["blob"])
+    return json.loads(await downloader.readall())
+
+
 @myApp.route(route="orchestrators/{functionName}")
 @myApp.durable_client_input(client_name="client")
 async def start_evaluations(req: func.HttpRequest, client):
@@ -26,17 +112,34 @@ async def start_evaluations(req: func.HttpRequest, client):
         # Fallback: get from query string
         params = {
             "agent": req.params.get("agent"),
-            "date": req.params.get("date")
+            "date": req.params.get("date"),
+            "from": req.params.get("from"),
+            "to": req.params.get("to"),
         }
+    params = {key: value for key, value in params.items() if value}
 
     # Validate required parameters
-    if not params.get("agent") or not params.get("date"):
+    ranged = "from" in params or "to" in params
+    if not params.get("agent") or ranged == ("date" in params) or ("from" in params) != ("to" in params):
         return func.HttpResponse(
-            "Missing required parameters 'agent' and 'date'.",
+            "Required parameters are 'agent' and either 'date' or both 'from' and 'to'.",
             status_code=400
         )
-    
-    #{"agent": "HR_Agent", "date": "2025-09-21"}
+    try:
+        for key in ("date", "from", "to"):
+            if key in params:
+                datetime.strptime(params[key], "%Y-%m-%d")
+    except ValueError:
+        return func.HttpResponse("Dates must be formatted as YYYY-MM-DD.", status_code=400)
+    if "from" in params:
+        span = (datetime.strptime(params["to"], "%Y-%m-%d") - datetime.strptime(params["from"], "%Y-%m-%d")).days + 1
+        if span < 1 or span > EVALUATION_MAX_RANGE_DAYS:
+            return func.HttpResponse(
+                f"'from' must not be after 'to', and a range covers at most {EVALUATION_MAX_RANGE_DAYS} days.",
+                status_code=400
+            )
+
+    #{"agent": "HR_Agent", "date": "2025-09-21"} or {"agent": "HR_Agent", "from": "2025-09-15", "to": "2025-09-21"}
     
     instance_id = await client.start_new(function_name, None,params )
     
@@ -51,243 +154,571 @@ def eval_orchestrator(context: df.DurableOrchestrationContext):
     calling agent activities, and summarizing results.
     """
     params = context.get_input()  # e.g., {"agent": "HR_Agent", "date": "2025-09-21"}
+    if params.get("from"):
+        return (yield from _analyze_range(context, params))
+
+    # Step 1-2: read the day's failed evaluations page by page, already
+    # flattened to the failed evaluators. Pages are staged as blobs; only
+    # their references pass through the orchestration history
+    staging = f"evaluations/{context.instance_id}/"
+    pages = []
+    continuation = None
+    while True:
+        page = yield context.call_activity("query_cosmos_activity", {
+            **params, "continuation": continuation, "blob": f"{staging}page-{len(pages)}.json"
+        })
+        if page["page"]:
+            pages.append(page["page"])
+        continuation = page["continuation"]
+        if not continuation:
+            break
 
-    # Step 1: query Cosmos DB
-    records = yield context.call_activity("query_cosmos_activity", params)
-
-    if not records:
+    if not pages:
         # Return early if no records found
-        logging.info(f"No records found for agent={params['agent']} on date={params['date']}")
-        return {"status": "no_records", "data": []}
+        if not context.is_replaying:
+            logging.info(f"No failed records found for agent={params['agent']} on date={params['date']}")
+        # Saved too, with the day's metrics, so range analyses know this day
+        # needs no work and still count its passing evaluations
+        metrics = yield context.call_activity("day_metrics_activity", params)
+        yield context.call_activity("save_summary_to_cosmos", {
+            "instance_id": context.instance_id,
+            "agent": params.get("agent"),
+            "date": params.get("date"),
+            "final_summary": None,
+            "batch_summaries": [],
+            "metrics": metrics,
+        })
+        return {"status": "no_failed_records", "data": [], "metrics": metrics}
+
+    # Step 3: clusters of similar failed queries and token-bounded batches of
+    # the rest, staged one blob per batch
+    prepared = yield context.call_activity("prepare_batches_activity", {"pages": pages, "staging": staging})
+
+    # Step 4: batch analysis agent calls, at most BATCH_MAX_CONCURRENCY at a time
+    # (this day's share of it when run as part of a range)
+    limit = min(params.get("concurrency") or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    batch_summaries = yield from _fan_out(context, "batch_analysis_agent_activity", prepared["batches"], limit)
+    yield context.call_activity("delete_staged_activity", staging)
+
+    # Step 5-6: reduce the summaries to one final summary
+    final_summary = yield from _summarize(context, batch_summaries, limit)
+    final_summary["batch_summaries"] = batch_summaries
+
+    # Step 7: optionally save final summary to Cosmos, with the day's metrics
+    # from the write-time rollups rather than a count over raw evaluations
+    metrics = yield context.call_activity("day_metrics_activity", params)
+    final_summary["metrics"] = metrics
+    save_payload = {
+        "instance_id": context.instance_id,
+        "agent": params.get("agent"),
+        "date": params.get("date"),
+        "final_summary": final_summary.get("final_summary"),
+        "batch_summaries": batch_summaries,
+        "metrics": metrics,
+    }
+    yield context.call_activity("save_summary_to_cosmos", save_payload)
 
-    # Step 2: flatten records (remove 'pass' evaluators)
-    flattened = yield context.call_activity("flatten_activity", records)
+    return final_summary
 
-    if not flattened:
-        return {"status": "no_failed_records", "data": []}
 
-    # Step 3: batch flattened records
-    batch_size = 20  ## Create ENV Var
-    batches = [flattened[i:i+batch_size] for i in range(0, len(flattened), batch_size)]
+def _analyze_range(context, params: dict):
+    """
+    Summarize an agent's failures from `from` to `to`. Days whose summary was
+    saved after the day ended are reused; only the other days are analyzed
+    (as eval_orchestrator sub-orchestrations), then the day summaries are
+    reduced to one.
+    """
+    start = datetime.strptime(params["from"], "%Y-%m-%d")
+    days = [
+        (start + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((datetime.strptime(params["to"], "%Y-%m-%d") - start).days + 1)
+    ]
+
+    saved = yield context.call_activity("load_day_summaries_activity", params)
+    missing = [day for day in days if day not in saved]
+    if not context.is_replaying:
+        logging.info(f"Range {days[0]}..{days[-1]}: {len(days) - len(missing)} days reused, {len(missing)} to analyze")
+
+    # Days analyzed at once share the agent call limit (at least one call each)
+    concurrency = max(1, BATCH_MAX_CONCURRENCY // min(EVALUATION_MAX_CONCURRENT_DAYS, max(1, len(missing))))
+    results = yield from _bounded(
+        context,
+        lambda day: context.call_sub_orchestrator("eval_orchestrator", {
+            "agent": params["agent"], "date": day, "concurrency": concurrency,
+        }),
+        missing,
+        EVALUATION_MAX_CONCURRENT_DAYS,
+    )
+    day_summaries = {day: saved[day]["final_summary"] for day in saved}
+    day_summaries.update({day: result.get("final_summary") for day, result in zip(missing, results)})
+    day_summaries = {day: day_summaries[day] for day in days if day_summaries.get(day)}
+    metrics = {day: saved[day]["metrics"] for day in saved}
+    metrics.update({day: result.get("metrics") for day, result in zip(missing, results)})
+    # Summaries saved without metrics (e.g. of days with no failures) read them from the rollups
+    unmeasured = [day for day in days if metrics.get(day) is None]
+    measured = yield from _fan_out(
+        context, "day_metrics_activity", [{"agent": params["agent"], "date": day} for day in unmeasured]
+    )
+    metrics.update(zip(unmeasured, measured))
+    metrics = {day: metrics[day] for day in days}
 
-    # Step 4: fan-out batch analysis agent calls
-    tasks = [context.call_activity("batch_analysis_agent_activity", b) for b in batches]
-    batch_summaries = yield context.task_all(tasks)
+    if not day_summaries:
+        return {"status": "no_failed_records", "data": [], "metrics": metrics}
 
-    # Step 5: call final summarizer agent
-    final_summary = yield context.call_activity("final_summarizer_agent_activity", batch_summaries)
+    final_summary = yield from _summarize(
+        context, [{"batch_summary": f"{day}: {summary}"} for day, summary in day_summaries.items()]
+    )
+    final_summary.pop("batch_summaries", None)
+    final_summary.update({"day_summaries": day_summaries, "metrics": metrics, "computed_days": missing})
 
-    # Step 6: optionally save final summary to Cosmos
-    save_payload = {
+    yield context.call_activity("save_summary_to_cosmos", {
         "instance_id": context.instance_id,
         "agent": params.get("agent"),
-        "date": params.get("date"),
+        "from": days[0],
+        "to": days[-1],
         "final_summary": final_summary.get("final_summary"),
-        "batch_summaries": batch_summaries
-    }
-    yield context.call_activity("save_summary_to_cosmos", save_payload)
-
+        "day_summaries": day_summaries,
+        "metrics": metrics,
+    })
     return final_summary
 
 
-@myApp.activity_trigger(input_name="params")
-async def query_cosmos_activity(params: dict) -> List[dict]:
-    url = environ["COSMOSDB_ENDPOINT"]
-    database_name = environ["COSMOSDB_DATABASE"]
-    container_name = environ["COSMOSDB_EVALUATIONS_CONTAINER"]
-
-    if not url or not database_name:
-        missing = [
-            name
-            for name, value in [
-                ("COSMOSDB_ENDPOINT", url),
-                ("COSMOSDB_DATABASE", database_name),
-                ("COSMOSDB_EVALUATIONS_CONTAINER", container_name),
-            ]
-            if not value
-        ]
-        raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+def _summarize(context, batch_summaries: List[dict], limit: int = BATCH_MAX_CONCURRENCY):
+    """Merge summaries in token-bounded groups, level by level, until they fit one final summarizer call."""
+    summaries = batch_summaries
+    level = 0
+    while len(summaries) > 1 and _summary_tokens(summaries) > SUMMARY_MAX_TOKENS:
+        groups = _group_summaries(summaries)
+        if len(groups) >= len(summaries):
+            # No reduction possible; the final call clips what it is given
+            break
+        level += 1
+        if not context.is_replaying:
+            logging.info(f"Summary reduction level {level}: {len(summaries)} summaries in {len(groups)} groups")
+        summaries = yield from _fan_out(context, "merge_summaries_activity", groups, limit)
+
+    return (yield context.call_activity("final_summarizer_agent_activity", summaries))
+
+
+def _bounded(context, start, inputs: list, limit: int):
+    """Run the task `start(item)` for each of `inputs`, at most `limit` at a time; results in input order."""
+    results = [None] * len(inputs)
+    running = {}
+    pending = iter(enumerate(inputs))
+
+    for index, item in itertools.islice(pending, limit):
+        running[index] = start(item)
+    while running:
+        done = yield context.task_any(list(running.values()))
+        index = next(i for i, task in running.items() if task is done)
+        results[index] = running.pop(index).result
+        for next_index, item in itertools.islice(pending, 1):
+            running[next_index] = start(item)
+    return results
 
-    credential = DefaultAzureCredential()
-    client = CosmosClient(url, credential=credential)
-    database = client.get_database_client(database_name)
-    container = database.get_container_client(container_name)
 
-    query = f"""
-    SELECT c.id, c.sessionid, c.user_query, c.response, c.evaluation, c.metadata.agent, c.timestamp
-    FROM c
-    WHERE c.metadata.agent = "{params['agent']}"
-      AND STARTSWITH(c.timestamp, "{params['date']}")
-      AND (
-            c.evaluation.groundedness.groundedness_result = "fail"
-         OR c.evaluation.coherence.coherence_result = "fail"
-         OR c.evaluation.relevance.relevance_result = "fail"
-      )
+def _fan_out(context, activity: str, inputs: list, limit: int = BATCH_MAX_CONCURRENCY):
+    """Run `activity` over `inputs` with a sliding window of `limit`; results in input order."""
+    return (yield from _bounded(context, lambda item: context.call_activity(activity, item), inputs, limit))
+
+
+def _record_line(record: dict) -> str:
+    return f"Q: {record['user_query']} | Failures: {list(record['failed_evaluations'].keys())}"
+
+
+def _batch_text(batch: Union[List[dict], dict]) -> str:
+    """Agent input for a list of records, or for a cluster's representatives and counts."""
+    if isinstance(batch, list):
+        return "\n".join(_record_line(r) for r in batch)
+    cluster = batch["cluster"]
+    failures = ", ".join(f"{name}: {count}" for name, count in cluster["failures"].items())
+    header = (
+        f"Cluster of {cluster['size']} similar failed queries ({failures}). "
+        f"Representative queries:"
+    )
+    return "\n".join([header] + [_record_line(r) for r in batch["records"]])
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _pack_batches(records: List[dict]) -> List[List[dict]]:
+    """Greedy batches of at most BATCH_MAX_TOKENS prompt tokens and BATCH_MAX_RECORDS records."""
+    batches, batch, tokens = [], [], 0
+    for record in records:
+        cost = _estimate_tokens(_record_line(record))
+        if batch and (tokens + cost > BATCH_MAX_TOKENS or len(batch) >= BATCH_MAX_RECORDS):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(record)
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _clip(summary: str) -> str:
+    """
+    Clip a summary so that two clipped summaries, with the " ..." marker and
+    the per-estimate rounding, always fit one SUMMARY_MAX_TOKENS call.
     """
+    limit = (SUMMARY_MAX_TOKENS // 2 - 8) * CHARS_PER_TOKEN
+    return summary if len(summary) <= limit else summary[:limit] + " ..."
 
-    results = []
-    async for item in container.query_items(query=query):
-        results.append(item)
 
-    await client.close()  # Close async client
-    return results
+def _summary_tokens(summaries: List[dict]) -> int:
+    return sum(_estimate_tokens(_clip(s["batch_summary"])) for s in summaries)
+
+
+def _group_summaries(summaries: List[dict]) -> List[List[dict]]:
+    """
+    Greedy, order-preserving groups of summaries within SUMMARY_MAX_TOKENS
+    each and of at least two summaries (see _clip), so every level of the
+    reduction at least halves the count.
+    """
+    groups, group, tokens = [], [], 0
+    for summary in summaries:
+        cost = _estimate_tokens(_clip(summary["batch_summary"]))
+        if len(group) >= 2 and tokens + cost > SUMMARY_MAX_TOKENS:
+            groups.append(group)
+            group, tokens = [], 0
+        group.append(summary)
+        tokens += cost
+    if len(group) == 1 and groups:
+        # A lone trailing summary joins the previous group if it fits
+        if sum(_estimate_tokens(_clip(s["batch_summary"])) for s in groups[-1]) + tokens <= SUMMARY_MAX_TOKENS:
+            groups[-1].extend(group)
+            group = []
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _foundry_client() -> AIProjectClient:
+    global _project_client
+    if _project_client is None:
+        _project_client = AIProjectClient(endpoint=environ["PROJECT_ENDPOINT"], credential=AsyncDefaultAzureCredential())
+    return _project_client
+
+
+def _embeddings_client() -> AsyncAzureOpenAI:
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncAzureOpenAI(
+            azure_endpoint=environ["AZURE_OPENAI_ENDPOINT"],
+            api_version=environ.get("OPENAI_API_VERSION", "2024-06-01"),
+            azure_ad_token_provider=get_bearer_token_provider(
+                AsyncDefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
+            ),
+        )
+    return _openai_client
+
+
+async def _cached_query_vectors(texts: List[str]) -> Dict[str, List[float]]:
+    """Prompt vectors the API's semantic cache already holds for `texts`."""
+    if not environ.get("COSMOSDB_CACHE_CONTAINER"):
+        return {}
+    container = _cosmos_container("COSMOSDB_CACHE_CONTAINER")
+    vectors = {}
+    for i in range(0, len(texts), CACHE_LOOKUP_BATCH_SIZE):
+        items = container.query_items(
+            query="SELECT c.promptText, c.prompt FROM c WHERE ARRAY_CONTAINS(@texts, c.promptText)",
+            parameters=[{"name": "@texts", "value": texts[i:i + CACHE_LOOKUP_BATCH_SIZE]}],
+        )
+        async for item in items:
+            if item.get("prompt"):
+                vectors.setdefault(item["promptText"], item["prompt"])
+    return vectors
 
 
-@myApp.activity_trigger(input_name="records")
-def flatten_activity(records: List[dict]) -> List[dict]:
-    flattened = []
+async def _query_vectors(texts: List[str]) -> np.ndarray:
+    """Embeddings of `texts`, from the semantic cache where present, else from Azure OpenAI."""
+    unique = list(dict.fromkeys(texts))
+    try:
+        vectors = await _cached_query_vectors(unique)
+    except Exception as ex:
+        logging.warning(f"Semantic cache lookup failed, embedding all queries: {ex}")
+        vectors = {}
+
+    missing = [t for t in unique if t not in vectors]
+    client = _embeddings_client()
+    for i in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[i:i + EMBEDDING_BATCH_SIZE]
+        response = await client.embeddings.create(
+            model=environ.get("AZURE_OPENAI_EMBEDDING", "text-embedding"),
+            input=[t or " " for t in batch],
+        )
+        vectors.update(zip(batch, (d.embedding for d in response.data)))
 
-    if not records:
-        logging.info("No records provided to flatten_activity.")
-        return flattened
+    logging.info(f"Query vectors: {len(unique) - len(missing)} from cache, {len(missing)} embedded")
+    return np.asarray([vectors[t] for t in texts], dtype=np.float32)
 
-    for item in records:
-        evals = item.get("evaluation", {})
-        failed = {k: v for k, v in evals.items() if v.get(f"{k}_result") == "fail"}
 
-        flattened.append({
-            "id": item.get("id"),
-            "sessionid": item.get("sessionid"),
-            "user_query": item.get("user_query"),
-            "response": item.get("response"),
-            "agent": item.get("metadata", {}).get("agent"),
-            "timestamp": item.get("timestamp"),
-            "failed_evaluations": failed
-        })
+def _is_throttled(run=None, error: Optional[BaseException] = None) -> bool:
+    if error is not None:
+        return isinstance(error, HttpResponseError) and error.status_code == 429
+    return run.status == "failed" and run.last_error is not None and run.last_error.code == "rate_limit_exceeded"
 
-    logging.info(f"Flattened {len(flattened)} records with failed evaluations.")
-    return flattened
 
+async def _run_agent(agent_id: str, text: str) -> Optional[str]:
+    """
+    Run an agent on one user message in a new thread and return its reply,
+    or None if the run failed. Throttled runs are retried with backoff; the
+    thread is always deleted.
+    """
+    agents = _foundry_client().agents
+    thread = await agents.threads.create(messages=[ThreadMessageOptions(role=MessageRole.USER, content=text)])
+    try:
+        for attempt in range(AGENT_MAX_RETRIES + 1):
+            try:
+                run = await agents.runs.create_and_process(thread_id=thread.id, agent_id=agent_id)
+            except HttpResponseError as ex:
+                if not _is_throttled(error=ex) or attempt == AGENT_MAX_RETRIES:
+                    raise
+            else:
+                if not _is_throttled(run) or attempt == AGENT_MAX_RETRIES:
+                    break
+            delay = min(60.0, 2.0 ** (attempt + 1))
+            logging.warning(f"Agent {agent_id} throttled; retry {attempt + 1}/{AGENT_MAX_RETRIES} in {delay:.0f}s")
+            await asyncio.sleep(delay + random.uniform(0, delay * 0.25))
+
+        if run.status == "failed":
+            logging.error(f"Agent run {run.id} failed: {run.last_error}")
+            return None
+
+        # Only the latest assistant message, not the whole thread
+        message = await agents.messages.get_last_message_text_by_role(thread_id=thread.id, role=MessageRole.AGENT)
+        return message.text.value if message else ""
+    finally:
+        try:
+            await agents.threads.delete(thread.id)
+        except Exception as ex:
+            logging.warning(f"Could not delete thread {thread.id}: {ex}")
 
 
-@myApp.activity_trigger(input_name="batch")
-def batch_analysis_agent_activity(batch: List[dict]) -> dict:
+@myApp.activity_trigger(input_name="params")
+async def query_cosmos_activity(params: dict) -> dict:
     """
-    Summarize a batch of evaluation failures using Azure AI Foundry agent.
+    One page of an agent's failed evaluations for a day, flattened and staged
+    at `params["blob"]`. Returns the page reference (None if the page is
+    empty) and the continuation token for the next page (None after the last
+    page).
+
+    Evaluations are partitioned by `day` and carry a precomputed `has_failure`
+    flag (see CosmosEvaluationStore), so this is a single-partition, indexed
+    query rather than a cross-partition scan.
     """
-    # Flatten batch into a single text input
-    text = "\n".join([
-        f"Q: {r['user_query']} | Failures: {list(r['failed_evaluations'].keys())}"
-        for r in batch
-    ])
-
-    # Initialize Foundry client
-    project_client = AIProjectClient(
-        endpoint=environ["PROJECT_ENDPOINT"],
-        credential=DefaultAzureCredential()
-    )
-    agent_id = environ["BATCH_ANALYZER_AGENT_ID"]
+    container = _cosmos_container("COSMOSDB_EVALUATIONS_CONTAINER")
+
+    query = """
+    SELECT c.id, c.sessionid, c.user_query, c.evaluation, c.agent, c.timestamp
+    FROM c
+    WHERE c.agent = @agent AND c.has_failure = true
+    """
+    pages = container.query_items(
+        query=query,
+        parameters=[{"name": "@agent", "value": params["agent"]}],
+        partition_key=params["date"],
+        max_item_count=int(params.get("page_size") or EVALUATION_PAGE_SIZE),
+    ).by_page(params.get("continuation"))
+
+    records = []
+    try:
+        page = await pages.__anext__()
+        async for item in page:
+            records.append(_flatten_record(item))
+    except StopAsyncIteration:
+        pass
 
-    # Create a thread for this batch
-    thread = project_client.agents.threads.create()
-    thread_id = thread.id
+    page = await _stage(params["blob"], records) if records else None
+    return {"page": page, "count": len(records), "continuation": pages.continuation_token}
 
-    # Send user message
-    project_client.agents.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=text
+
+@myApp.activity_trigger(input_name="params")
+async def day_metrics_activity(params: dict) -> dict:
+    """
+    Pass/fail counts per evaluator for an agent and day, read from the
+    rollup items the API maintains as evaluations are stored (one small
+    single-partition query). Empty if no rollup container is configured.
+    """
+    if not environ.get("COSMOSDB_ROLLUP_CONTAINER"):
+        return {}
+    container = _cosmos_container("COSMOSDB_ROLLUP_CONTAINER")
+
+    items = container.query_items(
+        query="SELECT * FROM c WHERE c.agent = @agent",
+        parameters=[{"name": "@agent", "value": params["agent"]}],
+        partition_key=params["date"],
     )
+    metrics = {}
+    async for item in items:
+        graded = item["pass"] + item["fail"]
+        metrics[item["evaluator"]] = {
+            "count": item["count"],
+            "pass": item["pass"],
+            "fail": item["fail"],
+            "fail_rate": item["fail"] / graded if graded else None,
+        }
+    return metrics
+
+
+def _flatten_record(item: dict) -> dict:
+    """Keep what the analysis needs (not the response) and only the evaluators that failed."""
+    evals = item.get("evaluation", {})
+    failed = {k: v for k, v in evals.items() if v.get(f"{k}_result") == "fail"}
+
+    return {
+        "id": item.get("id"),
+        "sessionid": item.get("sessionid"),
+        "user_query": item.get("user_query"),
+        "agent": item.get("agent") or item.get("metadata", {}).get("agent"),
+        "timestamp": item.get("timestamp"),
+        "failed_evaluations": failed
+    }
+
 
-    # Create and process the run
-    run = project_client.agents.runs.create_and_process(
-        thread_id=thread_id,
-        agent_id=agent_id
+async def _cluster(records: List[dict]) -> dict:
+    """
+    Group flattened records by the meaning of their user query; see
+    query_clusters.cluster_records for the result shape. Falls back to
+    leaving every record unclustered if the embeddings cannot be computed.
+    """
+    try:
+        vectors = await _query_vectors([r["user_query"] or "" for r in records])
+    except Exception as ex:
+        logging.error(f"Query clustering skipped: {ex}")
+        logging.error(traceback.format_exc())
+        return {"clusters": [], "unclustered": records}
+
+    grouped = cluster_records(records, vectors)
+    logging.info(
+        f"{len(records)} failed records: {len(grouped['clusters'])} clusters, "
+        f"{len(grouped['unclustered'])} unclustered"
     )
+    return grouped
 
-    if run.status == "failed":
-        return {"batch_summary": "Error: failed to process batch."}
 
-    # Fetch the latest assistant message
-    messages = project_client.agents.messages.list(thread_id=thread_id)
-    for msg in messages:
-        if msg.role == "assistant":
-            content = ""
-            for c in msg.content:
-                if hasattr(c, "text") and hasattr(c.text, "value"):
-                    content += c.text.value
-                elif hasattr(c, "value"):
-                    content += str(c.value)
-            return {"batch_summary": content}
+@myApp.activity_trigger(input_name="params")
+async def prepare_batches_activity(params: dict) -> dict:
+    """
+    Turn the staged pages of a day into agent batches: one per cluster of
+    similar failed queries (representatives and counts), then the remaining
+    records packed into token-bounded batches. Each batch is staged under
+    `params["staging"]`; only the references are returned.
 
-    return {"batch_summary": "No response generated."}
+    Clustering compares every query of the day, so this activity holds the
+    day's flattened records (user queries and failed evaluator results).
+    """
+    records = []
+    for page in params["pages"]:
+        records.extend(await _load(page))
+
+    batches = []
+    if QUERY_CLUSTERING_ENABLED:
+        grouped = await _cluster(records)
+        batches = [
+            {"cluster": {"size": c["size"], "failures": c["failures"]}, "records": c["records"]}
+            for c in grouped["clusters"]
+        ]
+        records = grouped["unclustered"]
+    batches += _pack_batches(records)
 
+    refs = await asyncio.gather(*(
+        _stage(f"{params['staging']}batch-{i}.json", batch) for i, batch in enumerate(batches)
+    ))
+    return {"batches": list(refs)}
 
 
-@myApp.activity_trigger(input_name="batch_summaries")
-def final_summarizer_agent_activity(batch_summaries: List[dict]) -> dict:
+@myApp.activity_trigger(input_name="staging")
+async def delete_staged_activity(staging: str) -> int:
+    """Delete a run's staged pages and batches."""
+    container = _staging_container()
+    names = [blob.name async for blob in container.list_blobs(name_starts_with=staging)]
+    await asyncio.gather(*(container.delete_blob(name) for name in names))
+    return len(names)
+
+
+@myApp.activity_trigger(input_name="batch")
+async def batch_analysis_agent_activity(batch: dict) -> dict:
     """
-    Consolidate multiple batch summaries into a final summary using Azure AI Foundry agent.
+    Summarize a staged batch of evaluation failures, or one cluster of
+    similar failures, using Azure AI Foundry agent.
     """
-    # Join all batch summaries into a single prompt
-    text = "\n".join([s["batch_summary"] for s in batch_summaries])
+    # Flatten batch into a single text input
+    text = _batch_text(await _load(batch))
 
-    # Initialize Foundry client
-    project_client = AIProjectClient(
-        endpoint=environ["PROJECT_ENDPOINT"],
-        credential=DefaultAzureCredential()
-    )
-    agent_id = environ["FINAL_SUMMARIZER_AGENT_ID"]
+    summary = await _run_agent(environ["BATCH_ANALYZER_AGENT_ID"], text)
+    if summary is None:
+        return {"batch_summary": "Error: failed to process batch."}
+    return {"batch_summary": summary or "No response generated."}
 
-    # Create a thread for the summarization
-    thread = project_client.agents.threads.create()
-    thread_id = thread.id
 
-    # Send user message
-    project_client.agents.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=text
-    )
+@myApp.activity_trigger(input_name="group")
+async def merge_summaries_activity(group: List[dict]) -> dict:
+    """
+    Merge one group of summaries into a single intermediate summary.
+    """
+    text = "\n".join(_clip(s["batch_summary"]) for s in group)
+
+    agent_id = environ.get("SUMMARY_MERGER_AGENT_ID") or environ["FINAL_SUMMARIZER_AGENT_ID"]
+    summary = await _run_agent(agent_id, text)
+    if summary is None:
+        # Keep the group's content for the next level rather than losing it
+        return {"batch_summary": _clip(text)}
+    return {"batch_summary": summary or "No response generated."}
 
-    # Create and process the run
-    run = project_client.agents.runs.create_and_process(
-        thread_id=thread_id,
-        agent_id=agent_id
-    )
 
-    if run.status == "failed":
+@myApp.activity_trigger(input_name="batch_summaries")
+async def final_summarizer_agent_activity(batch_summaries: List[dict]) -> dict:
+    """
+    Consolidate multiple batch summaries into a final summary using Azure AI Foundry agent.
+    """
+    # Join all batch summaries into a single prompt
+    text = "\n".join([_clip(s["batch_summary"]) for s in batch_summaries])
+
+    summary = await _run_agent(environ["FINAL_SUMMARIZER_AGENT_ID"], text)
+    if summary is None:
         return {"final_summary": "Error: failed to generate final summary."}
+    return {"final_summary": summary or "No response generated.", "batch_summaries": batch_summaries}
 
-    # Fetch the latest assistant message
-    messages = project_client.agents.messages.list(thread_id=thread_id)
-    for msg in messages:
-        if msg.role == "assistant":
-            content = ""
-            for c in msg.content:
-                if hasattr(c, "text") and hasattr(c.text, "value"):
-                    content += c.text.value
-                elif hasattr(c, "value"):
-                    content += str(c.value)
-            return {"final_summary": content, "batch_summaries": batch_summaries}
 
-    return {"final_summary": "No response generated.", "batch_summaries": batch_summaries}
+@myApp.activity_trigger(input_name="params")
+async def load_day_summaries_activity(params: dict) -> dict:
+    """
+    Day summaries saved by earlier runs for an agent and date range, keyed by
+    date: {"final_summary", "metrics"}, latest run first. Only summaries saved
+    after their day ended are returned, since a day still in progress keeps
+    gaining evaluations; failed summaries are not reused.
+    """
+    container = _cosmos_container("COSMOSDB_SUMMARY_CONTAINER")
+
+    items = container.query_items(
+        query="""
+        SELECT c.date, c.final_summary, c.metrics, c.timestamp
+        FROM c
+        WHERE c.agent = @agent AND c.date >= @from AND c.date <= @to
+        """,
+        parameters=[
+            {"name": "@agent", "value": params["agent"]},
+            {"name": "@from", "value": params["from"]},
+            {"name": "@to", "value": params["to"]},
+        ],
+    )
+    latest = {}
+    async for item in items:
+        if item["timestamp"][:10] <= item["date"]:
+            continue
+        if (item.get("final_summary") or "").startswith("Error:"):
+            continue
+        if item["date"] not in latest or item["timestamp"] > latest[item["date"]]["timestamp"]:
+            latest[item["date"]] = item
+    return {day: {"final_summary": item["final_summary"], "metrics": item.get("metrics")} for day, item in latest.items()}
 
 
 @myApp.activity_trigger(input_name="summary_data")
 async def save_summary_to_cosmos(summary_data: dict) -> dict:
-    url = environ["COSMOSDB_ENDPOINT"]
-    database_name = environ["COSMOSDB_DATABASE"]
-    container_name = environ["COSMOSDB_SUMMARY_CONTAINER"]
-
-    if not url or not database_name:
-        missing = [
-            name
-            for name, value in [
-                ("COSMOSDB_ENDPOINT", url),
-                ("COSMOSDB_DATABASE", database_name),
-                ("COSMOSDB_SUMMARY_CONTAINER", container_name),
-            ]
-            if not value
-        ]
-        raise ValueError(f"Missing environment variables: {', '.join(missing)}")
-
-    credential = DefaultAzureCredential()
-    client = CosmosClient(url, credential=credential)
-    database = client.get_database_client(database_name)
-    container = database.get_container_client(container_name)
-
-
+    container = _cosmos_container("COSMOSDB_SUMMARY_CONTAINER")
 
     doc = {
         "id": summary_data.get("instance_id"),  # use orchestration instance ID
@@ -295,8 +726,13 @@ async def save_summary_to_cosmos(summary_data: dict) -> dict:
         "date": summary_data.get("date"),
         "final_summary": summary_data.get("final_summary"),
         "batch_summaries": summary_data.get("batch_summaries"),
+        "metrics": summary_data.get("metrics"),
         "timestamp": datetime.utcnow().isoformat()
     }
+    # Range reports
+    for key in ("from", "to", "day_summaries"):
+        if key in summary_data:
+            doc[key] = summary_data[key]
 
     await container.create_item(doc)
     return {"status": "saved", "id": doc["id"]}
\ No newline at end of file
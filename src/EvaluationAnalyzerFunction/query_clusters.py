@@ -0,0 +1,77 @@
+"""
+Grouping of failed evaluation records by the meaning of their user query.
+
+Queries are compared by cosine similarity of their embeddings and grouped
+with leader clustering: the first unassigned query starts a cluster and
+takes every unassigned query at or above the threshold. Similarities are
+computed a block of leaders at a time as one matrix product, so a day of a
+few thousand failures clusters in seconds without holding the full
+similarity matrix.
+
+Configuration:
+    QUERY_CLUSTERING_ENABLED        "true" (default) or "false"
+    QUERY_CLUSTER_THRESHOLD         cosine similarity to join a cluster (default 0.9)
+    QUERY_CLUSTER_MIN_SIZE          smaller clusters are analyzed as plain records (default 3)
+    QUERY_CLUSTER_REPRESENTATIVES   records sent to the agent per cluster (default 5)
+"""
+
+from collections import Counter
+from os import environ
+from typing import List, Optional
+
+import numpy as np
+
+_BLOCK = 512
+
+
+def leader_clusters(vectors: np.ndarray, threshold: Optional[float] = None) -> List[np.ndarray]:
+    """Member indices of each cluster, in order of each cluster's first record."""
+    threshold = threshold or float(environ.get("QUERY_CLUSTER_THRESHOLD", "0.9"))
+    x = vectors.astype(np.float32)
+    x /= np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+    unassigned = np.ones(len(x), dtype=bool)
+    clusters = []
+    for start in range(0, len(x), _BLOCK):
+        leaders = np.flatnonzero(unassigned[start:start + _BLOCK]) + start
+        if not len(leaders):
+            continue
+        similarities = x[leaders] @ x.T
+        for row, leader in enumerate(leaders):
+            if not unassigned[leader]:
+                continue
+            members = np.flatnonzero(unassigned & (similarities[row] >= threshold))
+            unassigned[members] = False
+            clusters.append(members)
+    return clusters
+
+
+def representatives(vectors: np.ndarray, members: np.ndarray, count: Optional[int] = None) -> List[int]:
+    """The `count` members closest to the cluster centroid, most central first."""
+    count = count or int(environ.get("QUERY_CLUSTER_REPRESENTATIVES", "5"))
+    x = vectors[members].astype(np.float32)
+    x /= np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+    scores = x @ x.mean(axis=0)
+    return [int(members[i]) for i in np.argsort(-scores)[:count]]
+
+
+def cluster_records(records: List[dict], vectors: np.ndarray) -> dict:
+    """
+    Split flattened records into {"clusters", "unclustered"}. Each cluster is
+    {"size", "failures" (evaluator -> count), "records" (representatives)};
+    records of clusters below QUERY_CLUSTER_MIN_SIZE are returned unclustered.
+    """
+    min_size = int(environ.get("QUERY_CLUSTER_MIN_SIZE", "3"))
+    clusters, unclustered = [], []
+    for members in leader_clusters(vectors):
+        if len(members) < min_size:
+            unclustered.extend(records[i] for i in members)
+            continue
+        failures = Counter(name for i in members for name in records[i]["failed_evaluations"])
+        clusters.append({
+            "size": len(members),
+            "failures": dict(failures.most_common()),
+            "records": [records[i] for i in representatives(vectors, members)],
+        })
+    clusters.sort(key=lambda c: -c["size"])
+    return {"clusters": clusters, "unclustered": unclustered}
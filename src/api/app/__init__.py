@@ -2,12 +2,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes.hrpolicy import router as hrpolicy_router
 from .routes.feedback import router as feedback_router
+from .routes.evaluations import router as evaluations_router
 from .logger import configure_logging
+from .metrics import configure_metrics
 
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
     configure_logging()
+    configure_metrics()
 
     app = FastAPI()
 
@@ -23,5 +26,6 @@ def create_app() -> FastAPI:
     # Include routers
     app.include_router(hrpolicy_router)
     app.include_router(feedback_router)
+    app.include_router(evaluations_router)
 
     return app
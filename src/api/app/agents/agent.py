@@ -5,11 +5,13 @@ from typing import Any, Dict, Optional
 from functools import partial
 
 from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
 from semantic_kernel import Kernel
 from semantic_kernel.contents import ChatMessageContent, ChatHistory
 from semantic_kernel.agents import ChatCompletionAgent
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 
+from app.concurrency.rate_limiter import Priority, estimate_tokens, get_rate_limiter
 from app.schemas.agent import AgentResponse
 from app.history.cosmos_chat_history import CosmosChatHistoryStore, ChatRole
 from app.stores.cosmos_semantic_cache import CosmosSemanticCache
@@ -17,6 +19,39 @@ from app.stores.cosmos_semantic_cache import CosmosSemanticCache
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Completion budget assumed when the request does not set max_tokens
+CHAT_COMPLETION_TOKENS = 1000
+
+
+class RateLimitedChatCompletionMixin:
+    """
+    Routes every chat completion round-trip (including each step of the
+    auto function-calling loop) through the shared Azure OpenAI rate limiter
+    at interactive priority.
+    """
+
+    async def _inner_get_chat_message_contents(self, chat_history: ChatHistory, settings):
+        inner = super()._inner_get_chat_message_contents
+        tokens = estimate_tokens(
+            *(" ".join(str(item) for item in m.items) for m in chat_history.messages),
+            completion=getattr(settings, "max_tokens", None) or CHAT_COMPLETION_TOKENS,
+        )
+        limiter = get_rate_limiter()
+        results = await limiter.run(
+            lambda: inner(chat_history, settings),
+            tokens=tokens,
+            priority=Priority.INTERACTIVE,
+        )
+
+        usage = results[0].metadata.get("usage") if results else None
+        if usage is not None:
+            limiter.refund(tokens - (usage.prompt_tokens + usage.completion_tokens))
+        return results
+
+
+class RateLimitedAzureChatCompletion(RateLimitedChatCompletionMixin, AzureChatCompletion):
+    pass
+
 
 class BaseAgent:
     def __init__(self, kernel: Optional[Kernel] = None):
@@ -64,11 +99,18 @@ class BaseAgent:
                 raise RuntimeError(f"Missing required environment variables: {missing}")
 
             self.kernel = Kernel()
-            self.kernel.add_service(AzureChatCompletion(
+            self.kernel.add_service(RateLimitedAzureChatCompletion(
                 service_id="chat",
                 deployment_name=os.environ["AZURE_OPENAI_MODEL"],
                 endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-                api_key=os.environ["AZURE_OPENAI_API_KEY"]
+                api_key=os.environ["AZURE_OPENAI_API_KEY"],
+                # Throttling is retried by the shared rate limiter, not per client
+                async_client=AsyncAzureOpenAI(
+                    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+                    api_key=os.environ["AZURE_OPENAI_API_KEY"],
+                    api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+                    max_retries=0,
+                ),
             ))
 
 
@@ -1,16 +1,21 @@
+import asyncio
 import logging
 import uuid
 from functools import partial
 from typing import Any, Dict, Optional
 import json
 import re
+import time
 
 from semantic_kernel.agents import ChatCompletionAgent
+from semantic_kernel.contents import ChatHistory
 from app.schemas.agent import AgentResponse
 from app.evaluations.evaluation import EvaluationEngine
 from app.evaluations.cosmos_evaluation_store import CosmosEvaluationStore
 from app.plugins.azure_search import AzureSearchPlugin
 from app.agents.agent import BaseAgent
+from app.concurrency import AdmissionController, SessionCoordinator
+from app.concurrency.rate_limiter import Priority, estimate_tokens, get_rate_limiter
 from app.history.cosmos_chat_history import ChatRole
 
 
@@ -20,6 +25,9 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Prompt template + completion budget of one judge evaluator call
+EVALUATOR_OVERHEAD_TOKENS = 1500
+
 
 class SemanticKernelHRAgent(BaseAgent):
     def __init__(self, kernel = None):
@@ -28,6 +36,9 @@ class SemanticKernelHRAgent(BaseAgent):
         self.evaluation_engine = None
         self.evaluation_store = None
         self.agent_name = "HR_Agent"
+        self.admission = AdmissionController()
+        self.sessions = SessionCoordinator()
+        self._background_tasks = set()
 
     async def initialize(self):
         await super().initialize()
@@ -83,7 +94,19 @@ class SemanticKernelHRAgent(BaseAgent):
             logger.warning("No request_id set; skipping evaluation storage.")
             return
 
-        evaluation = self.evaluation_engine.evaluate_from_history(user_input, response, chat_history)
+        # Three judge calls over query/response/context; the sync evaluators run in
+        # a worker thread so they never block the event loop.
+        tokens = 3 * estimate_tokens(
+            user_input, response, *(m.content for m in chat_history.messages),
+            completion=EVALUATOR_OVERHEAD_TOKENS,
+        )
+        evaluation = await get_rate_limiter().run(
+            lambda: asyncio.to_thread(
+                self.evaluation_engine.evaluate_from_history, user_input, response, chat_history
+            ),
+            tokens=tokens,
+            priority=Priority.BACKGROUND,
+        )
 
         if not evaluation:
             logger.info("No evaluation generated; skipping storage.")
@@ -103,11 +126,36 @@ class SemanticKernelHRAgent(BaseAgent):
             logger.error(f"Failed to store evaluation: {e}")
 
 
+    def _run_in_background(self, coro, description: str):
+        """Run low-priority work after the response is returned, logging any failure."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+
+        def _done(t: asyncio.Task):
+            self._background_tasks.discard(t)
+            if not t.cancelled() and t.exception():
+                logger.error(f"Background {description} failed: {t.exception()}")
+
+        task.add_done_callback(_done)
+
+    async def wait_for_background_tasks(self):
+        """Wait for pending evaluations and cache writes (shutdown, benchmarks)."""
+        while self._background_tasks:
+            await asyncio.gather(*list(self._background_tasks), return_exceptions=True)
+
     async def invoke(self, user_input: str, session_id: str) -> AgentResponse:
         """
         Thread-safe, per-request agent invocation.
         Includes semantic cache lookup + store.
+
+        Turns of the same session run one at a time; an identical input that is
+        already in flight for the session shares that turn's response.
         """
+        return await self.sessions.run(
+            session_id, user_input, lambda: self._invoke_turn(user_input, session_id)
+        )
+
+    async def _invoke_turn(self, user_input: str, session_id: str) -> AgentResponse:
         response_id = str(uuid.uuid4())
         chat_history = await self.history_store.load(session_id)
 
@@ -140,6 +188,15 @@ class SemanticKernelHRAgent(BaseAgent):
 
         logger.info("[CACHE MISS] Proceeding with LLM call.")
 
+        # Only LLM-bound requests count against the concurrency limit;
+        # raises AdmissionRejected when the wait queue is full or times out.
+        async with self.admission.admit():
+            return await self._invoke_llm(user_input, session_id, response_id, chat_history, metadata)
+
+    async def _invoke_llm(self, user_input: str, session_id: str, response_id: str, chat_history,
+                          metadata: Dict[str, Any]) -> AgentResponse:
+        started = time.perf_counter()
+
         # ----------------------------------------------------------------------
         # 2. Add user message to history
         # ----------------------------------------------------------------------
@@ -186,10 +243,16 @@ class SemanticKernelHRAgent(BaseAgent):
                 references = []
 
             # ------------------------------------------------------------------
-            # 5. Run your evaluation engine
+            # 5. Run your evaluation engine (background priority, off the
+            #    request path; snapshot history so later turns don't leak in)
             # ------------------------------------------------------------------
-            await self._run_evaluation(
-                user_input, content, session_id, response_id, chat_history, metadata=metadata
+            self._run_in_background(
+                self._run_evaluation(
+                    user_input, content, session_id, response_id,
+                    ChatHistory(messages=list(chat_history.messages)),
+                    metadata={**metadata, "latency_ms": round((time.perf_counter() - started) * 1000)},
+                ),
+                "evaluation",
             )
 
             # ------------------------------------------------------------------
@@ -205,10 +268,13 @@ class SemanticKernelHRAgent(BaseAgent):
             # ------------------------------------------------------------------
             if self.semantic_cache:
                 logger.info("Storing new response in semantic cache...")
-                await self.semantic_cache.store(
-                    prompt=user_input,
-                    content=content,
-                    references=references
+                self._run_in_background(
+                    self.semantic_cache.store(
+                        prompt=user_input,
+                        content=content,
+                        references=references
+                    ),
+                    "semantic cache write",
                 )
 
         # ----------------------------------------------------------------------
@@ -0,0 +1,6 @@
+"""Concurrency controls for agent invocations (admission, rate limiting, session ordering)."""
+
+from .admission import AdmissionController, AdmissionRejected
+from .sessions import SessionCoordinator
+
+__all__ = ["AdmissionController", "AdmissionRejected", "SessionCoordinator"]
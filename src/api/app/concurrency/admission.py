@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from app.metrics import meter
+
+logger = logging.getLogger(__name__)
+
+_queue_depth = meter.create_up_down_counter(
+    "agent.admission.queue_depth", description="Requests waiting for an agent slot."
+)
+_active = meter.create_up_down_counter(
+    "agent.admission.active", description="Requests currently holding an agent slot."
+)
+_wait_time = meter.create_histogram(
+    "agent.admission.wait_time", unit="s", description="Time spent waiting for an agent slot."
+)
+_rejected = meter.create_counter(
+    "agent.admission.rejected", description="Requests rejected by admission control."
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Agent is at capacity ({reason}); retry after {retry_after}s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds concurrent LLM work for an agent.
+
+    - up to `max_concurrency` requests run at once
+    - up to `max_queue` more wait, each for at most `queue_timeout` seconds
+    - anything beyond that is rejected immediately with a Retry-After estimate
+
+    Defaults come from AGENT_MAX_CONCURRENCY, AGENT_MAX_QUEUE and
+    AGENT_QUEUE_TIMEOUT_SECONDS.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("AGENT_MAX_QUEUE", "32"))
+        self.queue_timeout = queue_timeout or float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "30"))
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        # Exponentially weighted average of how long an admitted request holds its slot
+        self._avg_service_time = 5.0
+
+    def _retry_after(self) -> int:
+        backlog = (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(backlog * self._avg_service_time))
+
+    def _reject(self, reason: str):
+        self._rejected += 1
+        _rejected.add(1, {"reason": reason})
+        retry_after = self._retry_after()
+        logger.warning(f"Admission rejected ({reason}): active={self._active} waiting={self._waiting}")
+        raise AdmissionRejected(reason, retry_after)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold an agent slot for the duration of the `async with` block."""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        start = time.monotonic()
+        self._waiting += 1
+        _queue_depth.add(1)
+        # Acquired in this task, not under wait_for, so a timeout or cancellation
+        # that lands as the permit is granted cannot leave it held by nobody
+        acquired = False
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                acquired = await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            if acquired:
+                self._semaphore.release()
+            self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if acquired:
+                self._semaphore.release()
+            raise
+        finally:
+            self._waiting -= 1
+            _queue_depth.add(-1)
+
+        waited = time.monotonic() - start
+        self._admitted += 1
+        self._total_wait += waited
+        _wait_time.record(waited)
+
+        self._active += 1
+        _active.add(1)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            _active.add(-1)
+            self._semaphore.release()
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * (time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current admission state, e.g. for benchmarks and diagnostics."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "avg_wait_s": round(self._total_wait / self._admitted, 4) if self._admitted else 0.0,
+        }
@@ -0,0 +1,267 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from opentelemetry.metrics import Observation
+
+from app.metrics import meter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Rough chars-per-token ratio for English prompts; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+def estimate_tokens(*texts: Optional[str], completion: int = 0) -> int:
+    """Estimate prompt + completion tokens for a call from its input text."""
+    chars = sum(len(t) for t in texts if t)
+    return chars // CHARS_PER_TOKEN + 1 + completion
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Return the server's retry hint if `exc` (or anything it wraps) is a 429,
+    0.0 for a 429 without a hint, or None when the error is not a throttle.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if getattr(exc, "status_code", None) == 429:
+            headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                try:
+                    return float(headers["retry-after"])
+                except ValueError:
+                    return 0.0
+            return 0.0
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+class OpenAIRateLimiter:
+    """
+    Token-bucket limiter shared by every Azure OpenAI caller in the process.
+
+    Two buckets refill continuously: tokens per minute (TPM) and requests per
+    minute (RPM). Waiters are served strictly by priority then arrival, and
+    background work may not dip into the last `background_reserve` fraction
+    of the TPM bucket, so interactive chat always finds headroom.
+
+    A 429 from any caller pauses the whole limiter for the server's
+    `retry-after` (or an exponential, jittered backoff) before retrying.
+    """
+
+    def __init__(
+        self,
+        tokens_per_minute: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        background_reserve: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.tokens_per_minute = tokens_per_minute or int(os.getenv("AZURE_OPENAI_TPM_LIMIT", "60000"))
+        self.requests_per_minute = requests_per_minute or int(
+            os.getenv("AZURE_OPENAI_RPM_LIMIT", str(max(1, self.tokens_per_minute * 6 // 1000)))
+        )
+        self.background_reserve = background_reserve if background_reserve is not None else float(
+            os.getenv("AZURE_OPENAI_BACKGROUND_RESERVE", "0.2")
+        )
+        self.max_retries = max_retries if max_retries is not None else int(
+            os.getenv("AZURE_OPENAI_MAX_RETRIES", "5")
+        )
+
+        self._tokens = float(self.tokens_per_minute)
+        self._requests = float(self.requests_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._condition: Optional[asyncio.Condition] = None
+
+        self._granted = {p.name.lower(): 0 for p in Priority}
+        self._throttled = 0
+        self._total_wait = {p.name.lower(): 0.0 for p in Priority}
+
+    # --------------------------------------------------------
+    # Bucket accounting
+    # --------------------------------------------------------
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+
+    def _delay_for(self, tokens: int, priority: Priority, now: float) -> float:
+        """Seconds until a request of `tokens` at `priority` fits in both buckets."""
+        reserve = self.background_reserve * self.tokens_per_minute if priority == Priority.BACKGROUND else 0.0
+        token_deficit = tokens + reserve - self._tokens
+        request_deficit = 1 - self._requests
+        return max(
+            self._paused_until - now,
+            token_deficit * 60 / self.tokens_per_minute if token_deficit > 0 else 0.0,
+            request_deficit * 60 / self.requests_per_minute if request_deficit > 0 else 0.0,
+            0.0,
+        )
+
+    async def acquire(self, tokens: int, priority: Priority = Priority.INTERACTIVE):
+        """Wait until `tokens` (estimated) can be spent at `priority`, then spend them."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        # A single call larger than the bucket would otherwise wait forever
+        reserve = self.background_reserve * self.tokens_per_minute if priority == Priority.BACKGROUND else 0.0
+        tokens = int(min(tokens, self.tokens_per_minute - reserve))
+
+        entry = (int(priority), next(self._sequence))
+        heapq.heappush(self._waiters, entry)
+        start = time.monotonic()
+
+        try:
+            async with self._condition:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self._delay_for(tokens, priority, now) if self._waiters[0] == entry else None
+
+                    if delay == 0.0:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= tokens
+                        self._requests -= 1
+                        self._condition.notify_all()
+                        break
+
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                async with self._condition:
+                    self._condition.notify_all()
+
+        waited = time.monotonic() - start
+        self._granted[priority.name.lower()] += 1
+        self._total_wait[priority.name.lower()] += waited
+        _wait_time.record(waited, {"priority": priority.name.lower()})
+
+    def refund(self, tokens: int):
+        """Return over-estimated tokens once the actual usage of a call is known."""
+        if tokens > 0:
+            self._tokens = min(self.tokens_per_minute, self._tokens + tokens)
+
+    def throttled(self, retry_after: float):
+        """Pause every caller after a 429 from the service."""
+        self._throttled += 1
+        _throttled.add(1)
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        # Whatever we thought we had, the service disagrees
+        self._tokens = min(self._tokens, 0.0)
+
+    # --------------------------------------------------------
+    # Retry scheduler
+    # --------------------------------------------------------
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        *,
+        tokens: int,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> T:
+        """
+        Run `call` under the limiter, retrying 429s with the server's
+        retry-after or exponential backoff with jitter.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(tokens, priority)
+            try:
+                return await call()
+            except Exception as ex:
+                retry_after = _retry_after_seconds(ex)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise
+
+                backoff = retry_after or min(60.0, 2.0 ** attempt)
+                delay = backoff + random.uniform(0, backoff * 0.25)
+                attempt += 1
+                logger.warning(
+                    f"Azure OpenAI throttled ({priority.name.lower()}); "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                self.throttled(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limiter state, e.g. for benchmarks and diagnostics."""
+        self._refill(time.monotonic())
+        return {
+            "tokens_per_minute": self.tokens_per_minute,
+            "requests_per_minute": self.requests_per_minute,
+            "available_tokens": round(self._tokens),
+            "available_requests": round(self._requests, 1),
+            "waiting": len(self._waiters),
+            "throttled": self._throttled,
+            "granted": dict(self._granted),
+            "avg_wait_s": {
+                k: round(self._total_wait[k] / self._granted[k], 4) if self._granted[k] else 0.0
+                for k in self._granted
+            },
+        }
+
+
+_rate_limiter: Optional[OpenAIRateLimiter] = None
+
+
+def get_rate_limiter() -> OpenAIRateLimiter:
+    """Process-wide limiter shared by chat, embedding and evaluation calls."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = OpenAIRateLimiter()
+    return _rate_limiter
+
+
+def _observe_limiter(options) -> list:
+    if _rate_limiter is None:
+        return []
+    state = _rate_limiter.snapshot()
+    return [
+        Observation(state["available_tokens"], {"bucket": "tokens"}),
+        Observation(state["available_requests"], {"bucket": "requests"}),
+    ]
+
+
+def _observe_waiting(options) -> list:
+    return [Observation(len(_rate_limiter._waiters))] if _rate_limiter is not None else []
+
+
+_wait_time = meter.create_histogram(
+    "openai.rate_limiter.wait_time", unit="s", description="Time spent waiting for Azure OpenAI capacity."
+)
+_throttled = meter.create_counter(
+    "openai.rate_limiter.throttled", description="429 responses received from Azure OpenAI."
+)
+meter.create_observable_gauge(
+    "openai.rate_limiter.available", callbacks=[_observe_limiter],
+    description="Estimated capacity left in the TPM/RPM buckets.",
+)
+meter.create_observable_gauge(
+    "openai.rate_limiter.waiting", callbacks=[_observe_waiting],
+    description="Calls waiting for Azure OpenAI capacity.",
+)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.metrics import meter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_lock_wait_time = meter.create_histogram(
+    "agent.session.lock_wait_time", unit="s", description="Time a turn waited for earlier turns of its session."
+)
+_collapsed = meter.create_counter(
+    "agent.session.collapsed", description="Duplicate submissions answered by an in-flight turn."
+)
+
+
+class _SessionLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+def _normalize(user_input: str) -> str:
+    return " ".join(user_input.split()).casefold()
+
+
+class SessionCoordinator:
+    """
+    Serializes turns of the same chat session.
+
+    - turns of one session run one at a time, in arrival order, so history
+      loads and writes never interleave; different sessions run in parallel
+    - a turn whose (normalized) input is identical to one already in flight
+      for the same session waits for and shares that turn's result instead of
+      running again (double-submits, two open tabs)
+
+    Duplicate collapsing can be disabled with SESSION_COLLAPSE_DUPLICATES=false.
+    Locks are dropped as soon as a session has no pending turns.
+    """
+
+    def __init__(self, collapse_duplicates: Optional[bool] = None):
+        if collapse_duplicates is None:
+            collapse_duplicates = os.getenv("SESSION_COLLAPSE_DUPLICATES", "true").lower() == "true"
+        self.collapse_duplicates = collapse_duplicates
+
+        self._locks: Dict[str, _SessionLock] = {}
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._turns = 0
+        self._collapsed = 0
+        self._total_wait = 0.0
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """Hold the session's lock for the duration of the `async with` block."""
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = _SessionLock()
+        entry.users += 1
+
+        start = time.monotonic()
+        try:
+            async with entry.lock:
+                waited = time.monotonic() - start
+                self._turns += 1
+                self._total_wait += waited
+                _lock_wait_time.record(waited)
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                self._locks.pop(session_id, None)
+
+    async def run(self, session_id: str, user_input: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Run one turn of `session_id`, serialized and de-duplicated as described above."""
+        key = (session_id, _normalize(user_input))
+
+        if self.collapse_duplicates and key in self._in_flight:
+            self._collapsed += 1
+            _collapsed.add(1)
+            logger.info(f"Duplicate submission for session={session_id}; sharing in-flight result.")
+            # Shield so a disconnecting duplicate does not cancel the original turn
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved even when no duplicate ever waits on it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if self.collapse_duplicates:
+            self._in_flight[key] = future
+
+        try:
+            async with self.lock(session_id):
+                result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as ex:
+            future.set_exception(ex)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current session state, e.g. for benchmarks and diagnostics."""
+        return {
+            "active_sessions": len(self._locks),
+            "in_flight": len(self._in_flight),
+            "turns": self._turns,
+            "collapsed": self._collapsed,
+            "avg_lock_wait_s": round(self._total_wait / self._turns, 4) if self._turns else 0.0,
+        }
@@ -2,5 +2,6 @@
 
 from .evaluation import EvaluationEngine
 from .cosmos_evaluation_store import CosmosEvaluationStore
+from .evaluation_rollups import EvaluationRollups
 
-__all__ = ["EvaluationEngine", "CosmosEvaluationStore"]
+__all__ = ["EvaluationEngine", "CosmosEvaluationStore", "EvaluationRollups"]
@@ -1,62 +1,59 @@
-from azure.cosmos.aio import CosmosClient
-from azure.identity.aio import DefaultAzureCredential
 from datetime import datetime
+import logging
 import uuid
-import os
 from dotenv import load_dotenv
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+from app.evaluations.evaluation_rollups import EvaluationRollups
+from app.stores.backends import get_container
 
 
 load_dotenv(override=True)
 
+logger = logging.getLogger(__name__)
+
+
+def failed_evaluators(evaluation: Dict[str, Any]) -> List[str]:
+    """Names of the evaluators whose `<name>_result` is "fail"."""
+    return sorted(
+        name for name, result in (evaluation or {}).items()
+        if isinstance(result, dict) and result.get(f"{name}_result") == "fail"
+    )
+
 
 class CosmosEvaluationStore():
     def __init__(self):
-        self._url = os.getenv("COSMOSDB_ENDPOINT")
-        self._db_name = os.getenv("COSMOSDB_DATABASE")
-        self._container_name = os.getenv("COSMOSDB_EVALUATIONS_CONTAINER", "evaluation")
-
-        if not self._url or not self._db_name:
-            missing = [
-                name
-                for name, value in [
-                    ("COSMOSDB_ENDPOINT", self._url),
-                    ("COSMOSDB_DATABASE", self._db_name),
-                    ("COSMOSDB_EVALUATIONS_CONTAINER", self._container_name),
-                ]
-                if not value
-            ]
-            raise ValueError(f"Missing environment variables: {', '.join(missing)}")
-
-        # Initialize lazily
-        self._client: Optional[CosmosClient] = None
-        self._container = None
-        self._credential: Optional[DefaultAzureCredential] = None
-
-    async def _ensure_container(self):
-        """Ensure the Cosmos DB container is initialized with managed identity."""
-        if self._client is None:
-            self._credential = DefaultAzureCredential()
-            self._client = CosmosClient(self._url, credential=self._credential)
-            database = self._client.get_database_client(self._db_name)
-            self._container = database.get_container_client(self._container_name)
+        self._container = get_container("COSMOSDB_EVALUATIONS_CONTAINER", "evaluation")
+        self.rollups = EvaluationRollups()
 
     async def store_evaluation(self, session_id: str, response_id: str,
                                 user_query: str,
                                   response: str,
                                     evaluation: Dict[str, Any],
                                       metadata: Optional[Dict[str, Any]] = None):
-        await self._ensure_container()
-
+        metadata = metadata or {}
+        timestamp = datetime.utcnow().isoformat()
+        failed = failed_evaluators(evaluation)
         item = {
             "id": str(uuid.uuid4()),
+            # Partition key: the analyzer reads one agent's failures for one day
+            "day": timestamp[:10],
+            "agent": metadata.get("agent"),
+            "has_failure": bool(failed),
+            "failed_evaluators": failed,
             "sessionid": session_id,
             "response_id": response_id,
             "user_query": user_query,
             "response": response,
             "evaluation": evaluation,
-            "metadata": metadata or {},
-            "timestamp": datetime.utcnow().isoformat(),
+            "metadata": metadata,
+            "timestamp": timestamp,
         }
 
-        await self._container.create_item(body=item)
+        await self._container.create_item(item)
+
+        # The evaluation is stored either way; a failed rollup only undercounts
+        try:
+            await self.rollups.record(item["agent"], item["day"], evaluation, metadata.get("latency_ms"))
+        except Exception as e:
+            logger.error(f"Failed to update evaluation rollups: {e}")
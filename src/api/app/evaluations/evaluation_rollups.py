@@ -0,0 +1,140 @@
+import asyncio
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.stores.backends import get_container
+
+
+SCORE_BUCKETS = ("1", "2", "3", "4", "5")
+# Upper bounds (ms) of the response latency buckets; slower responses go to "gt_<last>"
+LATENCY_BUCKETS_MS = (1000, 2000, 5000, 10000, 30000)
+LATENCY_BUCKETS = tuple(f"le_{b}" for b in LATENCY_BUCKETS_MS) + (f"gt_{LATENCY_BUCKETS_MS[-1]}",)
+COUNTERS = ("count", "pass", "fail", "score_sum", "score_count", "latency_ms_sum", "latency_count")
+
+# Characters Cosmos DB does not allow in item ids
+_ID_UNSAFE = str.maketrans({c: "_" for c in "/\\?#"})
+
+
+def score_bucket(score: float) -> str:
+    return SCORE_BUCKETS[min(max(int(round(score)), 1), len(SCORE_BUCKETS)) - 1]
+
+
+def latency_bucket(latency_ms: float) -> str:
+    for bound, label in zip(LATENCY_BUCKETS_MS, LATENCY_BUCKETS):
+        if latency_ms <= bound:
+            return label
+    return LATENCY_BUCKETS[-1]
+
+
+class EvaluationRollups:
+    """
+    Pre-aggregated evaluation metrics, one item per agent/day/evaluator.
+
+    Every stored evaluation increments the counters of its items in place
+    (pass/fail counts, score sum and 1-5 histogram, response latency sum and
+    buckets), so reading a date range costs one single-partition query per
+    day instead of a scan of the raw evaluations. Items are partitioned by
+    `day` like the evaluations themselves.
+    """
+
+    def __init__(self):
+        self._container = get_container("COSMOSDB_ROLLUP_CONTAINER", "evaluationrollups")
+
+    @staticmethod
+    def _empty_item(agent: str, day: str, evaluator: str) -> Dict[str, Any]:
+        return {
+            "id": f"{day}|{agent}|{evaluator}".translate(_ID_UNSAFE),
+            "day": day,
+            "agent": agent,
+            "evaluator": evaluator,
+            **{counter: 0 for counter in COUNTERS},
+            "score_histogram": {bucket: 0 for bucket in SCORE_BUCKETS},
+            "latency_histogram": {bucket: 0 for bucket in LATENCY_BUCKETS},
+        }
+
+    @staticmethod
+    def _increments(name: str, result: Dict[str, Any], latency_ms: Optional[float]) -> Dict[str, float]:
+        increments = {"count": 1}
+        if result.get(f"{name}_result") in ("pass", "fail"):
+            increments[result[f"{name}_result"]] = 1
+        score = result.get(name)
+        if isinstance(score, (int, float)):
+            increments.update({
+                "score_sum": score,
+                "score_count": 1,
+                f"score_histogram.{score_bucket(score)}": 1,
+            })
+        if latency_ms is not None:
+            increments.update({
+                "latency_ms_sum": latency_ms,
+                "latency_count": 1,
+                f"latency_histogram.{latency_bucket(latency_ms)}": 1,
+            })
+        return increments
+
+    async def record(self, agent: str, day: str, evaluation: Dict[str, Any], latency_ms: Optional[float] = None):
+        """Add one evaluation (evaluator name -> azure-ai-evaluation result) to the day's counters."""
+        await asyncio.gather(*(
+            self._container.increment_item(
+                self._empty_item(agent, day, name),
+                self._increments(name, result, latency_ms),
+                partition_key=day,
+            )
+            for name, result in (evaluation or {}).items()
+            if isinstance(result, dict)
+        ))
+
+    async def _read_day(self, agent: str, day: str, evaluator: Optional[str]) -> List[Dict[str, Any]]:
+        filters = {"day": day, "agent": agent}
+        if evaluator:
+            filters["evaluator"] = evaluator
+        return [item async for item in self._container.query_items(filters)]
+
+    async def query(
+        self,
+        agent: str,
+        start: date,
+        end: date,
+        evaluator: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Metrics of `agent` from `start` to `end` (inclusive), per evaluator:
+        totals, fail rate, mean score and latency, histograms, and per-day counts.
+        """
+        days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        per_day = await asyncio.gather(*(self._read_day(agent, day, evaluator) for day in days))
+
+        evaluators: Dict[str, Dict[str, Any]] = {}
+        for items in per_day:
+            for item in items:
+                totals = evaluators.setdefault(item["evaluator"], {
+                    **{counter: 0 for counter in COUNTERS},
+                    "score_histogram": {bucket: 0 for bucket in SCORE_BUCKETS},
+                    "latency_histogram": {bucket: 0 for bucket in LATENCY_BUCKETS},
+                    "days": {},
+                })
+                for counter in COUNTERS:
+                    totals[counter] += item.get(counter, 0)
+                for histogram in ("score_histogram", "latency_histogram"):
+                    for bucket, count in item.get(histogram, {}).items():
+                        totals[histogram][bucket] = totals[histogram].get(bucket, 0) + count
+                totals["days"][item["day"]] = {k: item.get(k, 0) for k in ("count", "pass", "fail")}
+
+        metrics = {}
+        for name, totals in sorted(evaluators.items()):
+            graded = totals["pass"] + totals["fail"]
+            metrics[name] = {
+                "count": totals["count"],
+                "pass": totals["pass"],
+                "fail": totals["fail"],
+                "fail_rate": totals["fail"] / graded if graded else None,
+                "mean_score": totals["score_sum"] / totals["score_count"] if totals["score_count"] else None,
+                "mean_latency_ms": (
+                    totals["latency_ms_sum"] / totals["latency_count"] if totals["latency_count"] else None
+                ),
+                "score_histogram": totals["score_histogram"],
+                "latency_histogram": totals["latency_histogram"],
+                "days": totals["days"],
+            }
+
+        return {"agent": agent, "from": days[0], "to": days[-1], "evaluators": metrics}
@@ -1,16 +1,15 @@
 # app/history/cosmos_chat_history.py
 
-from azure.cosmos.aio import CosmosClient
-from azure.identity.aio import DefaultAzureCredential
 from semantic_kernel.contents import ChatHistory
 from datetime import datetime
 import uuid
-import os
 
 from dotenv import load_dotenv
 from enum import Enum
 from typing import Any, Dict, Optional
 
+from app.stores.backends import get_container
+
 load_dotenv(override=True)
 
 
@@ -23,45 +22,13 @@ class ChatRole(str, Enum):
 
 class CosmosChatHistoryStore:
     def __init__(self, limit: int = 500):
-        self._url = os.getenv("COSMOSDB_ENDPOINT")
-        self._db_name = os.getenv("COSMOSDB_DATABASE")
-        self._container_name = os.getenv("COSMOSDB_HISTORY_CONTAINER")
+        self._container = get_container("COSMOSDB_HISTORY_CONTAINER", "chathistory")
         self._limit = limit
 
-        if not self._url or not self._db_name or not self._container_name:
-            missing = [
-                name
-                for name, value in [
-                    ("COSMOSDB_ENDPOINT", self._url),
-                    ("COSMOSDB_DATABASE", self._db_name),
-                    ("COSMOSDB_HISTORY_CONTAINER", self._container_name),
-                ]
-                if not value
-            ]
-            raise ValueError(f"Missing environment variables: {', '.join(missing)}")
-
-        # Initialize lazily
-        self._client: Optional[CosmosClient] = None
-        self._container = None
-        self._credential: Optional[DefaultAzureCredential] = None
-
-    async def _ensure_container(self):
-        """Ensure the Cosmos DB container is initialized."""
-        if self._client is None:
-            self._credential = DefaultAzureCredential()
-            self._client = CosmosClient(self._url, credential=self._credential)
-            database = self._client.get_database_client(self._db_name)
-            self._container = database.get_container_client(self._container_name)
-
     async def load(self, session_id: str) -> ChatHistory:
-        await self._ensure_container()
         chat_history = ChatHistory()
-        query = "SELECT * FROM c WHERE c.sessionid = @sid"
-        params = [{"name": "@sid", "value": session_id}]
 
-        results = self._container.query_items(query, parameters=params)
-
-        async for item in results:
+        async for item in self._container.query_items({"sessionid": session_id}):
             role = item.get("role")
             if role == ChatRole.USER.value:
                 chat_history.add_user_message(item["message"])
@@ -84,8 +51,6 @@ class CosmosChatHistoryStore:
         function_name: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None
     ):
-        await self._ensure_container()
-
         # Update ChatHistory based on role
         if role == ChatRole.USER:
             history.add_user_message(content)
@@ -98,7 +63,7 @@ class CosmosChatHistoryStore:
         else:
             raise ValueError(f"Unknown role: {role}")
 
-        # Persist to Cosmos
+        # Persist to the configured storage backend
         item = {
             "id": str(uuid.uuid4()),
             "sessionid": session_id,
@@ -109,6 +74,6 @@ class CosmosChatHistoryStore:
             "function_name": function_name,
             "metadata": metadata or {},
             "timestamp": datetime.utcnow().isoformat()
-            
+
         }
-        await self._container.create_item(body=item)
+        await self._container.create_item(item)
@@ -0,0 +1,28 @@
+import logging
+import os
+
+from opentelemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+# Instruments are created against the global meter provider. Until
+# configure_metrics() installs one they are cheap no-ops.
+meter = metrics.get_meter("api")
+
+
+def configure_metrics():
+    """Export OpenTelemetry metrics to Application Insights when a connection string is set."""
+    connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+    if not connection_string:
+        logger.info("APPLICATIONINSIGHTS_CONNECTION_STRING not set; metrics will not be exported.")
+        return
+
+    from azure.monitor.opentelemetry.exporter import AzureMonitorMetricExporter
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+    reader = PeriodicExportingMetricReader(
+        AzureMonitorMetricExporter(connection_string=connection_string),
+        export_interval_millis=int(os.getenv("METRICS_EXPORT_INTERVAL_MS", "60000")),
+    )
+    metrics.set_meter_provider(MeterProvider(metric_readers=[reader]))
@@ -55,7 +55,7 @@ class AzureSearchPlugin:
                 )
             ],
             top=top,
-            select=["title", "content", "pageNumber"],
+            select=["title", "content", "pageNumber", "pageEnd", "sources"],
         )
         return self._format_results(results)
 
@@ -77,6 +77,9 @@ class AzureSearchPlugin:
                 "title": r.get("title", ""),
                 "content": r.get("content", ""),
                 "pageNumber": r.get("pageNumber", ""),
+                "pageEnd": r.get("pageEnd"),
+                # Every document and page range a near-duplicate chunk stands for
+                "sources": r.get("sources") or [],
             }
             for r in results
         ]
@@ -88,6 +91,14 @@ class AzureSearchPlugin:
         
         md = f"**{title}**\n\n"
         for i, r in enumerate(results, start=1):
-            md += f"**{i}. {r['title']} (Page {r['pageNumber']})**\n"
+            pages = r["pageNumber"]
+            if r.get("pageEnd") and str(r["pageEnd"]) != str(r["pageNumber"]):
+                pages = f"{r['pageNumber']}-{r['pageEnd']}"
+            md += f"**{i}. {r['title']} (Page {pages})**\n"
+            # Labels are written by the ingestion dedup stage as "<title> (page n)" / "(pages n-m)"
+            own = f"{r['title']} (page {pages})" if pages == r["pageNumber"] else f"{r['title']} (pages {pages})"
+            others = [source for source in r.get("sources", []) if source != own]
+            if others:
+                md += f"_Also in: {'; '.join(others)}_\n"
             md += f"{r['content']}\n\n"
         return md
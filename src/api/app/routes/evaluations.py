@@ -0,0 +1,35 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+import logging
+
+from app.evaluations.evaluation_rollups import EvaluationRollups
+
+
+router = APIRouter()
+
+logger = logging.getLogger("api.routes.evaluations")
+
+evaluation_rollups = EvaluationRollups()
+
+# Longest range one request may read (one rollup query per day)
+MAX_RANGE_DAYS = 366
+
+
+@router.get("/evaluations/metrics")
+async def get_evaluation_metrics(
+    agent: str,
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    evaluator: Optional[str] = None,
+):
+    """Pre-aggregated evaluation metrics of an agent for a date range (inclusive)."""
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'.")
+    if (to_date - from_date).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days.")
+    try:
+        return await evaluation_rollups.query(agent, from_date, to_date, evaluator)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
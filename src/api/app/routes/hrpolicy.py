@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 import logging
 
 from app.agents.hr_agent import SemanticKernelHRAgent
+from app.concurrency import AdmissionRejected
 from app.schemas.agent import AgentRequest, AgentResponse
 
 router = APIRouter()
@@ -19,6 +20,12 @@ async def _startup_event():
     logger.info("Agent initialized.")
 
 
+@router.on_event("shutdown")
+async def _shutdown_event():
+    logger.info("Waiting for background evaluations and cache writes...")
+    await agent.wait_for_background_tasks()
+
+
 @router.post("/hrpolicy/agent", response_model=AgentResponse)
 async def handle_request(payload: AgentRequest):
     try:
@@ -26,6 +33,8 @@ async def handle_request(payload: AgentRequest):
         result = await agent.invoke(payload.user_input, payload.session_id)
         logger.info(f'Results:{result}')
         return result
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,47 @@
+"""Storage backends for the API stores.
+
+The backend is selected with the `STORAGE_BACKEND` environment variable:
+
+    cosmos  (default) Azure Cosmos DB with managed identity
+    memory  process-local dicts; data is lost on restart
+    sqlite  local file at `STORAGE_SQLITE_PATH` (default: storage.db)
+"""
+
+import os
+from typing import Dict, Sequence
+
+from .base import StorageConflictError, StorageContainer
+from .cosmos import CosmosContainer
+from .memory import MemoryContainer
+from .sqlite import SQLiteContainer
+
+__all__ = [
+    "StorageConflictError",
+    "StorageContainer",
+    "CosmosContainer",
+    "MemoryContainer",
+    "SQLiteContainer",
+    "get_container",
+]
+
+_memory_containers: Dict[str, MemoryContainer] = {}
+
+
+def get_container(env_var: str, default: str, vector_fields: Sequence[str] = ()) -> StorageContainer:
+    """
+    Return the container named by `env_var` (or `default`) on the configured backend.
+    Memory containers are shared per name so every store in the process sees the same data.
+    """
+    name = os.getenv(env_var) or default
+    backend = os.getenv("STORAGE_BACKEND", "cosmos").lower()
+
+    if backend == "cosmos":
+        return CosmosContainer(name, vector_fields)
+    if backend == "memory":
+        if name not in _memory_containers:
+            _memory_containers[name] = MemoryContainer(name, vector_fields)
+        return _memory_containers[name]
+    if backend == "sqlite":
+        return SQLiteContainer(name, vector_fields, path=os.getenv("STORAGE_SQLITE_PATH", "storage.db"))
+
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'. Expected one of: cosmos, memory, sqlite")
@@ -0,0 +1,87 @@
+# app/stores/backends/base.py
+
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+
+class StorageConflictError(Exception):
+    """Raised by `create_item` when an item with the same id already exists."""
+
+
+class StorageContainer(ABC):
+    """
+    Minimal document container used by the API stores.
+
+    Items are JSON-serializable dicts with a string `id`. Backends only need to
+    support what the stores actually do:
+        - create / upsert single items
+        - atomic numeric increments on a single item (counters)
+        - equality filters on (dotted) fields, in insertion order
+        - top-k vector search returning cosine *distance* as `score` (lower is closer)
+
+    `vector_fields` names the fields that hold embeddings so backends without
+    native vector support can store them compactly.
+    """
+
+    def __init__(self, name: str, vector_fields: Sequence[str] = ()):
+        self.name = name
+        self.vector_fields = tuple(vector_fields)
+
+    @abstractmethod
+    async def create_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a new item; raise StorageConflictError if the id exists."""
+
+    @abstractmethod
+    async def upsert_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert or replace an item by id."""
+
+    @abstractmethod
+    async def increment_item(
+        self,
+        item: Dict[str, Any],
+        increments: Dict[str, float],
+        partition_key: Any = None,
+    ) -> None:
+        """
+        Add `increments` to numeric fields (dotted paths allowed) of the item with
+        `item["id"]`, creating it as `item` first if it does not exist.
+        `partition_key` defaults to the id.
+        """
+
+    @abstractmethod
+    def query_items(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield items whose fields equal every value in `filters` (dotted paths allowed)."""
+
+    @abstractmethod
+    def vector_search(
+        self,
+        vector_field: str,
+        vector: List[float],
+        *,
+        select: List[str],
+        top: int = 1,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the `top` closest items projected to `select` plus a `score` distance."""
+
+    async def close(self):
+        """Release any client resources held by the backend."""
+        return None
+
+
+def add_to_path(item: Dict[str, Any], path: str, value: float):
+    """Add `value` to the number at a dotted field path, creating missing levels."""
+    *parents, leaf = path.split(".")
+    target = item
+    for part in parents:
+        target = target.setdefault(part, {})
+    target[leaf] = target.get(leaf, 0) + value
+
+
+def get_path(item: Dict[str, Any], path: str) -> Any:
+    """Resolve a dotted field path (e.g. `metadata.agent`) against an item."""
+    value: Any = item
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
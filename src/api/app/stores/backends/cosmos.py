@@ -0,0 +1,150 @@
+# app/stores/backends/cosmos.py
+
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from azure.cosmos import exceptions
+from azure.cosmos.aio import CosmosClient
+from azure.identity.aio import DefaultAzureCredential
+
+from app.stores.backends.base import StorageConflictError, StorageContainer
+
+logger = logging.getLogger(__name__)
+
+# Cosmos DB accepts at most this many operations per patch request
+MAX_PATCH_OPERATIONS = 10
+
+
+class CosmosContainer(StorageContainer):
+    """Azure Cosmos DB (NoSQL) container, authenticated with managed identity."""
+
+    def __init__(self, name: str, vector_fields: Sequence[str] = ()):
+        super().__init__(name, vector_fields)
+
+        self._url = os.getenv("COSMOSDB_ENDPOINT")
+        self._db_name = os.getenv("COSMOSDB_DATABASE")
+
+        missing = [
+            env_name
+            for env_name, value in [
+                ("COSMOSDB_ENDPOINT", self._url),
+                ("COSMOSDB_DATABASE", self._db_name),
+            ]
+            if not value
+        ]
+        if missing:
+            raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+
+        # Initialize lazily
+        self._client: Optional[CosmosClient] = None
+        self._container = None
+        self._credential: Optional[DefaultAzureCredential] = None
+
+    async def _ensure_container(self):
+        """Ensure the Cosmos DB container is initialized with managed identity."""
+        if self._client is None:
+            logger.debug(f"Initializing Cosmos DB client for container '{self.name}'...")
+            self._credential = DefaultAzureCredential()
+            self._client = CosmosClient(self._url, credential=self._credential)
+            database = self._client.get_database_client(self._db_name)
+            self._container = database.get_container_client(self.name)
+
+    async def create_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        await self._ensure_container()
+        try:
+            return await self._container.create_item(body=item)
+        except exceptions.CosmosResourceExistsError as ex:
+            raise StorageConflictError(item.get("id")) from ex
+
+    async def upsert_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        await self._ensure_container()
+        return await self._container.upsert_item(item)
+
+    async def _patch(self, item_id: str, partition_key: Any, operations: List[Dict[str, Any]]):
+        for start in range(0, len(operations), MAX_PATCH_OPERATIONS):
+            await self._container.patch_item(
+                item=item_id,
+                partition_key=partition_key,
+                patch_operations=operations[start:start + MAX_PATCH_OPERATIONS],
+            )
+
+    async def increment_item(
+        self,
+        item: Dict[str, Any],
+        increments: Dict[str, float],
+        partition_key: Any = None,
+    ) -> None:
+        """
+        Server-side `incr` patch operations, so concurrent writers never lose
+        counts. The first write for an id creates the item and then patches it.
+        """
+        await self._ensure_container()
+        partition_key = item["id"] if partition_key is None else partition_key
+        operations = [
+            {"op": "incr", "path": "/" + path.replace(".", "/"), "value": value}
+            for path, value in increments.items()
+        ]
+        try:
+            await self._patch(item["id"], partition_key, operations)
+        except exceptions.CosmosResourceNotFoundError:
+            try:
+                await self._container.create_item(body=item)
+            except exceptions.CosmosResourceExistsError:
+                pass  # created by a concurrent writer
+            await self._patch(item["id"], partition_key, operations)
+
+    async def query_items(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        await self._ensure_container()
+
+        conditions = []
+        params = []
+        for index, (path, value) in enumerate((filters or {}).items()):
+            conditions.append(f"c.{path} = @p{index}")
+            params.append({"name": f"@p{index}", "value": value})
+
+        query = "SELECT * FROM c"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        async for item in self._container.query_items(query, parameters=params):
+            yield item
+
+    async def vector_search(
+        self,
+        vector_field: str,
+        vector: List[float],
+        *,
+        select: List[str],
+        top: int = 1,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Performs vector search using Cosmos SQL VectorDistance().
+        Cosmos DB requires the full expression in ORDER BY (cannot use alias).
+        """
+        await self._ensure_container()
+
+        projection = ", ".join(f"c.{f}" for f in select)
+        sql = (
+            f"SELECT TOP @k {projection}, "
+            f"VectorDistance(c.{vector_field}, @qv) AS score "
+            "FROM c "
+            f"ORDER BY VectorDistance(c.{vector_field}, @qv)"
+        )
+        params = [
+            {"name": "@k", "value": top},
+            {"name": "@qv", "value": vector},
+        ]
+
+        async for doc in self._container.query_items(query=sql, parameters=params):
+            # Cosmos returns cosine *similarity* (1 = identical); normalize to distance
+            doc["score"] = 1.0 - doc["score"]
+            yield doc
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            await self._credential.close()
+            self._client = None
+            self._container = None
+            self._credential = None
@@ -0,0 +1,74 @@
+# app/stores/backends/memory.py
+
+import copy
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.stores.backends.base import StorageConflictError, StorageContainer, add_to_path, get_path
+
+
+def cosine_distances(matrix: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    """Brute-force cosine distance between each row of `matrix` and `vector`."""
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    norms[norms == 0] = 1.0
+    return 1.0 - (matrix @ vector) / norms
+
+
+class MemoryContainer(StorageContainer):
+    """
+    Process-local container backed by a dict.
+
+    Intended for tests, benchmarks and the offline dev loop. Containers with the
+    same name share data within a process (see `get_container`).
+    """
+
+    def __init__(self, name: str, vector_fields: Sequence[str] = ()):
+        super().__init__(name, vector_fields)
+        self._items: Dict[str, Dict[str, Any]] = {}
+
+    async def create_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        if item["id"] in self._items:
+            raise StorageConflictError(item["id"])
+        self._items[item["id"]] = copy.deepcopy(item)
+        return item
+
+    async def upsert_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        self._items[item["id"]] = copy.deepcopy(item)
+        return item
+
+    async def increment_item(
+        self,
+        item: Dict[str, Any],
+        increments: Dict[str, float],
+        partition_key: Any = None,
+    ) -> None:
+        stored = self._items.setdefault(item["id"], copy.deepcopy(item))
+        for path, value in increments.items():
+            add_to_path(stored, path, value)
+
+    async def query_items(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        filters = filters or {}
+        for item in list(self._items.values()):
+            if all(get_path(item, path) == value for path, value in filters.items()):
+                yield copy.deepcopy(item)
+
+    async def vector_search(
+        self,
+        vector_field: str,
+        vector: List[float],
+        *,
+        select: List[str],
+        top: int = 1,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        candidates = [item for item in self._items.values() if item.get(vector_field) is not None]
+        if not candidates:
+            return
+
+        matrix = np.asarray([item[vector_field] for item in candidates], dtype=np.float32)
+        distances = cosine_distances(matrix, np.asarray(vector, dtype=np.float32))
+
+        for index in np.argsort(distances)[:top]:
+            doc = {f: copy.deepcopy(candidates[index].get(f)) for f in select}
+            doc["score"] = float(distances[index])
+            yield doc
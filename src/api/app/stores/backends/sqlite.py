@@ -0,0 +1,205 @@
+# app/stores/backends/sqlite.py
+
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.stores.backends.base import StorageConflictError, StorageContainer, add_to_path
+from app.stores.backends.memory import cosine_distances
+
+
+_connections: Dict[str, sqlite3.Connection] = {}
+_connections_lock = threading.Lock()
+_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """One shared connection per database file; access is serialized by `_lock`."""
+    with _connections_lock:
+        if path not in _connections:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _connections[path] = conn
+        return _connections[path]
+
+
+class SQLiteContainer(StorageContainer):
+    """
+    Local-disk container backed by a SQLite table.
+
+    Items are stored as JSON; vector fields are split out as float32 blobs and
+    searched by brute-force cosine distance with numpy. All SQLite work runs in
+    a worker thread so the event loop is never blocked on disk I/O.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name: str, vector_fields: Sequence[str] = (), path: str = "storage.db"):
+        super().__init__(name, vector_fields)
+
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid container name for SQLite backend: {name}")
+
+        self._path = path
+        self._conn = _connect(path)
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "id TEXT NOT NULL UNIQUE, "
+                "body TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name}__vectors ("
+                "id TEXT NOT NULL, "
+                "field TEXT NOT NULL, "
+                "vector BLOB NOT NULL, "
+                "PRIMARY KEY (id, field))"
+            )
+
+    # --------------------------------------------------------
+    # Helpers
+    # --------------------------------------------------------
+    def _run(self, fn, *args):
+        def _locked():
+            with self._lock:
+                return fn(*args)
+        return asyncio.to_thread(_locked)
+
+    def _split_vectors(self, item: Dict[str, Any]):
+        body = dict(item)
+        vectors = {}
+        for field in self.vector_fields:
+            value = body.pop(field, None)
+            if value is not None:
+                vectors[field] = np.asarray(value, dtype=np.float32).tobytes()
+        return json.dumps(body), vectors
+
+    def _write(self, item: Dict[str, Any], upsert: bool):
+        body, vectors = self._split_vectors(item)
+        self._conn.execute("BEGIN")
+        try:
+            if upsert:
+                self._conn.execute(
+                    f"INSERT INTO {self.name} (id, body) VALUES (?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET body = excluded.body",
+                    (item["id"], body),
+                )
+            else:
+                self._conn.execute(f"INSERT INTO {self.name} (id, body) VALUES (?, ?)", (item["id"], body))
+
+            self._conn.execute(f"DELETE FROM {self.name}__vectors WHERE id = ?", (item["id"],))
+            self._conn.executemany(
+                f"INSERT INTO {self.name}__vectors (id, field, vector) VALUES (?, ?, ?)",
+                [(item["id"], field, blob) for field, blob in vectors.items()],
+            )
+            self._conn.execute("COMMIT")
+        except sqlite3.IntegrityError as ex:
+            self._conn.execute("ROLLBACK")
+            raise StorageConflictError(item["id"]) from ex
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _increment(self, item: Dict[str, Any], increments: Dict[str, float]):
+        # Read-modify-write in one transaction; vector fields are not counters
+        self._conn.execute("BEGIN")
+        try:
+            row = self._conn.execute(f"SELECT body FROM {self.name} WHERE id = ?", (item["id"],)).fetchone()
+            body = json.loads(row[0]) if row else json.loads(self._split_vectors(item)[0])
+            for path, value in increments.items():
+                add_to_path(body, path, value)
+            self._conn.execute(
+                f"INSERT INTO {self.name} (id, body) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET body = excluded.body",
+                (item["id"], json.dumps(body)),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _attach_vectors(self, rows: List[tuple]) -> List[Dict[str, Any]]:
+        items = [json.loads(body) for _, body in rows]
+        if self.vector_fields and items:
+            ids = [item_id for item_id, _ in rows]
+            placeholders = ", ".join("?" for _ in ids)
+            by_id = {item["id"]: item for item in items}
+            for item_id, field, blob in self._conn.execute(
+                f"SELECT id, field, vector FROM {self.name}__vectors WHERE id IN ({placeholders})", ids
+            ):
+                by_id[item_id][field] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return items
+
+    def _select(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        conditions = ["json_extract(body, ?) = ?" for _ in filters]
+        params: List[Any] = []
+        for path, value in filters.items():
+            params.extend([f"$.{path}", value])
+
+        sql = f"SELECT id, body FROM {self.name}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY seq"
+
+        return self._attach_vectors(self._conn.execute(sql, params).fetchall())
+
+    def _nearest(self, vector_field: str, vector: List[float], select: List[str], top: int):
+        rows = self._conn.execute(
+            f"SELECT v.vector, t.body FROM {self.name}__vectors v "
+            f"JOIN {self.name} t ON t.id = v.id WHERE v.field = ?",
+            (vector_field,),
+        ).fetchall()
+        if not rows:
+            return []
+
+        matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for blob, _ in rows])
+        distances = cosine_distances(matrix, np.asarray(vector, dtype=np.float32))
+
+        results = []
+        for index in np.argsort(distances)[:top]:
+            body = json.loads(rows[index][1])
+            doc = {f: body.get(f) for f in select}
+            doc["score"] = float(distances[index])
+            results.append(doc)
+        return results
+
+    # --------------------------------------------------------
+    # StorageContainer
+    # --------------------------------------------------------
+    async def create_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        await self._run(self._write, item, False)
+        return item
+
+    async def upsert_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        await self._run(self._write, item, True)
+        return item
+
+    async def increment_item(
+        self,
+        item: Dict[str, Any],
+        increments: Dict[str, float],
+        partition_key: Any = None,
+    ) -> None:
+        await self._run(self._increment, item, increments)
+
+    async def query_items(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        for item in await self._run(self._select, filters or {}):
+            yield item
+
+    async def vector_search(
+        self,
+        vector_field: str,
+        vector: List[float],
+        *,
+        select: List[str],
+        top: int = 1,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        for doc in await self._run(self._nearest, vector_field, vector, select, top):
+            yield doc
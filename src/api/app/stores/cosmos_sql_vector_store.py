@@ -6,12 +6,12 @@ import logging
 from dataclasses import dataclass
 from typing import Any, AsyncIterator, List, Optional
 
-from azure.cosmos.aio import CosmosClient
-from azure.identity.aio import DefaultAzureCredential
-from azure.core.credentials_async import AsyncTokenCredential
-
+from openai import AsyncAzureOpenAI
 from semantic_kernel.connectors.ai.open_ai import AzureTextEmbedding
 
+from app.concurrency.rate_limiter import Priority, estimate_tokens, get_rate_limiter
+from app.stores.backends import get_container
+
 
 logger = logging.getLogger(__name__)
 
@@ -58,29 +58,18 @@ class CosmosDBSqlVectorStore:
     A clean custom vector store supporting:
         - upsert(CacheRecord)
         - search(query_text)
-        - Cosmos DB VectorDistance queries
+        - Cosmos DB VectorDistance queries (or local backends via STORAGE_BACKEND)
 
     This does NOT depend on Semantic Kernel memory stores.
     """
 
     def __init__(self):
         # -----------------------------
-        # Environment setup
+        # Storage backend (Cosmos DB, memory or SQLite)
         # -----------------------------
-        self._url = os.getenv("COSMOSDB_ENDPOINT")
-        self._db_name = os.getenv("COSMOSDB_DATABASE")
-        self._container_name = os.getenv("COSMOSDB_CACHE_CONTAINER", "llm_responses")
-
-        missing = [
-            name for name, value in [
-                ("COSMOSDB_ENDPOINT", self._url),
-                ("COSMOSDB_DATABASE", self._db_name),
-                ("COSMOSDB_CACHE_CONTAINER", self._container_name)
-            ]
-            if not value
-        ]
-        if missing:
-            raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+        self._container = get_container(
+            "COSMOSDB_CACHE_CONTAINER", "llm_responses", vector_fields=("prompt",)
+        )
 
         # -----------------------------
         # Embedding service
@@ -91,43 +80,39 @@ class CosmosDBSqlVectorStore:
             api_key=os.environ["AZURE_OPENAI_API_KEY"],
             endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
             api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+            # Throttling is retried by the shared rate limiter, not per client
+            async_client=AsyncAzureOpenAI(
+                azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+                api_key=os.environ["AZURE_OPENAI_API_KEY"],
+                api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+                max_retries=0,
+            ),
         )
 
-        # -----------------------------
-        # Lazily-initialized Cosmos client + container
-        # -----------------------------
-        self._client: Optional[CosmosClient] = None
-        self._container = None
-        self._credential: Optional[AsyncTokenCredential] = None
-
     # --------------------------------------------------------
     # Initialization helpers
     # --------------------------------------------------------
-    async def _ensure_container(self):
-        if self._client is None:
-            logger.debug("Initializing Cosmos DB client + container...")
-            self._credential = DefaultAzureCredential()
-            self._client = CosmosClient(self._url, credential=self._credential)
-
-            db = self._client.get_database_client(self._db_name)
-            self._container = db.get_container_client(self._container_name)
-
     async def ensure_collection_exists(self):
         """Provided for parity—container already created via Bicep."""
-        await self._ensure_container()
+        return None
 
     # --------------------------------------------------------
     # Embeddings
     # --------------------------------------------------------
-    async def _embed_text(self, text: str) -> List[float]:
+    async def _embed_text(self, text: str, priority: Priority = Priority.INTERACTIVE) -> List[float]:
         eg = self._embedding_generator
 
         if hasattr(eg, "generate_embeddings_async"):
-            vectors = await eg.generate_embeddings_async([text])
-            vector = vectors[0]
+            generate = eg.generate_embeddings_async
         else:
-            vectors = await eg.generate_embeddings([text])
-            vector = vectors[0]
+            generate = eg.generate_embeddings
+
+        vectors = await get_rate_limiter().run(
+            lambda: generate([text]),
+            tokens=estimate_tokens(text),
+            priority=priority,
+        )
+        vector = vectors[0]
 
         # FIX: Ensure vector is JSON-serializable (Cosmos DB requires Python list)
         return vector.tolist() if hasattr(vector, "tolist") else vector
@@ -136,11 +121,9 @@ class CosmosDBSqlVectorStore:
     # UPSERT
     # --------------------------------------------------------
     async def upsert(self, record: CacheRecord):
-        """Writes one CacheRecord → Cosmos vector index."""
-        await self._ensure_container()
-
+        """Writes one CacheRecord → vector index (embedding at background priority)."""
         prompt_text = record.prompt or ""
-        prompt_vector = await self._embed_text(prompt_text)
+        prompt_vector = await self._embed_text(prompt_text, priority=Priority.BACKGROUND)
 
         doc_id = record.id or str(uuid.uuid4())
 
@@ -165,30 +148,18 @@ class CosmosDBSqlVectorStore:
         top: int = 1,
     ) -> _SearchResultsWrapper:
         """
-        Performs vector search using Cosmos SQL VectorDistance().
-        Cosmos DB requires the full expression in ORDER BY (cannot use alias).
+        Performs vector search on the configured backend
+        (Cosmos SQL VectorDistance() or brute-force cosine for local backends).
+        Scores are cosine distances: lower is more similar.
         """
-        await self._ensure_container()
-
         # Convert embedding → Python list, not ndarray
         query_vector = await self._embed_text(query)
 
-        # FIX: Must repeat full VectorDistance expression in ORDER BY.
-        sql = (
-            "SELECT TOP @k c.id, c.result, c.promptText, "
-            f"VectorDistance(c.{vector_property_name}, @qv) AS score "
-            "FROM c "
-            f"ORDER BY VectorDistance(c.{vector_property_name}, @qv)"
-        )
-
-        params = [
-            {"name": "@k", "value": top},
-            {"name": "@qv", "value": query_vector},
-        ]
-
-        items_iter = self._container.query_items(
-            query=sql,
-            parameters=params
+        items_iter = self._container.vector_search(
+            vector_property_name,
+            query_vector,
+            select=["id", "result", "promptText"],
+            top=top,
         )
 
         async def _gen() -> AsyncIterator[SearchResultItem]:
@@ -0,0 +1,6 @@
+"""Offline load-test and benchmark harness for the API.
+
+Runs the FastAPI app in-process against local stand-ins for Azure OpenAI,
+Azure AI Search and Cosmos DB so performance changes can be measured on a
+plain Linux box with no network access.
+"""
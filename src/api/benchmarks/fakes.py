@@ -0,0 +1,325 @@
+# benchmarks/fakes.py
+
+"""
+In-process stand-ins for the Azure services the API talks to.
+
+Each fake has a configurable latency so the benchmark can model the real
+service round-trip without network access:
+
+    - FakeChatCompletion: Semantic Kernel chat service with optional tool calls
+    - FakeTextEmbedding: deterministic embeddings (identical text -> identical vector)
+    - FakeSearchClient: synchronous Azure AI Search client (blocks like the real SDK)
+    - FakeEvaluationEngine: synchronous judge evaluators (blocks like the real SDK)
+    - InMemoryCosmosContainer: async Cosmos container for the query shapes the stores use
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from azure.cosmos import exceptions
+from pydantic import PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.contents import ChatHistory, ChatMessageContent, FunctionCallContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+
+EMBEDDING_DIMENSIONS = 1536
+
+SAMPLE_DOCUMENTS = [
+    {
+        "title": "Demo Vacation Policy.pdf",
+        "content": "Full-time employees accrue 15 days of paid vacation per year. "
+                   "Up to 5 unused days may be carried over into the next calendar year.",
+        "pageNumber": "1",
+    },
+    {
+        "title": "Demo Absence Policy.pdf",
+        "content": "Employees must notify their manager of an unplanned absence before "
+                   "the start of their scheduled shift.",
+        "pageNumber": "2",
+    },
+    {
+        "title": "Demo Benefits Enrollment Policy.pdf",
+        "content": "New hires may enroll in health benefits within 30 days of their start date.",
+        "pageNumber": "1",
+    },
+    {
+        "title": "Demo Performance Appraisal Policy.pdf",
+        "content": "Performance appraisals are conducted annually with a mid-year check-in.",
+        "pageNumber": "3",
+    },
+]
+
+
+# --------------------------------------------------------
+# Chat completion
+# --------------------------------------------------------
+class FakeChatCompletion(ChatCompletionClientBase):
+    """
+    Chat completion service that answers after a fixed latency.
+
+    On a fresh user turn the model requests the search tool with probability
+    `tool_call_rate`; once a tool result is in the history it returns the
+    final JSON answer the HR agent expects.
+    """
+
+    SUPPORTS_FUNCTION_CALLING = True
+
+    latency: float = 0.25
+    tool_call_rate: float = 1.0
+    tool_name: str = "AzureSearchPlugin-search"
+    seed: int = 7
+    calls: int = 0
+
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._rng = random.Random(self.seed)
+
+    async def _inner_get_chat_message_contents(
+        self,
+        chat_history: ChatHistory,
+        settings: Any,
+    ) -> List[ChatMessageContent]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+        last = chat_history.messages[-1] if chat_history.messages else None
+        tools_enabled = getattr(settings, "function_choice_behavior", None) is not None
+
+        if last is not None and last.role == AuthorRole.USER and tools_enabled \
+                and self._rng.random() < self.tool_call_rate:
+            return [
+                ChatMessageContent(
+                    role=AuthorRole.ASSISTANT,
+                    items=[
+                        FunctionCallContent(
+                            id=f"call_{uuid.uuid4().hex[:12]}",
+                            name=self.tool_name,
+                            arguments=json.dumps({"query": last.content, "top": 5}),
+                        )
+                    ],
+                )
+            ]
+
+        answer = {
+            "content": "<p>Employees accrue 15 days of paid vacation per year.</p>",
+            "references": [SAMPLE_DOCUMENTS[0]["title"]],
+        }
+        return [ChatMessageContent(role=AuthorRole.ASSISTANT, content=json.dumps(answer))]
+
+
+# --------------------------------------------------------
+# Embeddings
+# --------------------------------------------------------
+class FakeTextEmbedding:
+    """
+    Deterministic embedding service.
+
+    Each distinct (whitespace/case-normalized) text maps to its own random
+    unit vector, so repeated questions are exact cache hits and different
+    questions are far apart.
+    """
+
+    def __init__(self, latency: float = 0.03, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def _vector(self, text: str) -> np.ndarray:
+        normalized = " ".join(text.lower().split())
+        seed = int.from_bytes(hashlib.sha256(normalized.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    async def generate_embeddings(self, texts: List[str], **kwargs: Any) -> np.ndarray:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return np.stack([self._vector(t) for t in texts])
+
+
+# --------------------------------------------------------
+# Azure AI Search
+# --------------------------------------------------------
+class FakeSearchClient:
+    """Synchronous stand-in for `azure.search.documents.SearchClient`."""
+
+    def __init__(self, latency: float = 0.05, documents: Optional[List[Dict[str, Any]]] = None):
+        self.latency = latency
+        self.documents = documents or SAMPLE_DOCUMENTS
+        self.calls = 0
+
+    def search(self, search_text: str = "", top: int = 5, **kwargs: Any) -> List[Dict[str, Any]]:
+        self.calls += 1
+        # The real client performs a blocking HTTP call on the event loop thread
+        time.sleep(self.latency)
+        return [dict(d) for d in self.documents[:top]]
+
+
+# --------------------------------------------------------
+# Evaluation
+# --------------------------------------------------------
+class FakeEvaluationEngine:
+    """Synchronous stand-in for `EvaluationEngine` returning azure-ai-evaluation shaped results."""
+
+    METRICS = ("groundedness", "coherence", "relevance")
+
+    def __init__(self, latency: float = 0.1, fail_rate: float = 0.1, seed: int = 7):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    def evaluate_from_history(self, user_query: str, response: str, history: ChatHistory) -> Dict[str, Any]:
+        return self.evaluate(user_query, response)
+
+    def evaluate(self, user_query: str, response: str, context: str = "") -> Dict[str, Any]:
+        self.calls += 1
+        time.sleep(self.latency)
+
+        results = {}
+        for metric in self.METRICS:
+            score = 2.0 if self._rng.random() < self.fail_rate else 5.0
+            results[metric] = {
+                metric: score,
+                f"{metric}_result": "pass" if score >= 3 else "fail",
+                f"{metric}_threshold": 3,
+                f"{metric}_reason": "Synthetic benchmark evaluation.",
+            }
+        return results
+
+
+# --------------------------------------------------------
+# Cosmos DB
+# --------------------------------------------------------
+_TOP_RE = re.compile(r"SELECT\s+TOP\s+(@\w+|\d+)", re.IGNORECASE)
+_WHERE_RE = re.compile(r"c\.([\w.]+)\s*=\s*(@\w+)")
+_VECTOR_RE = re.compile(r"VectorDistance\(c\.(\w+),\s*(@\w+)\)", re.IGNORECASE)
+
+
+def _get_path(item: Dict[str, Any], path: str) -> Any:
+    value: Any = item
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+class InMemoryCosmosContainer:
+    """
+    Async stand-in for `azure.cosmos.aio.ContainerProxy`.
+
+    Supports the query shapes issued by the API stores:
+        - equality filters: `WHERE c.a = @a AND c.b.c = @b`
+        - vector search: `SELECT TOP @k ... ORDER BY VectorDistance(c.field, @qv)`
+
+    Like the real service, cosine `VectorDistance` returns a *similarity*
+    (1 = identical) and results are ordered most-similar first.
+    """
+
+    def __init__(self, latency: float = 0.005):
+        self.latency = latency
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.operations = 0
+
+    async def _round_trip(self):
+        self.operations += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        await self._round_trip()
+        if body["id"] in self.items:
+            raise exceptions.CosmosResourceExistsError(status_code=409, message=f"Conflict: {body['id']}")
+        self.items[body["id"]] = copy.deepcopy(body)
+        return body
+
+    async def upsert_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        await self._round_trip()
+        self.items[body["id"]] = copy.deepcopy(body)
+        return body
+
+    async def read_item(self, item: str, partition_key: Any = None, **kwargs: Any) -> Dict[str, Any]:
+        await self._round_trip()
+        if item not in self.items:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message=f"Not found: {item}")
+        return copy.deepcopy(self.items[item])
+
+    async def delete_item(self, item: str, partition_key: Any = None, **kwargs: Any) -> None:
+        await self._round_trip()
+        if self.items.pop(item, None) is None:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message=f"Not found: {item}")
+
+    async def patch_item(
+        self,
+        item: str,
+        partition_key: Any,
+        patch_operations: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """Supports the `incr` operation used for counters."""
+        await self._round_trip()
+        if item not in self.items:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message=f"Not found: {item}")
+        body = self.items[item]
+        for operation in patch_operations:
+            *parents, leaf = operation["path"].strip("/").split("/")
+            target = body
+            for part in parents:
+                target = target[part]
+            target[leaf] = target.get(leaf, 0) + operation["value"]
+        return copy.deepcopy(body)
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        params = {p["name"]: p["value"] for p in parameters or []}
+
+        async def _gen() -> AsyncIterator[Dict[str, Any]]:
+            await self._round_trip()
+            for item in self._evaluate(query, params):
+                yield item
+
+        return _gen()
+
+    def _evaluate(self, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        where = query.split("WHERE", 1)[1] if "WHERE" in query else ""
+        filters = [(path, params[name]) for path, name in _WHERE_RE.findall(where)]
+
+        docs = [
+            copy.deepcopy(item)
+            for item in self.items.values()
+            if all(_get_path(item, path) == value for path, value in filters)
+        ]
+
+        vector_match = _VECTOR_RE.search(query)
+        if vector_match:
+            field, name = vector_match.groups()
+            query_vector = np.asarray(params[name], dtype=np.float32)
+            docs = [d for d in docs if d.get(field) is not None]
+            for doc in docs:
+                vector = np.asarray(doc[field], dtype=np.float32)
+                similarity = float(vector @ query_vector /
+                                   (np.linalg.norm(vector) * np.linalg.norm(query_vector)))
+                doc["score"] = similarity
+            docs.sort(key=lambda d: d["score"], reverse=True)
+
+        top_match = _TOP_RE.search(query)
+        if top_match:
+            top = top_match.group(1)
+            docs = docs[: int(params[top]) if top.startswith("@") else int(top)]
+
+        return docs
@@ -0,0 +1,458 @@
+# benchmarks/load_test.py
+
+"""
+End-to-end load test for `/hrpolicy/agent` against in-process fakes.
+
+Usage (from src/api, after `pip install -r benchmarks/requirements.txt`):
+
+    python -m benchmarks.load_test --users 20 --session-length 5 --repeat-ratio 0.3
+    python -m benchmarks.load_test --chat-latency 0.5 --output bench.json
+    python -m benchmarks.load_test --storage sqlite
+
+Reports p50/p95/p99 latency, requests/sec, semantic cache hit rate and the
+time the event loop spent blocked (sync SDK calls, CPU work) during the run.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+
+# Dummy configuration so the stores and plugins can be constructed offline.
+_OFFLINE_ENV = {
+    "AZURE_OPENAI_MODEL": "bench-chat",
+    "AZURE_OPENAI_EMBEDDING_MODEL": "bench-embedding",
+    "AZURE_OPENAI_ENDPOINT": "https://bench.invalid",
+    "AZURE_OPENAI_API_KEY": "bench",
+    "AZURE_OPENAI_API_VERSION": "2025-01-01-preview",
+    "AZURE_AI_SEARCH_ENDPOINT": "https://bench.invalid",
+    "AZURE_AI_SEARCH_INDEX": "policy-index",
+    "AZURE_SEARCH_VECTOR_FIELD": "content_vector",
+    "COSMOSDB_ENDPOINT": "https://bench.invalid",
+    "COSMOSDB_DATABASE": "chatdatabase",
+    "COSMOSDB_HISTORY_CONTAINER": "chathistory",
+    "COSMOSDB_FEEDBACK_CONTAINER": "feedback",
+    "COSMOSDB_EVALUATIONS_CONTAINER": "evaluation",
+    "COSMOSDB_CACHE_CONTAINER": "llm_responses",
+}
+
+POPULAR_QUESTIONS = [
+    "How many vacation days do I get per year?",
+    "Can I carry over unused vacation days?",
+    "How do I report an unplanned absence?",
+    "When can I enroll in health benefits?",
+    "How often are performance appraisals done?",
+    "What is the sick leave policy?",
+    "Who approves vacation requests?",
+    "Is there a waiting period for dental coverage?",
+]
+
+UNIQUE_QUESTION_TEMPLATES = [
+    "How does the vacation policy apply to {topic}?",
+    "What does the absence policy say about {topic}?",
+    "Are there benefits rules for {topic}?",
+    "How is {topic} handled in performance reviews?",
+]
+
+TOPICS = [
+    "part-time staff", "contractors", "remote employees", "new managers", "interns",
+    "shift workers", "parental leave", "jury duty", "relocation", "public holidays",
+]
+
+
+@dataclass
+class WorkloadConfig:
+    users: int = 10
+    sessions_per_user: int = 2
+    session_length: int = 5
+    repeat_ratio: float = 0.3
+    double_submit_ratio: float = 0.0
+    think_time: float = 0.0
+    seed: int = 7
+
+
+@dataclass
+class FakeServiceConfig:
+    chat_latency: float = 0.25
+    tool_call_rate: float = 0.8
+    embedding_latency: float = 0.03
+    search_latency: float = 0.05
+    cosmos_latency: float = 0.005
+    evaluation_latency: float = 0.1
+    evaluation_fail_rate: float = 0.1
+    storage: str = "cosmos"
+    max_concurrency: int = 8
+    max_queue: int = 32
+    queue_timeout: float = 30.0
+    tpm_limit: int = 1_000_000
+
+
+@dataclass
+class RunStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    rejected: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+# --------------------------------------------------------
+# Event loop lag monitor
+# --------------------------------------------------------
+class EventLoopMonitor:
+    """
+    Samples event loop responsiveness by sleeping for a fixed interval and
+    measuring how late the loop wakes up. Any delay is time the loop was
+    blocked by synchronous work.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.blocked = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag > 0.001:
+                self.blocked += lag
+                self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+# --------------------------------------------------------
+# App wiring
+# --------------------------------------------------------
+def _attach_container(store: Any, container: Any):
+    """Point a store's lazily-initialized Cosmos backend at an in-memory container."""
+    store._container._client = object()
+    store._container._container = container
+
+
+async def build_app(config: FakeServiceConfig, seed: int = 7):
+    """
+    Create the FastAPI app with every Azure dependency replaced by a fake.
+
+    With `storage="cosmos"` the stores run their Cosmos backend against
+    in-memory Cosmos containers; `memory` and `sqlite` use the local backends.
+
+    Returns (app, fakes) where `fakes` exposes the stand-ins for reporting.
+    """
+    for name, value in _OFFLINE_ENV.items():
+        os.environ.setdefault(name, value)
+
+    os.environ["STORAGE_BACKEND"] = config.storage
+    os.environ["AGENT_MAX_CONCURRENCY"] = str(config.max_concurrency)
+    os.environ["AGENT_MAX_QUEUE"] = str(config.max_queue)
+    os.environ["AGENT_QUEUE_TIMEOUT_SECONDS"] = str(config.queue_timeout)
+    os.environ["AZURE_OPENAI_TPM_LIMIT"] = str(config.tpm_limit)
+    if config.storage == "sqlite":
+        os.environ["STORAGE_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-"), "storage.db")
+
+    from semantic_kernel import Kernel
+
+    from app import create_app
+    from app.agents import hr_agent
+    from app.agents.agent import RateLimitedChatCompletionMixin
+    from app.plugins.azure_search import AzureSearchPlugin
+    from app.routes import feedback, hrpolicy
+    from benchmarks.fakes import (
+        FakeChatCompletion,
+        FakeEvaluationEngine,
+        FakeSearchClient,
+        FakeTextEmbedding,
+        InMemoryCosmosContainer,
+    )
+
+    class RateLimitedFakeChatCompletion(RateLimitedChatCompletionMixin, FakeChatCompletion):
+        pass
+
+    fakes = {
+        "chat": RateLimitedFakeChatCompletion(
+            service_id="chat",
+            ai_model_id="bench-chat",
+            latency=config.chat_latency,
+            tool_call_rate=config.tool_call_rate,
+            seed=seed,
+        ),
+        "embedding": FakeTextEmbedding(latency=config.embedding_latency),
+        "search": FakeSearchClient(latency=config.search_latency),
+        "evaluation": FakeEvaluationEngine(
+            latency=config.evaluation_latency,
+            fail_rate=config.evaluation_fail_rate,
+            seed=seed,
+        ),
+        "history": InMemoryCosmosContainer(latency=config.cosmos_latency),
+        "cache": InMemoryCosmosContainer(latency=config.cosmos_latency),
+        "evaluations": InMemoryCosmosContainer(latency=config.cosmos_latency),
+        "rollups": InMemoryCosmosContainer(latency=config.cosmos_latency),
+        "feedback": InMemoryCosmosContainer(latency=config.cosmos_latency),
+    }
+
+    def _search_plugin() -> AzureSearchPlugin:
+        plugin = AzureSearchPlugin()
+        plugin.search_client = fakes["search"]
+        return plugin
+
+    hr_agent.AzureSearchPlugin = _search_plugin
+    hr_agent.EvaluationEngine = lambda: fakes["evaluation"]
+
+    app = create_app()
+
+    agent = hrpolicy.agent
+    agent.kernel = Kernel()
+    agent.kernel.add_service(fakes["chat"])
+    await agent.initialize()
+
+    if config.storage == "cosmos":
+        _attach_container(agent.history_store, fakes["history"])
+        _attach_container(agent.evaluation_store, fakes["evaluations"])
+        _attach_container(agent.evaluation_store.rollups, fakes["rollups"])
+        _attach_container(agent.semantic_cache.vector_store, fakes["cache"])
+        _attach_container(feedback.feedback_store, fakes["feedback"])
+    agent.semantic_cache.vector_store._embedding_generator = fakes["embedding"]
+
+    return app, fakes
+
+
+def _instrument_cache(semantic_cache: Any, stats: RunStats):
+    """Count semantic cache hits/misses without changing behaviour."""
+    get_similar = semantic_cache.get_similar
+
+    async def _counted(prompt: str):
+        result = await get_similar(prompt)
+        if result:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+        return result
+
+    semantic_cache.get_similar = _counted
+
+
+# --------------------------------------------------------
+# Workload
+# --------------------------------------------------------
+def _next_question(rng: random.Random, repeat_ratio: float) -> str:
+    if rng.random() < repeat_ratio:
+        return rng.choice(POPULAR_QUESTIONS)
+    template = rng.choice(UNIQUE_QUESTION_TEMPLATES)
+    return f"{template.format(topic=rng.choice(TOPICS))} (ref {uuid.UUID(int=rng.getrandbits(128)).hex[:8]})"
+
+
+async def _post(client: Any, payload: Dict[str, str], stats: RunStats):
+    start = time.perf_counter()
+    response = await client.post("/hrpolicy/agent", json=payload)
+    stats.latencies.append(time.perf_counter() - start)
+    if response.status_code == 429:
+        stats.rejected += 1
+    elif response.status_code != 200:
+        stats.errors += 1
+
+
+async def _user(client: Any, user_index: int, workload: WorkloadConfig, stats: RunStats):
+    rng = random.Random(workload.seed * 1000 + user_index)
+
+    for _ in range(workload.sessions_per_user):
+        session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        for _ in range(workload.session_length):
+            payload = {
+                "user_input": _next_question(rng, workload.repeat_ratio),
+                "session_id": session_id,
+            }
+            # A double-click or second tab sends the same turn twice at once
+            copies = 2 if rng.random() < workload.double_submit_ratio else 1
+            await asyncio.gather(*[_post(client, payload, stats) for _ in range(copies)])
+
+            if workload.think_time:
+                await asyncio.sleep(rng.expovariate(1.0 / workload.think_time))
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+async def run(workload: WorkloadConfig, services: FakeServiceConfig) -> Dict[str, Any]:
+    """Run the workload once and return the report as a dict."""
+    import httpx
+
+    app, fakes = await build_app(services, seed=workload.seed)
+
+    from app.concurrency.rate_limiter import get_rate_limiter
+    from app.routes import hrpolicy
+
+    stats = RunStats()
+    _instrument_cache(hrpolicy.agent.semantic_cache, stats)
+
+    monitor = EventLoopMonitor()
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        monitor.start()
+        start = time.perf_counter()
+        await asyncio.gather(*[_user(client, i, workload, stats) for i in range(workload.users)])
+        duration = time.perf_counter() - start
+        await monitor.stop()
+
+    # Evaluations and cache writes finish after the responses; not part of latency
+    await hrpolicy.agent.wait_for_background_tasks()
+
+    latencies = sorted(stats.latencies)
+    lookups = stats.cache_hits + stats.cache_misses
+
+    return {
+        "workload": asdict(workload),
+        "services": asdict(services),
+        "requests": len(latencies),
+        "errors": stats.errors,
+        "rejected": stats.rejected,
+        "duration_s": round(duration, 3),
+        "requests_per_sec": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 1),
+            "p95": round(_percentile(latencies, 95) * 1000, 1),
+            "p99": round(_percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "cache": {
+            "hits": stats.cache_hits,
+            "misses": stats.cache_misses,
+            "hit_rate": round(stats.cache_hits / lookups, 3) if lookups else 0.0,
+        },
+        "event_loop": {
+            "blocked_ms": round(monitor.blocked * 1000, 1),
+            "blocked_pct": round(monitor.blocked / duration * 100, 1) if duration else 0.0,
+            "max_lag_ms": round(monitor.max_lag * 1000, 1),
+        },
+        "admission": hrpolicy.agent.admission.snapshot(),
+        "sessions": hrpolicy.agent.sessions.snapshot(),
+        "rate_limiter": get_rate_limiter().snapshot(),
+        "backend_calls": {
+            "chat": fakes["chat"].calls,
+            "embedding": fakes["embedding"].calls,
+            "search": fakes["search"].calls,
+            "evaluation": fakes["evaluation"].calls,
+            "cosmos": sum(fakes[k].operations for k in ("history", "cache", "evaluations", "rollups", "feedback")),
+        },
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report["latency_ms"]
+    cache = report["cache"]
+    loop = report["event_loop"]
+    calls = report["backend_calls"]
+    return "\n".join([
+        f"Requests:        {report['requests']} ({report['errors']} errors, {report['rejected']} rejected) "
+        f"in {report['duration_s']}s",
+        f"Throughput:      {report['requests_per_sec']} req/s",
+        f"Latency (ms):    p50={latency['p50']}  p95={latency['p95']}  p99={latency['p99']}  max={latency['max']}",
+        f"Cache:           {cache['hits']} hits / {cache['misses']} misses (hit rate {cache['hit_rate']:.1%})",
+        f"Event loop:      blocked {loop['blocked_ms']} ms ({loop['blocked_pct']}%), max lag {loop['max_lag_ms']} ms",
+        f"Admission:       {report['admission']['admitted']} admitted, "
+        f"avg wait {report['admission']['avg_wait_s'] * 1000:.1f} ms",
+        f"Sessions:        {report['sessions']['collapsed']} duplicate submissions collapsed, "
+        f"avg lock wait {report['sessions']['avg_lock_wait_s'] * 1000:.1f} ms",
+        f"Rate limiter:    {report['rate_limiter']['throttled']} throttles, avg wait (ms) "
+        + ", ".join(f"{k}={v * 1000:.1f}" for k, v in report['rate_limiter']['avg_wait_s'].items()),
+        "Backend calls:   " + ", ".join(f"{k}={v}" for k, v in calls.items()),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for /hrpolicy/agent.")
+    parser.add_argument("--users", type=int, default=WorkloadConfig.users, help="Concurrent users.")
+    parser.add_argument("--sessions-per-user", type=int, default=WorkloadConfig.sessions_per_user)
+    parser.add_argument("--session-length", type=int, default=WorkloadConfig.session_length,
+                        help="Turns per session.")
+    parser.add_argument("--repeat-ratio", type=float, default=WorkloadConfig.repeat_ratio,
+                        help="Fraction of turns drawn from a small pool of popular questions.")
+    parser.add_argument("--double-submit-ratio", type=float, default=WorkloadConfig.double_submit_ratio,
+                        help="Fraction of turns sent twice concurrently (double-click, two tabs).")
+    parser.add_argument("--think-time", type=float, default=WorkloadConfig.think_time,
+                        help="Mean seconds between turns of one user.")
+    parser.add_argument("--seed", type=int, default=WorkloadConfig.seed)
+    parser.add_argument("--chat-latency", type=float, default=FakeServiceConfig.chat_latency)
+    parser.add_argument("--tool-call-rate", type=float, default=FakeServiceConfig.tool_call_rate)
+    parser.add_argument("--embedding-latency", type=float, default=FakeServiceConfig.embedding_latency)
+    parser.add_argument("--search-latency", type=float, default=FakeServiceConfig.search_latency)
+    parser.add_argument("--cosmos-latency", type=float, default=FakeServiceConfig.cosmos_latency)
+    parser.add_argument("--evaluation-latency", type=float, default=FakeServiceConfig.evaluation_latency)
+    parser.add_argument("--evaluation-fail-rate", type=float, default=FakeServiceConfig.evaluation_fail_rate)
+    parser.add_argument("--storage", choices=["cosmos", "memory", "sqlite"], default=FakeServiceConfig.storage,
+                        help="Storage backend; 'cosmos' runs against in-memory Cosmos stand-ins.")
+    parser.add_argument("--max-concurrency", type=int, default=FakeServiceConfig.max_concurrency,
+                        help="AGENT_MAX_CONCURRENCY for the admission controller.")
+    parser.add_argument("--max-queue", type=int, default=FakeServiceConfig.max_queue)
+    parser.add_argument("--queue-timeout", type=float, default=FakeServiceConfig.queue_timeout)
+    parser.add_argument("--tpm-limit", type=int, default=FakeServiceConfig.tpm_limit,
+                        help="AZURE_OPENAI_TPM_LIMIT shared by chat, embeddings and evaluations.")
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # The app raises its own loggers to INFO on import; filter at the handler instead
+    logging.basicConfig(level=args.log_level)
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(args.log_level)
+
+    workload = WorkloadConfig(
+        users=args.users,
+        sessions_per_user=args.sessions_per_user,
+        session_length=args.session_length,
+        repeat_ratio=args.repeat_ratio,
+        double_submit_ratio=args.double_submit_ratio,
+        think_time=args.think_time,
+        seed=args.seed,
+    )
+    services = FakeServiceConfig(
+        chat_latency=args.chat_latency,
+        tool_call_rate=args.tool_call_rate,
+        embedding_latency=args.embedding_latency,
+        search_latency=args.search_latency,
+        cosmos_latency=args.cosmos_latency,
+        evaluation_latency=args.evaluation_latency,
+        evaluation_fail_rate=args.evaluation_fail_rate,
+        storage=args.storage,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        queue_timeout=args.queue_timeout,
+        tpm_limit=args.tpm_limit,
+    )
+
+    report = asyncio.run(run(workload, services))
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()